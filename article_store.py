@@ -0,0 +1,184 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = 'articles.sqlite3'
+ITER_BATCH_SIZE = 64  # Rows fetched at a time when iterating the whole store
+
+# The fields raw_articles.json keeps for a post, plus the list entry's edit time and the images
+# get_article_content finds outside the raw post, which the main image is picked from
+ARTICLE_FIELDS = ('id', 'title', 'description', 'content', 'updated', 'full_text', 'structured_content',
+                  'raw_post_data', 'image_list', 'cover', 'section_images')
+
+
+def article_record(article):
+    """The archived fields of a listed article and its fetched content"""
+    return {field: article[field] for field in ARTICLE_FIELDS if field in article}
+
+
+def record_hash(record):
+    return hashlib.sha256(json.dumps(record, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _copies(post):
+    """Top-level fields get_article_content copies out of the raw post, worked out as it does"""
+    structured_content = post.get('structured_content', '')
+    lang_content = post.get('multi_language_info', {}).get('lang_content', {}).get('en-us', '')
+    return {'structured_content': structured_content, 'content': structured_content or lang_content}
+
+
+def pack(record):
+    """Compressed JSON of a record, leaving out fields that only repeat its raw post data"""
+    packed = dict(record)
+    if isinstance(record.get('raw_post_data'), dict):
+        copies = [field for field, value in _copies(record['raw_post_data']).items() if record.get(field) == value]
+        for field in copies:
+            del packed[field]
+        if copies:
+            packed['_copies'] = copies
+    return zlib.compress(json.dumps(packed, ensure_ascii=False).encode('utf-8'), 9)
+
+
+def unpack(blob):
+    record = json.loads(zlib.decompress(blob))
+    copies = record.pop('_copies', ())
+    if copies:
+        values = _copies(record['raw_post_data'])
+        record.update((field, values[field]) for field in copies)
+    return record
+
+
+class ArticleStore:
+    """Append-only archive of every article the scraper has fetched, in one SQLite table.
+
+    Each row is one version of a post: its id, a hash of the record and the
+    record itself as zlib-compressed JSON. A record is only appended when it
+    differs from the latest version stored for that post, so a run writes
+    just the posts that are new or were edited. The copies of the post body
+    that get_article_content puts at the top level are dropped before
+    compressing and put back on reading. Rows are indexed by post id, so
+    get() does not read the rest of the archive.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS articles (seq INTEGER PRIMARY KEY, id TEXT NOT NULL, hash TEXT NOT NULL, "
+            "stored_at TEXT NOT NULL, record BLOB NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS articles_by_id ON articles (id, seq)")
+        self._connection.commit()
+
+    def add_many(self, records):
+        """Append the records that are new or differ from their latest stored version, returning how many"""
+        now = datetime.now().isoformat()
+        added = 0
+        with self._lock:
+            for record in records:
+                article_id = str(record['id'])
+                digest = record_hash(record)
+                if self._latest(article_id, 'hash') == digest:
+                    continue
+                self._connection.execute("INSERT INTO articles (id, hash, stored_at, record) VALUES (?, ?, ?, ?)",
+                                         (article_id, digest, now, pack(record)))
+                added += 1
+            self._connection.commit()
+        return added
+
+    def add(self, record):
+        return self.add_many([record]) > 0
+
+    def _latest(self, article_id, column):
+        row = self._connection.execute(
+            f"SELECT {column} FROM articles WHERE id = ? ORDER BY seq DESC LIMIT 1", (article_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, article_id):
+        """The latest stored version of a post, or None"""
+        with self._lock:
+            blob = self._latest(str(article_id), 'record')
+        return unpack(blob) if blob is not None else None
+
+    def history(self, article_id):
+        """Every stored version of a post as (stored at, record), oldest first"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT stored_at, record FROM articles WHERE id = ? ORDER BY seq", (str(article_id),)
+            ).fetchall()
+        return [(stored_at, unpack(blob)) for stored_at, blob in rows]
+
+    def __iter__(self):
+        """The latest version of every post, newest post first, read from the database a few rows at a time"""
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT record FROM articles WHERE seq IN (SELECT MAX(seq) FROM articles GROUP BY id) "
+                "ORDER BY CAST(id AS INTEGER) DESC"
+            )
+        try:
+            while True:
+                with self._lock:  # Released between batches so other threads can use the store meanwhile
+                    rows = cursor.fetchmany(ITER_BATCH_SIZE)
+                if not rows:
+                    break
+                for (blob,) in rows:
+                    yield unpack(blob)
+        finally:
+            cursor.close()
+
+    def __contains__(self, article_id):
+        with self._lock:
+            return self._latest(str(article_id), 'seq') is not None
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._connection.execute("SELECT COUNT(DISTINCT id) FROM articles").fetchone()
+        return count
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def log_stats(self):
+        with self._lock:
+            (versions,) = self._connection.execute("SELECT COUNT(*) FROM articles").fetchone()
+        logger.info("Article store: %d posts, %d versions, %.1f KB in %s", len(self), versions,
+                    os.path.getsize(self.path) / 1024, self.path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import archived raw articles into the article store, or export it")
+    parser.add_argument('--store', default=STORE_PATH)
+    parser.add_argument('--import', dest='import_path', metavar='PATH',
+                        help="raw_articles.json or a JSON-lines archive of the same records")
+    parser.add_argument('--export', metavar='PATH', help="write the latest version of every post as JSON lines")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from replay import iter_raw_articles
+    from run_metrics import configure_logging
+
+    args = parse_args()
+    configure_logging('INFO')
+    store = ArticleStore(args.store)
+    if args.import_path:
+        added = store.add_many(article_record(record) for record in iter_raw_articles(args.import_path))
+        logger.info("Stored %d new or changed articles from %s", added, args.import_path)
+    if args.export:
+        with open(args.export, 'w', encoding='utf-8') as f:
+            for record in store:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        logger.info("Exported %d articles to %s", len(store), args.export)
+    store.log_stats()
+    store.close()
@@ -0,0 +1,288 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+
+from article_store import article_record
+from enrichment import enrich_events, get_image_store, get_sentiment_engine
+from fetching import get_article_list, iter_article_contents
+from parsing import (is_event_article, is_version_update_article, match_keywords, parse_event_dates,
+                     parse_version_update_time)
+from rate_limiter import RateLimiter
+from replay import prepare_article
+from run_metrics import configure_logging, get_metrics
+from version_index import VersionIndex, VERSION_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_DIR = 'backfill'
+CHECKPOINT_NAME = 'checkpoint.json'
+CHUNK_SIZE = 500  # Records per chunk file
+BATCH_SIZE = 50  # Events whose comments, sentiment and images are handled together
+
+
+def chunk_path(directory, number):
+    return os.path.join(directory, f"raw-{number:05d}.jsonl")
+
+
+def iter_records(directory=BACKFILL_DIR):
+    """Stream every record up to the last checkpoint, newest post first"""
+    checkpoint = BackfillCheckpoint.load(os.path.join(directory, CHECKPOINT_NAME))
+    for number in range(1, checkpoint.chunk + 1):
+        path = chunk_path(directory, number)
+        if not os.path.exists(path):
+            continue
+        # Anything past the checkpoint in the current chunk is a page the crawl did not finish
+        end = checkpoint.offset if number == checkpoint.chunk else None
+        position = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                position += len(line)
+                if end is not None and position > end:
+                    break
+                if line.strip():
+                    yield json.loads(line)
+
+
+class BackfillCheckpoint:
+    """How far a backfill crawl has walked the news list, saved after every page.
+
+    Besides the `last_id` to ask getNewsList for next, it keeps which chunk
+    file is being appended to and its length after the last complete page.
+    A crawl that stops part way through a page cuts the chunk back to that
+    length on resume, so every page is stored exactly once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.last_id = ''
+        self.pages = 0
+        self.articles = 0
+        self.chunk = 1
+        self.chunk_records = 0
+        self.offset = 0
+        self.finished = False
+
+    @classmethod
+    def load(cls, path):
+        checkpoint = cls(path)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                checkpoint.__dict__.update(json.load(f))
+            checkpoint.path = path
+        return checkpoint
+
+    def save(self):
+        """Write the checkpoint atomically so an interrupted crawl cannot corrupt it"""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({key: value for key, value in self.__dict__.items() if key != 'path'}, f)
+        os.replace(temp_path, self.path)
+
+
+def fetch_contents(records, limiter, executor, window):
+    """Add the fetched content to each record in place, returning the records whose fetch failed"""
+    missing = []
+    for record, content in iter_article_contents(records, limiter, executor, window):
+        if content:
+            record.update(article_record(content))
+        else:
+            missing.append(record)
+    return missing
+
+
+def crawl(directory=BACKFILL_DIR, limiter=None, executor=None, max_pages=None, chunk_size=CHUNK_SIZE, window=8,
+          skip_missing=False):
+    """Walk getNewsList back to its last page, appending every listed post to chunk files.
+
+    Posts that look like events or version updates get their content
+    fetched and stored with them, everything else keeps its list fields
+    only. A post whose content cannot be fetched stops the crawl before its
+    page is stored, unless `skip_missing` keeps its list entry instead. Only
+    one page is held in memory. The checkpoint is saved after each page, so
+    an interrupted or rate limited crawl carries on from the next page when
+    run again. Returns the checkpoint.
+    """
+    os.makedirs(directory, exist_ok=True)
+    checkpoint = BackfillCheckpoint.load(os.path.join(directory, CHECKPOINT_NAME))
+    if checkpoint.finished:
+        logger.info("Backfill crawl already reached the end of the feed (%d pages, %d articles)",
+                    checkpoint.pages, checkpoint.articles)
+        return checkpoint
+    if checkpoint.pages:
+        logger.info("Resuming backfill crawl after page %d, last_id %s", checkpoint.pages, checkpoint.last_id)
+
+    metrics = get_metrics()
+    chunk = open(chunk_path(directory, checkpoint.chunk), 'ab')
+    chunk.truncate(checkpoint.offset)  # Records of a page written after the last checkpoint
+    pages = 0
+    try:
+        while max_pages is None or pages < max_pages:
+            with metrics.span('list page'):
+                articles, next_id, is_last = get_article_list(checkpoint.last_id, limiter, raise_errors=True)
+            metrics.increment('articles_listed', len(articles))
+            # Only a page that says it is the last ends the crawl; anything else that cannot be followed is retried
+            if not is_last and (not articles or not next_id or next_id == checkpoint.last_id):
+                raise RuntimeError(f"getNewsList returned {len(articles)} posts and last_id {next_id!r} after "
+                                   f"last_id {checkpoint.last_id!r} without is_last; run again to retry the page")
+
+            records = [article_record(article) for article in articles]
+            wanted = [record for record in records if match_keywords(record)]
+            with metrics.span('content', items=len(wanted)):
+                missing = fetch_contents(wanted, limiter, executor, window)
+                if missing:
+                    missing = fetch_contents(missing, limiter, executor, window)  # One more try for the page
+            if missing and not skip_missing:
+                raise RuntimeError(f"Could not fetch {len(missing)} posts listed after last_id "
+                                   f"{checkpoint.last_id!r}; run again to retry the page")
+            for record in missing:
+                logger.warning("No content for %s, keeping its list entry only", record['title'])
+                metrics.increment('backfill_content_missing')
+
+            for record in records:
+                chunk.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+            chunk.flush()
+            os.fsync(chunk.fileno())
+
+            pages += 1
+            checkpoint.pages += 1
+            checkpoint.articles += len(records)
+            checkpoint.chunk_records += len(records)
+            checkpoint.offset = chunk.tell()
+            checkpoint.finished = is_last
+            checkpoint.last_id = next_id
+            if checkpoint.chunk_records >= chunk_size and not checkpoint.finished:
+                chunk.close()
+                checkpoint.chunk += 1
+                checkpoint.chunk_records = 0
+                checkpoint.offset = 0
+                chunk = open(chunk_path(directory, checkpoint.chunk), 'ab')
+            checkpoint.save()
+            logger.info("Backfill page %d: %d articles, %d with content", checkpoint.pages, len(records), len(wanted))
+            if checkpoint.finished:
+                logger.info("Backfill crawl reached the end of the feed after %d pages", checkpoint.pages)
+                break
+    finally:
+        chunk.close()
+    return checkpoint
+
+
+def process(directory=BACKFILL_DIR, output='backfill_events.json', limiter=None, executor=None,
+            sentiment_engine=None, image_store=None, comment_sampling=None, image_processes=None,
+            batch_size=BATCH_SIZE, version_index_path=VERSION_INDEX_PATH):
+    """Date, score and format every crawled event, writing them to `output` as each batch is done.
+
+    A first pass adds the crawled version updates to the version index, so
+    old events are dated against the versions of their time. The second
+    runs events through the same comments, sentiment, image and formatting
+    stages as a normal scrape, `batch_size` at a time, so memory does not
+    grow with the archive. Returns the number of events written.
+    """
+    metrics = get_metrics()
+    sentiment_engine = sentiment_engine or get_sentiment_engine()
+    image_store = image_store or get_image_store()
+    version_updates = VersionIndex.load(version_index_path)
+    with metrics.span('load version updates'):
+        for record in iter_records(directory):
+            if is_version_update_article(record) and record.get('full_text'):
+                version_info = parse_version_update_time(record['full_text'])
+                if version_info:
+                    version_updates[version_info['version']] = dict(version_info, postId=record['id'])
+    logger.info("%d versions known after reading the backfill", len(version_updates))
+
+    seen_ids = set()
+    batch = []
+    written = 0
+    temp_path = f"{output}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        def write_batch():
+            nonlocal written
+            new_events = enrich_events(batch, limiter, executor, comment_sampling or {}, sentiment_engine,
+                                       image_store, image_processes)
+            for article, _ in batch:
+                if article['id'] in new_events:
+                    # Laid out as json.dump(events, indent=2) would, one event at a time
+                    f.write(',\n' if written else '\n')
+                    f.write(textwrap.indent(json.dumps(new_events[article['id']], ensure_ascii=False, indent=2), '  '))
+                    written += 1
+            batch.clear()
+
+        f.write('[')
+        for record in iter_records(directory):
+            if record['id'] in seen_ids or not is_event_article(record) or not record.get('full_text'):
+                continue
+            seen_ids.add(record['id'])
+            article = prepare_article(record)
+            with metrics.span('parse dates'):
+                dates = parse_event_dates(article['full_text'], version_updates)
+            if not dates:
+                logger.warning("Could not parse dates for: %s", article['title'])
+                metrics.increment('events_without_dates')
+                continue
+            batch.append((article, dates))
+            if len(batch) >= batch_size:
+                write_batch()
+        if batch:
+            write_batch()
+        f.write('\n]' if written else ']')
+    os.replace(temp_path, output)
+    logger.info("Saved %d backfilled events to %s", written, output)
+    return written
+
+
+def reset(directory=BACKFILL_DIR):
+    """Forget an earlier crawl so the next one starts from the newest post"""
+    for path in glob.glob(os.path.join(directory, 'raw-*.jsonl')) + [os.path.join(directory, CHECKPOINT_NAME)]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Crawl the whole HoYoLab news archive and process every event in it")
+    parser.add_argument('--directory', default=BACKFILL_DIR, help="where the chunks and checkpoint are kept")
+    parser.add_argument('--output', default='backfill_events.json')
+    parser.add_argument('--max-pages', type=int, default=None,
+                        help="stop the crawl after this many pages; the next run carries on from there")
+    parser.add_argument('--crawl-only', action='store_true', help="walk the feed without processing the events")
+    parser.add_argument('--process-only', action='store_true', help="process what was crawled so far")
+    parser.add_argument('--restart', action='store_true', help="discard an earlier crawl and start from the top")
+    parser.add_argument('--skip-missing', action='store_true',
+                        help="keep going when a post's content cannot be fetched, storing its list entry only")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="records per chunk file")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help="events handled together when processing")
+    parser.add_argument('--rps', type=float, default=1.0, help="requests per second")
+    parser.add_argument('--max-in-flight', type=int, default=4, help="maximum simultaneous requests")
+    parser.add_argument('--max-comments', type=int, default=20,
+                        help="maximum comments read per event for sentiment")
+    parser.add_argument('--image-workers', type=int, default=4, help="maximum simultaneous image downloads")
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO')
+    parser.add_argument('--metrics-report', metavar='PATH',
+                        help="write the run's timings and counters here, as Prometheus text for .prom files")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    configure_logging(args.log_level)
+    metrics = get_metrics()
+    limiter = RateLimiter(args.rps, args.max_in_flight)
+
+    with ThreadPoolExecutor(max_workers=args.max_in_flight) as executor:
+        if args.restart:
+            reset(args.directory)
+        if not args.process_only:
+            with metrics.span('crawl'):
+                crawl(args.directory, limiter, executor, max_pages=args.max_pages, chunk_size=args.chunk_size,
+                      window=args.max_in_flight * 2, skip_missing=args.skip_missing)
+        if not args.crawl_only:
+            with metrics.span('process'):
+                process(args.directory, args.output, limiter, executor, image_store=get_image_store(args.image_workers),
+                        comment_sampling={'max_comments': args.max_comments}, batch_size=args.batch_size)
+
+    metrics.log_summary("BACKFILL TIMINGS")
+    if args.metrics_report:
+        metrics.write_report(args.metrics_report)
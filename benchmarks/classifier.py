@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsing import EVENT_KEYWORDS, VERSION_UPDATE_KEYWORDS, classify_article
+
+# Pieces of the kinds of post HoYoLab lists, mostly without any keyword
+TITLES = [
+    "Version {v} Update Maintenance Preview",
+    "Welcome to Version {v}",
+    "Version {v} Maintenance Compensation Notice",
+    "Event Warp \"{name}\": Boosted Drop Rate for {name}",
+    "Limited-Time Event \"{name}\" Is Now Available",
+    "Garden of Plenty: Double Rewards",
+    "Planar Fissure Event Now Live",
+    "{name} Character Trailer",
+    "Honkai: Star Rail Web Comic: {name}",
+    "Trailblaze Daily: {name}",
+    "Known Issues in Version {v}",
+    "Fan Art Showcase: {name}",
+    "Developer Radio: {name}",
+]
+DESCRIPTIONS = [
+    "Event Period: After the Version {v} update - 2025/03/25 11:59:59 (server time)",
+    "▌Event Period\nAfter the Version {v} update",
+    "Event Details: Complete tasks to earn Stellar Jade.",
+    "Trailblazers, {name} is here!",
+    "Check out the latest story of {name}.",
+    "Dear Trailblazers, here is this week's roundup.",
+    "Join the discussion about {name} in the comments.",
+    "",
+]
+EVENT_LOWER = {keyword.lower() for keyword in EVENT_KEYWORDS}
+NAMES = ["Firefly", "Acheron", "Aventurine", "Robin", "Jingliu", "Sparkle", "Castorice", "The Herta"]
+
+
+def synthetic_feed(size, filler, seed=0):
+    """Listed posts built from the templates above, with `filler` extra characters of plain text per description"""
+    rng = random.Random(seed)
+    padding = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (filler // 57 + 1)
+    feed = []
+    for post_id in range(size):
+        fields = {'v': f"{rng.randint(1, 3)}.{rng.randint(0, 7)}", 'name': rng.choice(NAMES)}
+        description = rng.choice(DESCRIPTIONS).format(**fields)
+        if filler:
+            start = rng.randrange(57)
+            description += ' ' + padding[start:start + filler]
+        feed.append({'id': str(post_id), 'title': rng.choice(TITLES).format(**fields), 'description': description})
+    return feed
+
+
+def keyword_scans(article):
+    """The classification as it was: is_version_update_article then is_event_article, each lowercasing the
+    fields again and looking for its keywords one at a time"""
+    title = article.get('title', '').lower()
+    description = article.get('description', '').lower()
+    is_version_update = any(pattern in title or pattern in description for pattern in VERSION_UPDATE_KEYWORDS)
+
+    content_to_check = [article.get('title', '').lower(), article.get('description', '').lower()]
+    is_event = any(keyword.lower() in text for text in content_to_check for keyword in EVENT_KEYWORDS)
+    return is_version_update, is_event
+
+
+def alternation_classifier():
+    """One precompiled alternation of every keyword, scanned once over both fields"""
+    categories = {keyword.lower(): 'version_update' for keyword in VERSION_UPDATE_KEYWORDS}
+    categories.update((keyword.lower(), 'event') for keyword in EVENT_KEYWORDS)
+    # Lookahead so a keyword inside a longer one ("event period" in "▌event period") is found too
+    pattern = re.compile('(?=(' + '|'.join(re.escape(keyword) for keyword in
+                                           sorted(categories, key=len, reverse=True)) + '))')
+
+    def classify(article):
+        text = (article.get('title', '') + '\n' + article.get('description', '')).lower()
+        found = {categories[keyword] for keyword in pattern.findall(text)}
+        return 'version_update' in found, 'event' in found
+    return classify
+
+
+def anchored_keywords(article):
+    category, keywords = classify_article(article)
+    return category == 'version_update', any(keyword in EVENT_LOWER for keyword in keywords)
+
+
+def time_classifier(classify, feed, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [classify(article) for article in feed]
+        timings.append(time.perf_counter() - start)
+    return min(timings), results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time the article classifier over a synthetic feed")
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--filler', type=int, default=0,
+                        help="plain characters added to each description, for archived posts with full text")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    feed = synthetic_feed(args.posts, args.filler, args.seed)
+    print(f"Feed: {len(feed)} posts, {sum(len(a['description']) for a in feed) / len(feed):.0f} characters "
+          f"per description")
+
+    classifiers = [('keyword scans', keyword_scans), ('alternation', alternation_classifier()),
+                   ('anchored keywords', anchored_keywords)]
+    reference = None
+    results = []
+    failed = False
+    for name, classify in classifiers:
+        best, labels = time_classifier(classify, feed, args.repeat)
+        reference = reference or labels
+        mismatches = sum(a != b for a, b in zip(reference, labels))
+        failed = failed or mismatches > 0
+        results.append({'classifier': name, 'best_seconds': best, 'posts_per_second': len(feed) / best,
+                        'mismatches': mismatches})
+        print(f"{name}: {best:.3f}s, {len(feed) / best:,.0f} posts/s (best of {args.repeat})"
+              f"{f', ⚠ {mismatches} posts classified differently' if mismatches else ''}")
+
+    counts = {'version_update': sum(v for v, _ in reference), 'event': sum(e for _, e in reference)}
+    print(f"{counts['version_update']} version updates, {counts['event']} event posts")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'posts': len(feed), 'filler': args.filler, 'counts': counts, 'results': results}, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules people import on their own, from lightest to heaviest
+ENTRY_POINTS = ['date_parser', 'parsing', 'publishing', 'fetching', 'enrichment', 'main', 'sentiment_backends']
+
+# Libraries that should only load when sentiment or the Firestore upload actually runs
+HEAVY_MODULES = ('transformers', 'torch', 'firebase_admin', 'numpy', 'PIL', 'onnxruntime')
+
+
+def measure(module, python=sys.executable):
+    """Import a module in a fresh interpreter and return (seconds, heavy modules loaded, slowest imports)"""
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules)\n"
+        "print(json.dumps([elapsed, heavy]))\n"
+    )
+    result = subprocess.run([python, '-X', 'importtime', '-c', script], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    elapsed, heavy = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # -X importtime writes "import time: self | cumulative | name" lines to stderr
+    imports = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            imports.append((int(parts[1]), parts[2].strip()))
+    slowest = [{'module': name, 'cumulative_ms': micros / 1000}
+               for micros, name in sorted(imports, reverse=True)[:5]]
+    return elapsed, heavy, slowest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure how long each scraper entry point takes to import")
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS)
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per module, best time is kept")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    for module in args.modules:
+        try:
+            runs = [measure(module) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"⚠ {module}: import failed\n{e.stderr.strip().splitlines()[-1]}")
+            continue
+        elapsed, heavy, slowest = min(runs, key=lambda run: run[0])
+        results.append({'module': module, 'seconds': elapsed, 'heavy_modules': heavy, 'slowest_imports': slowest})
+        top = ', '.join(f"{entry['module']} {entry['cumulative_ms']:.0f} ms" for entry in slowest[:3])
+        print(f"{module}: {elapsed * 1000:.0f} ms"
+              f"{' (loads ' + ', '.join(heavy) + ')' if heavy else ''} - slowest: {top}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
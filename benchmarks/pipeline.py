@@ -0,0 +1,285 @@
+import argparse
+import contextlib
+import copy
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fetching
+from enrichment import format_event_for_firestore
+from fake_firestore import FakeFirestore
+from hoyolab_server import start_server
+from http_client import get_client
+from http_fixtures import PAGE_SIZE, FixtureStore, fixture_key, import_archive
+from image_fetch import ImageStore
+from image_variants import available_formats, create_variants
+from parsing import classify_article, parse_event_dates, parse_version_update_time
+from publishing import upload_to_firestore
+from run_metrics import RunMetrics, configure_logging
+from sentiment import SentimentEngine
+
+ARCHIVE_PATH = os.path.join(ROOT, 'raw_articles.json')
+CORPUS_PATH = os.path.join(ROOT, 'fixtures', 'sentiment_corpus.json')
+IMAGE_HOST = 'https://upload-os-bbs.hoyolab.com'
+
+# Passed as the fetch layer's limiter: the stand-in needs no politeness delays
+UNTHROTTLED = contextlib.nullcontext()
+
+# Stages in the order scrape_hoyolab runs them
+STAGES = ['list pagination', 'content extraction', 'classify', 'parse dates', 'comments', 'sentiment',
+          'images', 'image variants', 'format', 'firestore upload']
+
+
+class FakeAnalyzer:
+    """Stands in for the transformers pipeline: a fixed star rating per text, no model load"""
+
+    def __call__(self, texts, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        return [{'label': f"{len(text) % 5 + 1} stars", 'score': 1.0} for text in texts]
+
+
+def scale_records(records, factor):
+    """factor copies of the archive, each copy with its own post ids"""
+    scaled = []
+    for copy_index in range(factor):
+        for record in records:
+            record = copy.deepcopy(record)
+            if copy_index:
+                record['id'] = f"{record['id']}{copy_index:03d}"
+            post = record.setdefault('raw_post_data', {})
+            post['post_id'] = record['id']
+            post['cover'] = f"{IMAGE_HOST}/bench/{record['id']}.png"
+            scaled.append(record)
+    return scaled
+
+
+def make_image(index, size=(640, 360)):
+    """A distinct PNG per event, so the content-addressed image store keeps every one"""
+    from PIL import Image
+    gradient = Image.linear_gradient('L').resize(size)
+    image = Image.merge('RGB', (gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT),
+                                Image.new('L', size, index % 256)))
+    image.putpixel((0, 0), (index % 256, index // 256 % 256, index // 65536 % 256))
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def build_fixtures(directory, records, corpus):
+    """A fixture store with the scaled feed, a page of replies per post and a cover image per post"""
+    store = FixtureStore(directory)
+    import_archive(store, records)
+
+    wapi = 'https://bbs-api-os.hoyolab.com/community/post/wapi'
+    has_pillow = bool(available_formats())
+    for index, record in enumerate(records):
+        comments = corpus[index % len(corpus)]['comments']
+        replies = [{'reply': {'content': f"{comment['content']} #{index}", 'like_num': comment.get('likes', 0)}}
+                   for comment in comments[:PAGE_SIZE]]
+        body = json.dumps({'retcode': 0, 'data': {'list': replies, 'last_id': '', 'is_last': True}}).encode('utf-8')
+        url = f"{wapi}/getPostReplies"
+        store.add(fixture_key(url, {'post_id': record['id'], 'size': str(PAGE_SIZE), 'last_id': ''}),
+                  'getPostReplies', body, 'application/json', url=url)
+
+        image_url = record['raw_post_data']['cover']
+        image = make_image(index) if has_pillow else f"image {index}".encode('utf-8')
+        store.add(fixture_key(image_url), 'image', image, 'image/png', url=image_url)
+    return store
+
+
+def run_scale(records, corpus, work_dir, server, metrics):
+    """Push a scaled feed through every stage of scrape_hoyolab once"""
+    server.use_store(build_fixtures(os.path.join(work_dir, 'fixtures'), records, corpus))
+
+    articles = []
+    last_id, is_last = '', False
+    while not is_last:
+        with metrics.span('list pagination'):
+            page, last_id, is_last = fetching.get_article_list(last_id, UNTHROTTLED)
+        articles.extend(page)
+
+    for article in articles:
+        with metrics.span('content extraction'):
+            article.update(fetching.get_article_content(article['id'], UNTHROTTLED))
+
+    version_updates = {}
+    events = []
+    for article in articles:
+        with metrics.span('classify'):
+            category, _ = classify_article(article)
+        if category == 'version_update':
+            version_info = parse_version_update_time(article['full_text'])
+            if version_info:
+                version_updates[version_info['version']] = version_info
+        elif category == 'event':
+            events.append(article)
+
+    dated = []
+    for article in events:
+        with metrics.span('parse dates'):
+            dates = parse_event_dates(article['full_text'], version_updates, debug=False)
+        if dates:
+            dated.append((article, dates))
+
+    with metrics.span('comments', items=len(dated)):
+        comment_lists = [fetching.get_article_comments(article['id'], UNTHROTTLED) for article, _ in dated]
+    engine = SentimentEngine()
+    engine._analyzer = FakeAnalyzer()
+    with metrics.span('sentiment', items=len(dated)):
+        sentiments = engine.analyze_many(comment_lists)
+
+    image_store = ImageStore(image_dir=os.path.join(work_dir, 'images'), max_workers=4,
+                             manifest_path=os.path.join(work_dir, 'image_manifest.json'))
+    image_urls = [article['cover'] for article, _ in dated]
+    with metrics.span('images', items=len(image_urls)):
+        image_store.fetch_all(image_urls)
+    if available_formats():
+        with metrics.span('image variants', items=len(image_urls)):
+            create_variants(image_store, image_urls)
+
+    formatted = []
+    for (article, dates), sentiment in zip(dated, sentiments):
+        with metrics.span('format'):
+            formatted.append(format_event_for_firestore(article, dates, sentiment=sentiment, image_store=image_store))
+
+    with metrics.span('firestore upload', items=len(formatted)):
+        upload_to_firestore(formatted, db=FakeFirestore(),
+                            manifest_path=os.path.join(work_dir, 'firestore_manifest.json'))
+    return len(articles), len(formatted)
+
+
+def benchmark(records, corpus, factor, repeat, server):
+    """Best of `repeat` runs per stage at one scale"""
+    best = {}
+    for _ in range(repeat):
+        metrics = RunMetrics()
+        work_dir = tempfile.mkdtemp(prefix='hoyolab-bench-')
+        try:
+            article_count, event_count = run_scale(scale_records(records, factor), corpus, work_dir,
+                                                   server, metrics)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        for name, span in metrics.span_totals().items():
+            stage = {'seconds': span['seconds'], 'items': span['items']}
+            if name not in best or stage['seconds'] < best[name]['seconds']:
+                best[name] = stage
+    for stage in best.values():
+        stage['ms_per_item'] = stage['seconds'] * 1000 / stage['items'] if stage['items'] else None
+    return {
+        'factor': factor,
+        'articles': article_count,
+        'events': event_count,
+        'stages': {name: best[name] for name in STAGES if name in best},
+    }
+
+
+def regressions(results, baseline, max_slowdown, min_seconds=0.05):
+    """Stages whose time per item grew by more than max_slowdown against a saved run.
+
+    Stages that took under min_seconds in total are too short to time reliably and are skipped.
+    """
+    previous = {run['factor']: run for run in baseline.get('runs', [])}
+    found = []
+    for run in results['runs']:
+        old_run = previous.get(run['factor'])
+        if not old_run:
+            continue
+        for name, stage in run['stages'].items():
+            old = old_run['stages'].get(name)
+            if stage['seconds'] < min_seconds or not old or old['seconds'] < min_seconds:
+                continue
+            if old.get('ms_per_item') and stage['ms_per_item']:
+                ratio = stage['ms_per_item'] / old['ms_per_item']
+                if ratio > max_slowdown:
+                    found.append((run['factor'], name, old['ms_per_item'], stage['ms_per_item'], ratio))
+    return found
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time every stage of scrape_hoyolab against a local stand-in")
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100],
+                        help="multiples of the archived article volume to run")
+    parser.add_argument('--archive', default=ARCHIVE_PATH)
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('--repeat', type=int, default=1, help="runs per scale, best time per stage is kept")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds the stand-in adds to every response")
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="save this run as the baseline when no stage is slower, or when there is none yet")
+    parser.add_argument('--max-slowdown', type=float, default=1.5,
+                        help="flag stages whose time per item grew by more than this factor")
+    parser.add_argument('--min-stage-seconds', type=float, default=0.05,
+                        help="leave stages shorter than this out of the comparison")
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results', 'pipeline.json'),
+                        help="write the results as JSON to this file")
+    parser.add_argument('--verbose', action='store_true', help="keep the pipeline's own log output")
+    args = parser.parse_args()
+    if args.baseline and os.path.abspath(args.baseline) == os.path.abspath(args.output):
+        parser.error("--output would overwrite the baseline; use --update-baseline to replace it after a clean run")
+    return args
+
+
+def main():
+    args = parse_args()
+    configure_logging(logging.INFO if args.verbose else logging.WARNING)
+    with open(args.archive, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    with open(args.corpus, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    server = start_server(FixtureStore(tempfile.mkdtemp(prefix='hoyolab-fixtures-')), latency=args.latency)
+    fetching.API_BASE_URL = server.base_url  # Read on every call, so this points the fetch layer at the stand-in
+    get_client().cache = None  # Every request should reach the stand-in
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'latency': args.latency,
+        'runs': [],
+    }
+    for factor in args.scales:
+        run = benchmark(records, corpus, factor, args.repeat, server)
+        results['runs'].append(run)
+        print(f"\n{factor}x: {run['articles']} articles, {run['events']} events")
+        for name, stage in run['stages'].items():
+            per_item = f"{stage['ms_per_item']:.2f} ms each" if stage['ms_per_item'] is not None else ''
+            print(f"  {name}: {stage['seconds'] * 1000:.1f} ms for {stage['items']} items ({per_item})")
+    server.shutdown()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {args.output}")
+
+    if baseline:
+        slower = regressions(results, baseline, args.max_slowdown, args.min_stage_seconds)
+        for factor, name, old, new, ratio in slower:
+            print(f"⚠ {factor}x {name}: {old:.2f} -> {new:.2f} ms per item ({ratio:.1f}x slower)")
+        if slower:
+            return 1  # The baseline is kept, so a slowdown is reported until it is fixed
+        print(f"✓ No stage more than {args.max_slowdown}x slower than {args.baseline}")
+    if args.baseline and args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Saved results as the baseline in {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
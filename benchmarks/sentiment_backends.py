@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentiment import SentimentEngine, prepare_comments
+from sentiment_backends import BACKENDS
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'fixtures', 'sentiment_corpus.json')
+
+
+def load_corpus(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        events = json.load(f)
+    comment_lists = [event['comments'] for event in events]
+    texts = [text for comments in comment_lists for text, _ in prepare_comments(comments)]
+    return comment_lists, texts
+
+
+def run_backend(backend, comment_lists, texts, batch_size, num_threads, repeat):
+    """Load one backend and score the corpus, returning timings and results"""
+    engine = SentimentEngine(batch_size=batch_size, backend=backend, num_threads=num_threads)
+
+    start = time.perf_counter()
+    engine.get_analyzer()
+    load_seconds = time.perf_counter() - start
+
+    engine.score_texts(texts[:batch_size])  # Warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scores = engine.score_texts(texts)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    return {
+        'backend': backend,
+        'load_seconds': load_seconds,
+        'best_seconds': best,
+        'comments_per_second': len(texts) / best if best else None,
+        'scores': scores,
+        'categories': engine.analyze_many(comment_lists),
+    }
+
+
+def compare(reference, result):
+    """How closely a backend's labels follow the reference backend's"""
+    pairs = [(a, b) for a, b in zip(reference['scores'], result['scores']) if a is not None and b is not None]
+    differences = [abs(a - b) for a, b in pairs]
+    return {
+        'label_agreement': sum(d == 0 for d in differences) / len(pairs) if pairs else 1.0,
+        'mean_abs_difference': sum(differences) / len(pairs) if pairs else 0.0,
+        'max_abs_difference': max(differences, default=0),
+        'category_agreement': sum(a == b for a, b in zip(reference['categories'], result['categories']))
+                              / len(reference['categories']),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check sentiment backends agree and compare their throughput")
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS), default=['pipeline', 'quantized', 'onnx'],
+                        help="backends to run; the first is the reference for the parity check")
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-label-agreement', type=float, default=0.9,
+                        help="fraction of comments that must get the same star rating as the reference")
+    parser.add_argument('--max-label-difference', type=int, default=1,
+                        help="largest star difference allowed on any single comment")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    comment_lists, texts = load_corpus(args.corpus)
+    print(f"Corpus: {len(texts)} comments from {len(comment_lists)} events")
+
+    results = []
+    for backend in args.backends:
+        try:
+            result = run_backend(backend, comment_lists, texts, args.batch_size, args.threads, args.repeat)
+        except (ImportError, RuntimeError, OSError) as e:
+            print(f"⚠ Skipping {backend}: {e}")
+            continue
+        results.append(result)
+        print(f"{backend}: loaded in {result['load_seconds']:.1f}s, "
+              f"{result['comments_per_second']:.1f} comments/s (best of {args.repeat})")
+
+    if not results:
+        print("No backend could be loaded")
+        return 1
+
+    reference = results[0]
+    failed = False
+    for result in results[1:]:
+        result['parity'] = compare(reference, result)
+        parity = result['parity']
+        ok = (parity['label_agreement'] >= args.min_label_agreement
+              and parity['max_abs_difference'] <= args.max_label_difference)
+        failed = failed or not ok
+        print(f"{result['backend']} vs {reference['backend']}: "
+              f"{parity['label_agreement']:.1%} same label, mean difference {parity['mean_abs_difference']:.2f} stars, "
+              f"max {parity['max_abs_difference']}, {parity['category_agreement']:.0%} same event category "
+              f"{'✓' if ok else '⚠ outside tolerance'}")
+
+    if args.output:
+        report = [{key: value for key, value in result.items() if key != 'scores'} for result in results]
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'comments': len(texts), 'threads': args.threads, 'results': report}, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
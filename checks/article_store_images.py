@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import enrichment
+import fetching
+import main as scraper
+from article_store import STORE_PATH
+from hoyolab_server import start_server
+from http_client import get_client
+from http_fixtures import FixtureStore, fixture_key, import_archive
+from replay import replay
+from run_metrics import configure_logging
+from sentiment import SentimentEngine
+
+ARCHIVE_PATH = os.path.join(ROOT, 'raw_articles.json')
+IMAGE_HOST = 'https://upload-os-bbs.hoyolab.com'
+
+
+class FakeAnalyzer:
+    """A fixed star rating per text, so no model has to load"""
+
+    def __call__(self, texts, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        return [{'label': f"{len(text) % 5 + 1} stars", 'score': 1.0} for text in texts]
+
+
+def with_image_lists(records):
+    """The archived records, each with an image list of its own like getPostFull returns"""
+    return [dict(record, image_list=[{'url': f"{IMAGE_HOST}/fw/{record['id']}.png"}]) for record in records]
+
+
+def check(work_dir):
+    """Errors found when the events replayed from the article store are compared with the scrape that stored them"""
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    scraped = scraper.scrape_hoyolab(article_limit=20, concurrent=True, requests_per_second=1000, max_in_flight=4,
+                                     sentiment_cache=False)
+    replayed = replay(STORE_PATH)
+
+    errors = []
+    main_images = {event['eventId']: event.get('imageUrl') for event in replayed}
+    if not any(event.get('imageUrl') for event in scraped):
+        errors.append("the scrape found no main images to compare")
+    for event in scraped:
+        if event['eventId'] not in main_images:
+            errors.append(f"{event['title']!r} was not replayed from the store")
+        elif main_images[event['eventId']] != event.get('imageUrl'):
+            errors.append(f"{event['title']!r} has main image {main_images[event['eventId']]!r} when replayed, "
+                          f"{event.get('imageUrl')!r} when scraped")
+    return errors
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that events replayed from the article store keep the main "
+                                                 "image the scrape gave them")
+    parser.add_argument('--archive', default=ARCHIVE_PATH)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging('ERROR')
+    with open(args.archive, 'r', encoding='utf-8') as f:
+        records = with_image_lists(json.load(f))
+
+    store_dir = tempfile.mkdtemp(prefix='hoyolab-fixtures-')
+    work_dir = tempfile.mkdtemp(prefix='article-store-images-')
+    store = FixtureStore(store_dir)
+    import_archive(store, records)
+    for record in records:
+        url = record['image_list'][0]['url']
+        store.add(fixture_key(url), 'image', f"image {record['id']}".encode('utf-8'), 'image/png', url=url)
+    server = start_server(store, latency=0)
+    fetching.API_BASE_URL = server.base_url  # Read on every call, so this points the fetch layer at the stand-in
+    get_client().cache = None
+    engine = SentimentEngine()
+    engine._analyzer = FakeAnalyzer()
+    enrichment._sentiment_engine = engine
+
+    cwd = os.getcwd()
+    try:
+        errors = check(work_dir)
+        print(f"main images: {'✓' if not errors else '⚠ ' + '; '.join(errors)}")
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(store_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
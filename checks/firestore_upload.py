@@ -0,0 +1,124 @@
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_firestore import FakeFirestore
+from firestore_sync import SyncManifest
+from publishing import upload_to_firestore
+from run_metrics import configure_logging
+
+EVENTS_PATH = os.path.join(ROOT, 'formatted_events.json')
+
+
+def stored_events(db):
+    return db.collections.get('events', {})
+
+
+def upload(events, db, manifest_path, batch_size, sync_source='manifest'):
+    """One upload_to_firestore run, returning whether it succeeded and how many documents it wrote"""
+    writes = db.writes
+    succeeded = upload_to_firestore(events, db=db, batch_size=batch_size, manifest_path=manifest_path,
+                                    sync_source=sync_source)
+    return succeeded, db.writes - writes
+
+
+def check_repeat(events, work_dir, batch_size):
+    """Errors found when the same events are uploaded twice, then again with one of them edited"""
+    db = FakeFirestore()
+    manifest_path = os.path.join(work_dir, 'repeat_manifest.json')
+    errors = []
+
+    succeeded, written = upload(events, db, manifest_path, batch_size)
+    if not succeeded or written != len(events):
+        errors.append(f"the first upload wrote {written} of {len(events)} events")
+    if stored_events(db) != {event['eventId']: event for event in events}:
+        errors.append("the stored documents differ from the uploaded events")
+
+    succeeded, written = upload(events, db, manifest_path, batch_size)
+    if not succeeded or written:
+        errors.append(f"uploading the same events again wrote {written} documents")
+
+    edited = copy.deepcopy(events)
+    edited[0]['title'] += ' (edited)'
+    edited[0]['lastUpdated'] = 'later'
+    succeeded, written = upload(edited, db, manifest_path, batch_size)
+    if not succeeded or written != 1:
+        errors.append(f"uploading with one event edited wrote {written} documents instead of 1")
+    return errors
+
+
+def check_rebuilt_manifest(events, work_dir, batch_size):
+    """Errors found when the manifest is lost and rebuilt from documents carrying fields from older runs"""
+    db = FakeFirestore()
+    manifest_path = os.path.join(work_dir, 'rebuilt_manifest.json')
+    upload(events, db, manifest_path, batch_size)
+    for document in stored_events(db).values():
+        document['lastUpdated'] = 'an earlier run'
+        document['legacyField'] = 'merged in by an older formatter'
+    os.remove(manifest_path)
+
+    succeeded, written = upload(events, db, manifest_path, batch_size, sync_source='firestore')
+    if not succeeded or written:
+        return [f"with the manifest rebuilt from the collection, unchanged events caused {written} writes"]
+    return []
+
+
+def check_failure(events, work_dir, batch_size):
+    """Errors found when one document keeps failing: it should be the only one left out, and written next run"""
+    failing = events[len(events) // 2]['eventId']
+    db = FakeFirestore(fail_ids=[failing])
+    manifest_path = os.path.join(work_dir, 'failure_manifest.json')
+    errors = []
+
+    succeeded, written = upload(events, db, manifest_path, batch_size)
+    if not succeeded or written != len(events) - 1:
+        errors.append(f"with {failing} failing, {written} of the other {len(events) - 1} events were written")
+    if failing in stored_events(db):
+        errors.append(f"{failing} was stored although every write of it failed")
+    if failing in SyncManifest.load(manifest_path).entries:
+        errors.append(f"the sync manifest lists {failing}, so it would not be retried")
+
+    db.fail_ids.clear()
+    succeeded, written = upload(events, db, manifest_path, batch_size)
+    if not succeeded or written != 1 or failing not in stored_events(db):
+        errors.append(f"once {failing} could be written the next upload wrote {written} documents instead of 1")
+    return errors
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that repeated Firestore uploads only write what changed "
+                                                 "and that a failing document does not hold up the others")
+    parser.add_argument('--events', default=EVENTS_PATH, help="formatted events to upload")
+    parser.add_argument('--batch-size', type=int, default=8,
+                        help="writes per batch, small so the events span several batches")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging('CRITICAL')  # The failing document's errors are expected
+    with open(args.events, 'r', encoding='utf-8') as f:
+        events = json.load(f)
+
+    work_dir = tempfile.mkdtemp(prefix='firestore-upload-')
+    failed = False
+    try:
+        for name, check in (('repeat upload', check_repeat), ('rebuilt manifest', check_rebuilt_manifest),
+                            ('failing document', check_failure)):
+            errors = check(events, work_dir, args.batch_size)
+            failed = failed or bool(errors)
+            print(f"{name}: {'✓' if not errors else '⚠ ' + '; '.join(errors)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from run_metrics import configure_logging
+from sentiment import MAX_COMMENT_CHARS, SentimentEngine, prepare_comments
+
+MODEL_MAX_TOKENS = 512
+
+COMMENTS = [
+    {'content': "Best event in a while, the story was beautiful", 'likes': 3},
+    # Over 512 tokens even when cut to MAX_COMMENT_CHARS, as each character is a token
+    {'content': "活动很好玩，奖励也不错" * (MAX_COMMENT_CHARS // 11 + 1), 'likes': 5},
+    {'content': "Too grindy for the rewards. " * 60, 'likes': 1},  # Cut to MAX_COMMENT_CHARS, under 512 tokens
+    {'content': "Fine I guess", 'likes': 0},
+]
+
+
+class FakeAnalyzer:
+    """Counts a token per word or CJK character and, like BERT, fails on more than 512 unless truncating"""
+
+    def __call__(self, texts, truncation=False, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        return [self.classify(text, truncation) for text in texts]
+
+    def classify(self, text, truncation):
+        tokens = [token for word in text.split() for token in ([word] if word.isascii() else list(word))]
+        if len(tokens) > MODEL_MAX_TOKENS:
+            if not truncation:
+                raise RuntimeError(f"The size of tensor a ({len(tokens)}) must match the size of tensor b "
+                                   f"({MODEL_MAX_TOKENS}) at non-singleton dimension 1")
+            tokens = tokens[:MODEL_MAX_TOKENS]
+        return {'label': f"{sum(map(len, tokens)) % 5 + 1} stars", 'score': 1.0}
+
+
+def baseline_scores(analyzer, comments):
+    """Scores as the scraper gave them before batching: one model call per comment, failures left out"""
+    scores = []
+    for text, _ in prepare_comments(comments):
+        try:
+            scores.append(int(analyzer(text)[0]['label'].split()[0]))
+        except Exception:
+            scores.append(None)
+    return scores
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that batched sentiment scores a comment longer than the "
+                                                 "model's 512 tokens as scoring comments one by one did")
+    parser.add_argument('--model', action='store_true',
+                        help="use the real sentiment model (needs transformers and torch) instead of a stand-in")
+    parser.add_argument('--batch-size', type=int, default=4)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging('CRITICAL')  # The long comment's batch failure is expected
+    engine = SentimentEngine(batch_size=args.batch_size)
+    if not args.model:
+        engine._analyzer = FakeAnalyzer()
+    analyzer = engine.get_analyzer()
+
+    expected = baseline_scores(analyzer, COMMENTS)
+    scores = engine.run_model([text for text, _ in prepare_comments(COMMENTS)])
+    if scores != expected:
+        print(f"long comments: ⚠ batched scores {scores}, one by one {expected}")
+        return 1
+    print(f"long comments: ✓ ({sum(score is None for score in scores)} over the token limit left unscored)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import enrichment
+import fetching
+import main as scraper
+from hoyolab_server import start_server
+from http_client import get_client
+from http_fixtures import FixtureStore, import_archive
+from run_metrics import configure_logging
+from sentiment import SentimentEngine
+
+ARCHIVE_PATH = os.path.join(ROOT, 'raw_articles.json')
+
+
+class FakeAnalyzer:
+    """A fixed star rating per text, so no model has to load"""
+
+    def __call__(self, texts, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        return [{'label': f"{len(text) % 5 + 1} stars", 'score': 1.0} for text in texts]
+
+
+def scrape(work_dir, pipelined=False):
+    """One incremental run of scrape_hoyolab with its state and output files in work_dir"""
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    events = scraper.scrape_hoyolab(article_limit=20, concurrent=True, requests_per_second=1000, max_in_flight=4,
+                                    sentiment_cache=False, pipelined=pipelined)
+    for event in events:
+        event.pop('lastUpdated', None)
+    return events
+
+
+def failing_fetch(post_ids):
+    """get_article_content, except that fetching any of the given posts fails"""
+    fetch = fetching.get_article_content
+
+    def get_article_content(post_id, limiter=None, refresh=False):
+        if str(post_id) in post_ids:
+            return None
+        return fetch(post_id, limiter, refresh)
+    return get_article_content
+
+
+def check(records, title, work_dir, pipelined=False):
+    """Errors found when one event's content fetch fails on the first run and works on the second"""
+    expected = scrape(os.path.join(work_dir, 'clean'), pipelined)
+
+    post_ids = {str(record['id']) for record in records if record['title'].startswith(title)}
+    original = fetching.get_article_content
+    fetching.get_article_content = failing_fetch(post_ids)  # Every content fetch goes through this
+    try:
+        first = scrape(os.path.join(work_dir, 'retry'), pipelined)
+    finally:
+        fetching.get_article_content = original
+    second = scrape(os.path.join(work_dir, 'retry'), pipelined)
+
+    errors = []
+    if any(event['title'].startswith(title) for event in first):
+        errors.append(f"{title!r} was processed although its content fetch failed")
+    if second != expected:
+        missing = sorted({event['title'] for event in expected} - {event['title'] for event in second})
+        errors.append(f"the second run gave {len(second)} events instead of {len(expected)}, missing {missing}")
+    with open(os.path.join(work_dir, 'retry', scraper.STATE_PATH), 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    for article_id, entry in state['articles'].items():
+        if entry['title'].startswith(title) and entry['event'] is None:
+            errors.append(f"the scrape state keeps {title!r} ({article_id}) with no event")
+    return errors
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that an event whose content fetch failed is processed "
+                                                 "on the next run")
+    parser.add_argument('--archive', default=ARCHIVE_PATH)
+    parser.add_argument('--title', default="Enscrolled Crepusculum",
+                        help="start of the title of the event whose first fetch fails")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging('ERROR')
+    with open(args.archive, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+
+    store_dir = tempfile.mkdtemp(prefix='hoyolab-fixtures-')
+    work_dir = tempfile.mkdtemp(prefix='state-retry-')
+    store = FixtureStore(store_dir)
+    import_archive(store, records)
+    server = start_server(store, latency=0)
+    fetching.API_BASE_URL = server.base_url  # Read on every call, so this points the fetch layer at the stand-in
+    client = get_client()
+    client.cache = None
+    client.backoff_base = 0.01
+    engine = SentimentEngine()
+    engine._analyzer = FakeAnalyzer()
+    enrichment._sentiment_engine = engine
+
+    cwd = os.getcwd()
+    failed = False
+    try:
+        for pipelined in (False, True):
+            mode = 'pipelined' if pipelined else 'two-pass'
+            errors = check(records, args.title, os.path.join(work_dir, mode), pipelined)
+            failed = failed or bool(errors)
+            print(f"{mode}: {'✓' if not errors else '⚠ ' + '; '.join(errors)}")
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(store_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
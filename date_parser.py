@@ -0,0 +1,244 @@
+import logging
+import re
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = "%Y/%m/%d %H:%M:%S"
+
+# A date always has its first "/" four characters in, so matching is anchored on slashes
+DATE_PATTERN = re.compile(r"\d\d\d\d/\d\d?/\d\d?\s+\d\d:\d\d:\d\d")
+VERSION_PATTERN = re.compile(r"after the Version (\d+\.\d+) update", re.IGNORECASE)
+SERVER_TIME_SUFFIX = re.compile(r"\s*\(server time\)")
+UTC8_SUFFIX = re.compile(r"\s*\(UTC\+8\)")
+DASHES = ('–', '-')
+
+
+class DateToken:
+    """A date found in the text along with what surrounds it"""
+
+    __slots__ = ('text', 'start', 'end', 'after_dash', 'before_dash', 'server_time', 'utc8',
+                 'after_event_period', 'after_period', 'after_until')
+
+    def __init__(self, text, start, end):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.after_dash = False          # "– 2025/..."
+        self.before_dash = False         # "2025/... –"
+        self.server_time = False         # "2025/... (server time)"
+        self.utc8 = False                # "2025/... (UTC+8)"
+        self.after_event_period = False  # "Event Period 2025/..."
+        self.after_period = False        # "Period: 2025/..."
+        self.after_until = None          # Position of "until" in "until 2025/..."
+
+
+class DateScan:
+    """Positioned tokens from a single scan of an article's text.
+
+    Dates are found by jumping between "/" characters and matching in place,
+    which is much cheaper than running a date regex over every position. The
+    version reference and the first "Period" / "from after Version" anchors
+    are located once, and everything else is read off the text right around
+    each date.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.dates = []
+
+        self.version = referenced_version(text)
+
+        period = text.find("Period")
+        self.first_period = period if period != -1 else None
+
+        from_after = text.find("from after Version")
+        self.first_from_after = from_after + len("from after Version") if from_after != -1 else None
+
+        self._scan_dates()
+
+    def _scan_dates(self):
+        text = self.text
+        end = 0
+        slash = text.find('/', 4)
+        while slash != -1:
+            start = slash - 4
+            if start >= end:
+                match = DATE_PATTERN.match(text, start)
+                if match:
+                    token = DateToken(match.group(), start, match.end())
+                    self._annotate(token)
+                    self.dates.append(token)
+                    end = match.end()
+            slash = text.find('/', slash + 1)
+
+    def _annotate(self, token):
+        text = self.text
+
+        # Walk back over whitespace to see what the date follows
+        before = token.start
+        while before > 0 and text[before - 1].isspace():
+            before -= 1
+        if before > 0 and text[before - 1] in DASHES:
+            token.after_dash = True
+        if before < token.start:
+            if text.endswith("Event Period", 0, before):
+                token.after_event_period = True
+            if text.endswith("until", 0, before):
+                token.after_until = before - len("until")
+
+        # "Period" followed by any run of colons and spaces
+        before = token.start
+        while before > 0 and text[before - 1] in ': ':
+            before -= 1
+        if before < token.start and text.endswith("Period", 0, before):
+            token.after_period = True
+
+        # Look ahead over whitespace to see what the date is followed by
+        after = token.end
+        while after < len(text) and text[after].isspace():
+            after += 1
+        if after < len(text) and text[after] in DASHES:
+            token.before_dash = True
+        token.server_time = SERVER_TIME_SUFFIX.match(text, token.end) is not None
+        token.utc8 = UTC8_SUFFIX.match(text, token.end) is not None
+
+    def first(self, predicate):
+        for token in self.dates:
+            if predicate(token):
+                return token
+        return None
+
+    def first_dash_after(self, position):
+        found = [index for index in (self.text.find(dash, position) for dash in DASHES) if index != -1]
+        return min(found) if found else None
+
+
+def referenced_version(text):
+    """The version an event starts "after the Version X update" of, if any"""
+    match = VERSION_PATTERN.search(text)
+    return match.group(1) if match else None
+
+
+def date_range(start_date, end_date, version=None):
+    dates = {
+        'startDate': start_date.isoformat(),
+        'endDate': end_date.isoformat(),
+        'startTimestamp': int(start_date.timestamp() * 1000),
+        'endTimestamp': int(end_date.timestamp() * 1000)
+    }
+    if version is not None:
+        dates['version'] = version
+    return dates
+
+
+def find_end_date(scan, log):
+    """The end date is the first date after a dash, with fallbacks for other layouts"""
+    token = scan.first(lambda t: t.after_dash)
+    if token:
+        return token
+
+    # Look for date with server time mention
+    token = scan.first(lambda t: t.server_time)
+    if not token and scan.first_period is not None:
+        # Look after "Period" (or "Event Period") with dash
+        dash = scan.first_dash_after(scan.first_period + len("Period"))
+        if dash is not None:
+            token = scan.first(lambda t: t.start > dash)
+    if not token:
+        # Look for date with UTC+8 mention
+        token = scan.first(lambda t: t.utc8)
+
+    if token:
+        log(f"Found end date using alternative pattern: {token.text}")
+    return token
+
+
+def find_start_date(scan, end_date, log):
+    """Try explicit start date layouts in order of reliability"""
+    candidates = [
+        lambda t: t.before_dash,          # Standard format with dash
+        lambda t: t.after_event_period,   # After Event Period
+        lambda t: t.after_period,         # After Period:
+    ]
+    if scan.first_from_after is not None:
+        # From after Version until date
+        candidates.append(lambda t: t.after_until is not None and t.after_until >= scan.first_from_after)
+
+    for predicate in candidates:
+        token = scan.first(predicate)
+        if not token:
+            continue
+        log(f"Found start date using pattern: {token.text}")
+        start_date = datetime.strptime(token.text.strip(), DATE_FORMAT)
+        if start_date < end_date:
+            return start_date
+        log(f"Warning: Start date {start_date} would be after end date {end_date}")
+    return None
+
+
+def extract_event_dates(text, version_updates=None, debug=True):
+    """Extract start and end dates from an article in a single tokenising pass.
+
+    Returns the same dict as parse_event_dates, or None when no usable range
+    is found. `debug` switches the step by step debug logging on or off.
+    """
+    log = logger.debug if debug and logger.isEnabledFor(logging.DEBUG) else (lambda *args: None)
+    log("\nTrying to parse dates from:")
+    log(text[:200] + "..." if len(text) > 200 else text)
+
+    scan = DateScan(text)
+
+    end_token = find_end_date(scan, log)
+    if not end_token:
+        log("No end date found using any pattern")
+        return None
+
+    try:
+        end_date_str = end_token.text.strip()
+        log(f"Extracted end date: {end_date_str}")
+        end_date = datetime.strptime(end_date_str, DATE_FORMAT)
+
+        # If this mentions a version update and we have version data
+        if scan.version and version_updates:
+            version = scan.version
+            log(f"Found version reference: {version}")
+
+            if version not in version_updates:
+                log(f"Warning: Version {version} not found in version_updates")
+                return None
+
+            # Convert the stored ISO format string back to datetime
+            start_date = datetime.fromisoformat(version_updates[version]['versionStart'])
+            log(f"Using version {version} start time: {start_date}")
+
+            # Only return if start date is before end date
+            if start_date < end_date:
+                return date_range(start_date, end_date, version)
+            log(f"Warning: Version start date {start_date} would be after end date {end_date}")
+            return None
+
+        start_date = find_start_date(scan, end_date, log)
+        if start_date:
+            return date_range(start_date, end_date)
+
+        # Otherwise use the first other date in the text that comes before the end date
+        if len(scan.dates) >= 2:
+            log(f"Found {len(scan.dates)} dates in text")
+            for token in scan.dates:
+                if token.text == end_date_str:
+                    continue  # Skip the end date
+                try:
+                    potential_start = datetime.strptime(token.text, DATE_FORMAT)
+                except ValueError:
+                    continue  # Skip invalid dates
+                if potential_start < end_date:
+                    log(f"Using date as start: {token.text}")
+                    return date_range(potential_start, end_date)
+
+        log("No valid start date pattern found")
+        return None
+
+    except ValueError as e:
+        log(f"Error parsing dates: {e}")
+        return None
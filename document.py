@@ -0,0 +1,112 @@
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# One pass over the text finds both the runs of HTML tags and whitespace that
+# collapse to a single space (lone spaces are already fine and left alone) and
+# the "▌"/"●" markers glued to the word after them
+NORMALISE_PATTERN = re.compile(
+    r" (?:<[^>]+>|\s)+"
+    r"|(?:<[^>]+>|[^\S ])(?:<[^>]+>|\s)*"
+    r"|▌(?=Event)"
+    r"|●(?=During|From|If|After)"
+)
+MARKERS = ('▌', '●')
+
+
+class ArticleDocument:
+    """A post's structured_content (a Quill delta) parsed once.
+
+    The JSON is decoded and the ops walked a single time, collecting the text
+    runs, section headers, bullet points and image inserts that the content
+    extraction, event formatting and debug scripts each used to dig out of the
+    raw string themselves.
+    """
+
+    def __init__(self, ops):
+        if not isinstance(ops, list):
+            raise TypeError(f"structured_content should be a list of ops, got {type(ops).__name__}")
+        self.ops = ops
+        self.text_runs = []       # Text of every op in order, images left out
+        self.headers = []         # "▌" section header runs
+        self.bullets = []         # "●" bullet point runs
+        self.event_details = []   # Runs of the "▌Event Details" section, header included
+        self.section_images = {}  # Section name -> image directly below its header
+        self.images = []          # src of each {'type': 'image'} insert, None if it has none
+        self._walk()
+
+    @classmethod
+    def parse(cls, structured_content):
+        """Raises json.JSONDecodeError or TypeError if the content is not a delta"""
+        return cls(json.loads(structured_content))
+
+    def _walk(self):
+        ops = self.ops
+        in_event_details = False
+        for i, op in enumerate(ops):
+            if not isinstance(op, dict):
+                raise TypeError(f"structured_content op {i} is not an object")
+            if 'insert' not in op:
+                continue
+
+            insert_value = op['insert']
+            if isinstance(insert_value, str):
+                self.text_runs.append(insert_value)
+                if '▌' in insert_value:
+                    self.headers.append(insert_value)
+                if '●' in insert_value:
+                    self.bullets.append(insert_value)
+
+                if '▌Event Details' in insert_value:
+                    in_event_details = True
+                    self.event_details.append(insert_value)
+                elif in_event_details and '●' in insert_value:
+                    self.event_details.append(insert_value)
+
+                # Event Rewards is usually followed straight away by an image of the rewards
+                if '▌Event Rewards' in insert_value and i + 1 < len(ops):
+                    next_insert = ops[i + 1].get('insert') if isinstance(ops[i + 1], dict) else None
+                    if isinstance(next_insert, dict) and 'image' in next_insert:
+                        self.section_images['Event Rewards'] = next_insert['image']
+
+            elif isinstance(insert_value, dict):
+                if insert_value.get('type') == 'image':
+                    self.images.append(insert_value.get('attributes', {}).get('src'))
+                if 'image' in insert_value:
+                    continue
+                if 'text' in insert_value:
+                    self.text_runs.append(insert_value['text'])
+
+    def text(self):
+        return ''.join(self.text_runs)
+
+    def image_urls(self):
+        """Image sources that are actually set, in document order"""
+        return [src for src in self.images if src]
+
+
+def normalise_text(text):
+    """Strip HTML tags, collapse whitespace and space out section markers and bullets"""
+    return NORMALISE_PATTERN.sub(_normalise_match, text).strip()
+
+
+def _normalise_match(match):
+    found = match.group()
+    return found + ' ' if found in MARKERS else ' '
+
+
+def article_document(article):
+    """The parsed document for an article dict, parsed on first use and kept on the article"""
+    if 'document' not in article:
+        structured_content = (article.get('raw_post_data', {}).get('structured_content', '')
+                              or article.get('structured_content', ''))
+        document = None
+        if structured_content:
+            try:
+                document = ArticleDocument.parse(structured_content)
+            except (json.JSONDecodeError, TypeError) as e:
+                logger.warning("Error parsing structured content: %s", e)
+        article['document'] = document
+    return article['document']
@@ -0,0 +1,189 @@
+import logging
+from datetime import datetime
+
+from document import article_document
+from fetching import get_article_comments, iter_article_comments, sample_comments
+from image_fetch import ImageStore
+from image_variants import create_variants
+from run_metrics import get_metrics
+from sentiment import SentimentEngine
+from sentiment_cache import SentimentCache
+
+logger = logging.getLogger(__name__)
+
+# Shared across every event so the BERT weights are only loaded once per run
+_sentiment_engine = None
+
+def get_sentiment_engine(batch_size=None, use_cache=True, backend=None, num_threads=None):
+    """Return the process-wide sentiment engine, creating it on first use"""
+    global _sentiment_engine
+    if _sentiment_engine is None:
+        _sentiment_engine = SentimentEngine(cache=SentimentCache() if use_cache else None,
+                                            backend=backend or 'pipeline', num_threads=num_threads)
+    if batch_size:
+        _sentiment_engine.batch_size = batch_size
+    return _sentiment_engine
+
+_image_store = None
+
+def get_image_store(max_workers=None):
+    """Return the process-wide image store, creating it on first use"""
+    global _image_store
+    if _image_store is None:
+        _image_store = ImageStore()
+    if max_workers:
+        _image_store.max_workers = max_workers
+    return _image_store
+
+def analyze_sentiment(comments, engine=None):
+    # Analyze sentiment of comments using BERT with improved handling of long texts
+    # The model is loaded once and shared, see get_sentiment_engine()
+    # comments can be a list or a lazy stream such as sample_comments(iter_article_comments(...))
+    engine = engine or get_sentiment_engine()
+    return engine.analyze_stream(comments)
+
+def format_event_for_firestore(article, dates, sentiment=None, sentiment_engine=None, image_store=None,
+                               comment_sampling=None):
+    # Format article data with sentiment analysis, validated dates, and enhanced image extraction
+    # Pass a precomputed sentiment to skip fetching and scoring comments here, or False to leave it out
+    # comment_sampling holds sample_comments() options for the comments fetched otherwise
+    # Get raw post data for better description and image extraction
+    raw_post_data = article.get('raw_post_data', {})
+    clean_description = raw_post_data.get('desc', '') or article.get('description', '')
+    
+    # Get the full text including all sections and bullet points
+    full_text = article.get('full_text', '')
+    
+    # Extract bullet points and event details if not already in full text
+    if '▌ Event Details' not in full_text or '● ' not in full_text:
+        document = article_document(article)
+        # If we have event details and they're not in the full text, add them
+        if document and document.event_details and '▌ Event Details' not in full_text:
+            logger.debug("Adding missing event details to description")
+            full_text += "\n" + "".join(document.event_details)
+    
+    # Create base event data
+    event_data = {
+        'eventId': article.get('id'),
+        'title': article.get('title'),
+        'description': full_text,  # Use the complete full text with all sections
+        'startDate': dates['startDate'],
+        'endDate': dates['endDate'],
+        'startTimestamp': dates['startTimestamp'],
+        'endTimestamp': dates['endTimestamp'],
+        'lastUpdated': datetime.now().isoformat()
+    }
+    
+    # Add sentiment analysis
+    if sentiment is None:
+        comments = sample_comments(iter_article_comments(article['id']), **(comment_sampling or {}))
+        sentiment = analyze_sentiment(comments, engine=sentiment_engine)
+    if sentiment is not False:
+        event_data['sentiment'] = sentiment
+    
+    # Add version if available
+    if 'version' in dates:
+        event_data['version'] = dates['version']
+    
+    # Download the section and main images in one go, reusing any already stored
+    section_images = article.get('section_images', {})
+    image_url = find_main_image_url(article)
+    store = image_store or get_image_store()
+    stored = store.fetch_all(list(section_images.values()) + ([image_url] if image_url else []))
+    
+    section_image_paths = {}
+    for section_name, section_url in section_images.items():
+        # Store the original URL as fallback in case download failed
+        section_image_paths[section_name] = stored.get(section_url) or section_url
+    
+    # Add section images to event data
+    if section_image_paths:
+        event_data['sectionImages'] = section_image_paths
+        logger.debug("Added %d section images to event data", len(section_image_paths))
+    
+    # Add image URL to event data
+    local_image_path = stored.get(image_url) if image_url else None
+    if local_image_path:
+        event_data['imageUrl'] = local_image_path
+        logger.debug("Added imageUrl to event: %s", local_image_path)
+        image_variants = store.variants(image_url)
+        if image_variants:
+            event_data['imageVariants'] = image_variants
+    elif image_url:
+        event_data['imageUrl'] = image_url
+        logger.warning("Using remote imageUrl (download failed): %s", image_url)
+    
+    return event_data
+
+def find_main_image_url(article, verbose=True):
+    """Pick the event's main image: image_list first, then the cover, then the post body"""
+    log = logger.debug if verbose else (lambda *args: None)
+    log("Extracting main image for event: %s", article.get('title'))
+    image_url = None
+    
+    # METHOD 1: Check image_list first (most direct and reliable)
+    image_list = article.get('image_list', [])
+    if image_list and len(image_list) > 0:
+        image_url = image_list[0].get('url')
+        log("Found image URL in image_list: %s", image_url)
+    
+    # METHOD 2: Check cover field if no image in image_list
+    if not image_url and article.get('cover'):
+        image_url = article.get('cover')
+        log("Found image URL in cover field: %s", image_url)
+    
+    # METHOD 3: Try to extract from structured_content if still no image
+    if not image_url:
+        document = article_document(article)
+        image_urls = document.image_urls() if document else []
+        if image_urls:
+            image_url = image_urls[0]
+            log("Found image URL in structured_content: %s", image_url)
+    
+    # If no image found after all attempts
+    if not image_url and verbose:
+        logger.warning("No image found for event: %s", article.get('title'))
+    return image_url
+
+def event_image_urls(article):
+    """Every image an event will need, for downloading ahead of formatting"""
+    urls = list(article.get('section_images', {}).values())
+    image_url = find_main_image_url(article, verbose=False)
+    if image_url:
+        urls.append(image_url)
+    return urls
+
+def enrich_events(dated_articles, limiter, executor, comment_sampling, sentiment_engine, image_store,
+                  image_processes=None):
+    # Comments, sentiment, images and formatting for (article, dates) pairs, shared by the
+    # two-pass scrape and the backfill. Returns {article id: formatted event}
+    metrics = get_metrics()
+    
+    # Score the comments of every event in one batched pass so the model is only run once
+    post_ids = [article['id'] for article, _ in dated_articles]
+    with metrics.span('comments', items=len(post_ids)):
+        if executor:
+            comment_lists = list(executor.map(
+                lambda post_id: get_article_comments(post_id, limiter, **comment_sampling), post_ids))
+        else:
+            comment_lists = [get_article_comments(post_id, **comment_sampling) for post_id in post_ids]
+    with metrics.span('sentiment', items=len(comment_lists)):
+        sentiments = sentiment_engine.analyze_many(comment_lists)
+    
+    # Download every event's images together so they overlap and shared images are fetched once
+    with metrics.span('images', items=len(dated_articles)):
+        image_store.fetch_all([url for article, _ in dated_articles for url in event_image_urls(article)])
+    # Then resize the main images on a process pool, skipping any done on earlier runs
+    main_image_urls = [find_main_image_url(article, verbose=False) for article, _ in dated_articles]
+    create_variants(image_store, [url for url in main_image_urls if url], max_workers=image_processes)
+    
+    new_events = {}
+    for (article, dates), sentiment in zip(dated_articles, sentiments):
+        with metrics.span('format'):
+            formatted_event = format_event_for_firestore(article, dates, sentiment=sentiment, image_store=image_store)
+        if formatted_event:
+            new_events[article['id']] = formatted_event
+            metrics.increment('events_processed')
+            logger.debug("Successfully processed event: %s", article['title'])
+    
+    return new_events
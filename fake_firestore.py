@@ -0,0 +1,108 @@
+import copy
+import random
+import threading
+import time
+
+
+class FakeFirestore:
+    """In-process stand-in for the parts of the Firestore client the scraper uses.
+
+    Supports collection().document().set/get/delete, collection().stream() and
+    write batches. `latency` adds a delay to every commit and `fail_ids` /
+    `failure_rate` make commits touching those documents raise, so batching and
+    retry behaviour can be exercised without a real project or the emulator.
+    """
+
+    def __init__(self, latency=0.0, fail_ids=None, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.fail_ids = set(fail_ids or [])
+        self.failure_rate = failure_rate
+        self.collections = {}
+        self.commits = 0
+        self.writes = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def _apply(self, operations):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            for collection, doc_id, _, _ in operations:
+                if doc_id in self.fail_ids:
+                    raise RuntimeError(f"Simulated failure writing {collection}/{doc_id}")
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                raise RuntimeError("Simulated commit failure")
+
+            for collection, doc_id, data, merge in operations:
+                documents = self.collections.setdefault(collection, {})
+                if data is None:
+                    documents.pop(doc_id, None)
+                elif merge and doc_id in documents:
+                    documents[doc_id].update(copy.deepcopy(data))
+                else:
+                    documents[doc_id] = copy.deepcopy(data)
+            self.commits += 1
+            self.writes += len(operations)
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocument(self.db, self.name, str(doc_id))
+
+    def stream(self):
+        with self.db._lock:
+            documents = list(self.db.collections.get(self.name, {}).items())
+        return [FakeSnapshot(doc_id, data) for doc_id, data in documents]
+
+
+class FakeDocument:
+    def __init__(self, db, collection, doc_id):
+        self.db = db
+        self.collection = collection
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self.db._apply([(self.collection, self.id, data, merge)])
+
+    def delete(self):
+        self.db._apply([(self.collection, self.id, None, False)])
+
+    def get(self):
+        with self.db._lock:
+            data = self.db.collections.get(self.collection, {}).get(self.id)
+        return FakeSnapshot(self.id, data)
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = copy.deepcopy(data)
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.operations = []
+
+    def set(self, doc_ref, data, merge=False):
+        self.operations.append((doc_ref.collection, doc_ref.id, data, merge))
+
+    def delete(self, doc_ref):
+        self.operations.append((doc_ref.collection, doc_ref.id, None, False))
+
+    def commit(self):
+        self.db._apply(self.operations)
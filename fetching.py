@@ -0,0 +1,297 @@
+import heapq
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import requests
+
+from document import ArticleDocument, normalise_text
+from http_client import get_client
+from run_metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Point this at a local stand-in server to run the scraper without hitting HoYoLab
+API_BASE_URL = os.environ.get('HOYOLAB_API_BASE', 'https://bbs-api-os.hoyolab.com')
+
+
+class ApiError(requests.exceptions.HTTPError):
+    """A response HoYoLab sent with a non-zero retcode, usually as HTTP 200"""
+
+def get_headers():
+    return {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'application/json',
+        'Accept-Language': 'en-US,en;q=0.9'
+    }
+
+def add_delay(min_seconds=2, max_seconds=5):
+    """Add a random delay between requests to be respectful to the server"""
+    delay = random.uniform(min_seconds, max_seconds)
+    logger.debug("Waiting %.1f seconds before next request...", delay)
+    time.sleep(delay)
+
+def throttle(limiter=None):
+    """Wait before a request: a random delay in serial mode, the shared rate limiter in concurrent mode"""
+    if limiter is None:
+        add_delay()
+        return nullcontext()
+    return limiter
+
+def get_article_list(last_id="", limiter=None, raise_errors=False):
+    # Fetch articles with rate limiting
+    # A failed request or a non-zero retcode reads as an empty last page unless raise_errors is set,
+    # which also requires the page to say whether it is the last
+    base_url = f"{API_BASE_URL}/community/post/wapi/getNewsList"
+    params = {
+        'gids': '6',
+        'page_size': '20',
+        'type': '1',
+        'last_id': last_id
+    }
+    
+    try:
+        # Add delay before each request that actually goes to the network
+        response = get_client().get(base_url, endpoint='getNewsList', params=params, headers=get_headers(),
+                                    throttle=lambda: throttle(limiter))
+        response.raise_for_status()
+        
+        data = response.json()
+        if data.get('retcode', 0) != 0:
+            raise ApiError(f"getNewsList returned retcode {data.get('retcode')}: {data.get('message')}",
+                           response=response)
+        page = data.get('data') or {}
+        if raise_errors and 'is_last' not in page:
+            raise ApiError("getNewsList returned a page without is_last", response=response)
+        articles = []
+        list_data = page.get('list', [])
+        
+        for item in list_data:
+            post = item.get('post', {})
+            if not post:
+                continue
+                
+            article = {
+                'id': post.get('post_id'),
+                'title': post.get('subject'),
+                'description': post.get('desc'),
+                'content': post.get('content'),
+                'updated': post.get('last_modify_time') or post.get('created_at')
+            }
+            
+            articles.append(article)
+            logger.debug("Found article: %s", article['title'])
+            
+        return articles, page.get('last_id', ''), page.get('is_last', True)
+    
+    except requests.exceptions.RequestException as e:
+        if raise_errors:
+            raise
+        logger.error("Error fetching article list: %s", e)
+        return [], "", True
+
+def iter_article_comments(post_id, limiter=None, page_size=20):
+    """Yield an article's comments page by page, following last_id only as far as the consumer reads"""
+    base_url = f"{API_BASE_URL}/community/post/wapi/getPostReplies"
+    last_id = ''
+    page = 0
+    
+    while True:
+        page += 1
+        params = {
+            'post_id': post_id,
+            'size': page_size,
+            'last_id': last_id
+        }
+        # Later pages wait their turn like any other request
+        page_throttle = (lambda: limiter or nullcontext()) if page == 1 else (lambda: throttle(limiter))
+        
+        try:
+            response = get_client().get(base_url, endpoint='getPostReplies', params=params, headers=get_headers(),
+                                        throttle=page_throttle)
+            response.raise_for_status()
+            data = response.json().get('data') or {}
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Error fetching comments: %s", e)
+            return
+        
+        replies = data.get('list', [])
+        for reply in replies:
+            yield {
+                'content': reply.get('reply', {}).get('content', ''),
+                'likes': reply.get('reply', {}).get('like_num', 0)
+            }
+        
+        last_id = str(data.get('last_id') or '')
+        if not replies or data.get('is_last', True) or not last_id:
+            return
+
+def sample_comments(comments, max_comments=20, time_budget=None, top_n=None):
+    """Cap a comment stream by count and by seconds spent reading it, optionally keeping the top_n most liked.
+
+    Without top_n comments are passed through as they arrive.
+    """
+    def capped():
+        iterator = iter(comments)
+        deadline = time.monotonic() + time_budget if time_budget else None
+        count = 0
+        try:
+            while max_comments is None or count < max_comments:
+                if deadline is not None and time.monotonic() > deadline:
+                    logger.info("Comment time budget of %ss used up after %d comments", time_budget, count)
+                    break
+                comment = next(iterator, None)
+                if comment is None:
+                    break
+                count += 1
+                yield comment
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close:
+                close()  # Stop paging as soon as we have enough
+    
+    if top_n:
+        return heapq.nlargest(top_n, capped(), key=lambda comment: comment['likes'])
+    return capped()
+
+def get_article_comments(post_id, limiter=None, max_comments=20, time_budget=None, top_n=None):
+    """Fetch comments for an article, up to max_comments (one page by default)"""
+    comments = iter_article_comments(post_id, limiter)
+    return list(sample_comments(comments, max_comments, time_budget, top_n))
+
+def build_full_text(post_id, desc, structured_content, lang_content=''):
+    """Turn a post's content into the cleaned full text, returning (full_text, document, section_images)"""
+    # Extract section images from structured content
+    section_images = {}
+    
+    # Create a complete text representation from structured content
+    full_text = ""
+    bullet_points = []
+    document = None
+    
+    if structured_content:
+        try:
+            logger.debug("Parsing structured content for post %s", post_id)
+            # Parsed once here and reused by format_event_for_firestore
+            document = ArticleDocument.parse(structured_content)
+            full_text = document.text()
+            bullet_points = document.bullets
+            section_images = dict(document.section_images)
+            
+            for bullet in bullet_points:
+                logger.debug("Found bullet point: %s...", bullet[:50])
+            if 'Event Rewards' in section_images:
+                logger.debug("Found Event Rewards image: %s", section_images['Event Rewards'])
+            
+            logger.debug("Extracted text with length %d and %d bullet points", len(full_text), len(bullet_points))
+            
+            # If we found bullet points, make sure they're in the full text
+            if bullet_points and '●' not in full_text:
+                logger.debug("Adding missing bullet points to full text")
+                # Add missing bullet points to the full text
+                full_text += "\n▌Event Details\n" + "\n".join(bullet_points)
+            
+        except (json.JSONDecodeError, TypeError) as e:
+            logger.warning("Error parsing structured content for post %s: %s", post_id, e)
+            # Fall back to unstructured content
+            full_text = ' '.join(filter(None, [desc, structured_content]))
+    else:
+        # Fall back to unstructured content if no structured content
+        full_text = ' '.join(filter(None, [desc, lang_content]))
+    
+    # Clean up HTML tags and whitespace and fix up section markers and bullet points
+    full_text = normalise_text(full_text)
+    
+    # Add explicit formatting for event details section if missing
+    if 'Event Details' not in full_text and len(bullet_points) > 0:
+        full_text += "\n▌ Event Details\n" + "\n".join(bullet_points)
+    
+    return full_text, document, section_images
+
+def get_article_content(post_id, limiter=None, refresh=False):
+    # Fetch detailed article content with complete extraction of all sections including Event Details
+    # refresh skips the response cache's TTL, for posts known to have been edited
+    api_url = f"{API_BASE_URL}/community/post/wapi/getPostFull?post_id={post_id}&read=1&scene=1"
+    
+    try:
+        # Add delay before each request that actually goes to the network
+        response = get_client().get(api_url, endpoint='getPostFull', headers=get_headers(),
+                                    max_age=0 if refresh else None, throttle=lambda: throttle(limiter))
+        response.raise_for_status()
+        
+        data = response.json()
+        post_data = data.get('data', {}).get('post', {}).get('post', {})
+        
+        # Get image_list from the correct location
+        image_list = data.get('data', {}).get('post', {}).get('image_list', [])
+        
+        # Try to get content from different possible sources
+        structured_content = post_data.get('structured_content', '')
+        desc = post_data.get('desc', '')
+        multi_lang = post_data.get('multi_language_info', {})
+        lang_content = multi_lang.get('lang_content', {}).get('en-us', '')
+        
+        # Also get cover field which might contain an image
+        cover = post_data.get('cover', '')
+        
+        with get_metrics().span('content extraction'):
+            full_text, document, section_images = build_full_text(post_id, desc, structured_content, lang_content)
+        
+        # Log the final full text for debugging
+        logger.debug("Final full text excerpt (first 200 chars): %s...", full_text[:200])
+        
+        return {
+            'description': desc,
+            'content': structured_content or lang_content,
+            'full_text': full_text,
+            'structured_content': structured_content,
+            'raw_post_data': post_data,
+            'image_list': image_list,
+            'cover': cover,
+            'section_images': section_images,
+            'document': document
+        }
+    
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching article content: %s", e)
+        return None
+
+def needs_content(article):
+    """True if the article's full content still has to be fetched"""
+    return 'full_text' not in article and not article.get('cached')
+
+def fetch_article_content(article, limiter=None):
+    """Fetch a listed article's content, revalidating the cache if it was edited since the last run"""
+    return get_article_content(article['id'], limiter, refresh=article.get('changed', False))
+
+def iter_article_contents(articles, limiter, executor, window):
+    """Fetch article contents on the executor, yielding (article, content) in input order.
+
+    At most `window` fetches run ahead of the consumer and any that have not
+    started yet are cancelled when the consumer stops early. Articles that
+    already carry their full text, or are carried forward from the scrape
+    state, are passed through with no content.
+    """
+    pending = deque()
+    try:
+        for article in articles:
+            future = None
+            if needs_content(article):
+                future = executor.submit(fetch_article_content, article, limiter)
+            pending.append((article, future))
+            
+            if len(pending) >= window:
+                article, future = pending.popleft()
+                yield article, future.result() if future else None
+                
+        while pending:
+            article, future = pending.popleft()
+            yield article, future.result() if future else None
+    finally:
+        for _, future in pending:
+            if future:
+                future.cancel()
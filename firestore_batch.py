@@ -0,0 +1,97 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches with more operations than this
+FIRESTORE_BATCH_LIMIT = 500
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class BatchWriter:
+    """Commit document writes to one collection in Firestore batches.
+
+    Writes are grouped into batches of up to 500 operations and committed on
+    a small thread pool. A batch is atomic, so when a commit fails it is split
+    and retried until the failing documents are isolated; only those are
+    retried further, and any that still fail are reported back instead of
+    aborting the whole upload.
+
+    Works with firebase_admin's client, the Firestore emulator
+    (FIRESTORE_EMULATOR_HOST) or an in-process fake such as FakeFirestore.
+    """
+
+    def __init__(self, db, collection_name='events', batch_size=FIRESTORE_BATCH_LIMIT,
+                 max_concurrency=4, max_retries=2, retry_delay=1.0):
+        self.db = db
+        self.collection = db.collection(collection_name)
+        self.batch_size = max(1, min(batch_size, FIRESTORE_BATCH_LIMIT))
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.batch_reports = []
+
+    def commit(self, writes):
+        """Write (doc_id, data) pairs, where data None deletes the document.
+
+        Returns the ids of documents that could not be written.
+        """
+        batches = list(chunked(writes, self.batch_size))
+        if not batches:
+            return []
+
+        logger.info("Committing %d writes in %d batches (up to %d at a time)",
+                    len(writes), len(batches), self.max_concurrency)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = list(executor.map(self._commit_batch, range(1, len(batches) + 1), batches))
+
+        return [doc_id for failed in results for doc_id in failed]
+
+    def _add(self, batch, doc_id, data):
+        doc_ref = self.collection.document(doc_id)
+        if data is None:
+            batch.delete(doc_ref)
+        else:
+            batch.set(doc_ref, data, merge=True)
+
+    def _commit_batch(self, number, writes):
+        start = time.perf_counter()
+        failed = self._commit_with_retry(writes)
+        seconds = time.perf_counter() - start
+        self.batch_reports.append({'batch': number, 'writes': len(writes), 'seconds': seconds, 'failed': len(failed)})
+        logger.info("Batch %d: %d/%d writes committed in %.0f ms",
+                    number, len(writes) - len(failed), len(writes), seconds * 1000)
+        return failed
+
+    def _commit_with_retry(self, writes, attempt=0):
+        """Commit writes as one batch; on failure split it in half and retry each half.
+
+        Healthy documents end up committed in large sub-batches while a
+        document that keeps failing is isolated and retried on its own with
+        exponential backoff. Returns the ids that were never written.
+        """
+        batch = self.db.batch()
+        for doc_id, data in writes:
+            self._add(batch, doc_id, data)
+
+        try:
+            batch.commit()
+            return []
+        except Exception as e:
+            if len(writes) > 1:
+                logger.warning("Commit of %d writes failed (%s), splitting and retrying", len(writes), e)
+                time.sleep(self.retry_delay)
+                middle = len(writes) // 2
+                return self._commit_with_retry(writes[:middle]) + self._commit_with_retry(writes[middle:])
+
+            doc_id = writes[0][0]
+            if attempt >= self.max_retries:
+                logger.error("Error writing document %s, giving up after %d attempts: %s", doc_id, attempt + 1, e)
+                return [doc_id]
+            time.sleep(self.retry_delay * (2 ** attempt))
+            return self._commit_with_retry(writes, attempt + 1)
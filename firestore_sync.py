@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# The fields format_event_for_firestore emits, less lastUpdated, which changes on every run without the
+# event changing. Stored documents can hold other fields merged in by older runs, which must not make an
+# unchanged event look edited when the manifest is rebuilt from the collection
+EVENT_FIELDS = ('eventId', 'title', 'description', 'startDate', 'endDate', 'startTimestamp', 'endTimestamp',
+                'sentiment', 'version', 'sectionImages', 'imageUrl', 'imageVariants')
+
+MANIFEST_PATH = 'firestore_manifest.json'
+
+
+def event_hash(event):
+    """Stable content hash of the fields the formatter produces"""
+    stable = {key: event[key] for key in EVENT_FIELDS if key in event}
+    encoded = json.dumps(stable, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def is_expired(event, now_ms):
+    end_timestamp = event.get('endTimestamp')
+    return end_timestamp is not None and end_timestamp < now_ms
+
+
+class SyncManifest:
+    """What the events collection held after the last successful upload.
+
+    Maps event id to its content hash and end timestamp, which is all the sync
+    needs to decide what to write or delete without reading Firestore.
+    """
+
+    def __init__(self, path=MANIFEST_PATH, entries=None):
+        self.path = path
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, path=MANIFEST_PATH):
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls(path, json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Could not read sync manifest (%s), every event will be written", e)
+            return cls(path)
+
+    @classmethod
+    def from_collection(cls, collection, path=MANIFEST_PATH):
+        """Build the manifest from a single read of the collection instead of the local file"""
+        entries = {}
+        for snapshot in collection.stream():
+            event = snapshot.to_dict() or {}
+            entries[snapshot.id] = {'hash': event_hash(event), 'endTimestamp': event.get('endTimestamp')}
+        return cls(path, entries)
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+class SyncPlan:
+    """Writes needed to bring the collection in line with this run's events"""
+
+    def __init__(self):
+        self.inserts = []
+        self.updates = []
+        self.deletes = []
+        self.unchanged = 0
+
+    def writes(self):
+        """(doc_id, data) pairs for BatchWriter, data None meaning delete"""
+        return self.inserts + self.updates + [(event_id, None) for event_id in self.deletes]
+
+    def summary(self):
+        return (f"{len(self.inserts)} new, {len(self.updates)} changed, "
+                f"{self.unchanged} unchanged, {len(self.deletes)} expired to delete")
+
+
+def plan_sync(events, manifest, delete_expired=False, force=False, now_ms=None):
+    """Compare this run's events against the manifest and decide what to write
+
+    With `force` every event is written even if its hash is unchanged.
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    plan = SyncPlan()
+
+    for event in events:
+        event_id = str(event['eventId'])
+        entry = manifest.entries.get(event_id)
+        if delete_expired and is_expired(event, now_ms):
+            if entry is not None:
+                plan.deletes.append(event_id)
+            continue
+
+        if entry is None:
+            plan.inserts.append((event_id, event))
+        elif force or entry['hash'] != event_hash(event):
+            plan.updates.append((event_id, event))
+        else:
+            plan.unchanged += 1
+
+    if delete_expired:
+        # Expired events that have already dropped out of the scrape
+        current_ids = {str(event['eventId']) for event in events}
+        for event_id, entry in manifest.entries.items():
+            if event_id not in current_ids and is_expired(entry, now_ms):
+                plan.deletes.append(event_id)
+
+    return plan
+
+
+def apply_to_manifest(manifest, plan, failed_ids):
+    """Record the writes that succeeded so the next run can skip them"""
+    failed = set(failed_ids)
+    for event_id, event in plan.inserts + plan.updates:
+        if event_id not in failed:
+            manifest.entries[event_id] = {'hash': event_hash(event), 'endTimestamp': event.get('endTimestamp')}
+    for event_id in plan.deletes:
+        if event_id not in failed:
+            manifest.entries.pop(event_id, None)
@@ -0,0 +1,167 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from http_fixtures import FIXTURE_DIR, FixtureStore, fixture_key, import_archive
+from rate_limiter import TokenBucket
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Local stand-in for bbs-api-os.hoyolab.com and its image host, serving a FixtureStore.
+
+    Every response waits `latency` seconds (plus up to `jitter` more). A
+    fraction `error_rate` of requests gets a 503 and a fraction
+    `throttle_rate` a 429, and with `max_rps` set anything over that rate is
+    throttled too, so retries and backoff can be exercised. Image URLs in the
+    recorded JSON are rewritten to point back at this server.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, store, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 max_rps=None, retry_after=1):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.bucket = TokenBucket(max_rps, capacity=max(1, int(max_rps))) if max_rps else None
+        self.retry_after = retry_after
+
+        self.base_url = f"http://{self.server_address[0]}:{self.server_address[1]}"
+        self.use_store(store)
+
+        self.stats = Counter()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def use_store(self, store):
+        """Serve a different fixture store from now on"""
+        self.store = store
+        self.image_hosts = sorted({
+            '{0.scheme}://{0.netloc}'.format(urlparse(entry['url']))
+            for entry in store.index.values() if entry['endpoint'] == 'image' and entry.get('url')
+        })
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def rewrite_body(self, body):
+        """Point recorded image URLs at this server"""
+        for host in self.image_hosts:
+            body = body.replace(host.encode('utf-8'), self.base_url.encode('utf-8'))
+        return body
+
+    def print_stats(self):
+        print("\n===== STAND-IN SERVER SUMMARY =====")
+        with self._lock:
+            for name, count in sorted(self.stats.items()):
+                print(f"{name}: {count}")
+            print(f"Peak requests in flight: {self.peak_in_flight}")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def log_message(self, format, *args):
+        pass  # One line per request drowns the summary
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            self.handle_get(server)
+        finally:
+            with server._lock:
+                server.in_flight -= 1
+
+    def handle_get(self, server):
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if (server.bucket and not server.bucket.try_acquire()) or random.random() < server.throttle_rate:
+            server.count('429 throttled')
+            return self.send_json(429, {'retcode': -429, 'message': 'Too Many Requests'},
+                                  {'Retry-After': str(server.retry_after)})
+        if random.random() < server.error_rate:
+            server.count('503 injected errors')
+            return self.send_json(503, {'retcode': -503, 'message': 'Service Unavailable'})
+
+        found = server.store.lookup(fixture_key(self.path))
+        if not found:
+            server.count('404 not recorded')
+            return self.send_json(404, {'retcode': -404, 'message': f'Not recorded: {self.path}'})
+
+        entry, body = found
+        server.count(entry['endpoint'])
+        if 'json' in entry['contentType']:
+            body = server.rewrite_body(body)
+        self.send_body(200, body, entry['contentType'])
+
+    def send_json(self, status, payload, headers=None):
+        self.send_body(status, json.dumps(payload).encode('utf-8'), 'application/json; charset=utf-8', headers)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(store=None, host='127.0.0.1', port=0, **options):
+    """Serve a store on a background thread and return the server; its base_url goes in HOYOLAB_API_BASE"""
+    server = StandInServer((host, port), store or FixtureStore(), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve recorded HoYoLab responses locally")
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help="fixture store directory")
+    parser.add_argument('--import-archive', metavar='PATH',
+                        help="seed the store from raw_articles.json before serving")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.1, help="up to this many more seconds, at random")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of requests answered with a 429")
+    parser.add_argument('--max-rps', type=float, default=None, help="answer requests over this rate with a 429")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    store = FixtureStore(args.fixtures)
+    if args.import_archive:
+        with open(args.import_archive, 'r', encoding='utf-8') as f:
+            import_archive(store, json.load(f))
+        print(f"Fixtures: {len(store.index)} responses in {store.directory}")
+    if not store.index:
+        print(f"⚠ No fixtures in {args.fixtures}, record some with HOYOLAB_RECORD_DIR or --import-archive")
+
+    server = StandInServer((args.host, args.port), store, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, throttle_rate=args.throttle_rate, max_rps=args.max_rps)
+    print(f"Serving {len(store.index)} recorded responses at {server.base_url}")
+    print(f"Run the scraper against it with HOYOLAB_API_BASE={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.print_stats()
@@ -0,0 +1,217 @@
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_fixtures import FixtureStore
+from response_cache import ResponseCache, CacheMissError, cached_response
+from run_metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Connection pool size per host; anything not listed gets the default
+HOST_POOL_SIZES = {
+    'bbs-api-os.hoyolab.com': 8,
+    'upload-os-bbs.hoyolab.com': 8,
+}
+
+
+class HoyolabClient:
+    """Shared HTTP layer for every HoYoLab call.
+
+    Wraps one pooled requests.Session so connections (and TLS) are kept alive
+    between calls, retries throttling and 5xx responses with exponential
+    backoff and jitter, honours Retry-After, and reports latency, retries,
+    cache hits and bytes per endpoint to the run metrics. With a
+    ResponseCache attached, cacheable endpoints
+    are answered from disk when possible. A recorder (see http_fixtures.py)
+    is handed every response returned.
+    """
+
+    def __init__(self, max_retries=3, backoff_base=1.0, backoff_max=30.0, timeout=30,
+                 pool_size=4, host_pool_sizes=None, cache=None, recorder=None, metrics=None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        # Retries are handled here so they can be counted, not by urllib3
+        default_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', default_adapter)
+        self.session.mount('http://', default_adapter)
+        for host, size in (HOST_POOL_SIZES if host_pool_sizes is None else host_pool_sizes).items():
+            self.session.mount(f'https://{host}/', HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=0))
+
+        self.cache = cache
+        self.recorder = recorder
+        self.metrics = metrics or get_metrics()
+
+    def get(self, url, endpoint=None, params=None, headers=None, max_age=None, throttle=None, **kwargs):
+        """GET through the response cache, falling back to the network.
+
+        `max_age` overrides the endpoint TTL (0 forces revalidation) and
+        `throttle` is a callable returning a context manager entered for each
+        attempt that actually goes to the network.
+        """
+        endpoint = endpoint or endpoint_name(url)
+        response = self._get(url, endpoint, params, headers, max_age, throttle or nullcontext, **kwargs)
+        if self.recorder:
+            self.recorder.record(url, params, endpoint, response)
+        return response
+
+    def _get(self, url, endpoint, params, headers, max_age, throttle, **kwargs):
+        cache = self.cache
+
+        if not cache or not cache.is_cacheable(endpoint):
+            if cache and cache.cache_only:
+                raise CacheMissError(f"Cache-only mode: {endpoint} responses are not cached")
+            return self.fetch(url, endpoint, throttle, params=params, headers=headers, **kwargs)
+
+        key = cache.key(url, params)
+        entry = cache.load(key)
+        if entry and (cache.cache_only or cache.is_fresh(entry[0], endpoint, max_age)):
+            self.metrics.increment('http_cache_hits', endpoint=endpoint)
+            return cached_response(*entry)
+        if cache.cache_only:
+            self.metrics.increment('http_cache_misses', endpoint=endpoint)
+            raise CacheMissError(f"Cache-only mode: {url} is not in the response cache")
+
+        request_headers = dict(headers or {})
+        if entry:
+            request_headers.update(cache.validation_headers(entry[0]))
+        response = self.fetch(url, endpoint, throttle, params=params, headers=request_headers, **kwargs)
+
+        if entry and response.status_code == 304:
+            self.metrics.increment('http_cache_revalidated', endpoint=endpoint)
+            cache.refresh(key)
+            return cached_response(*entry)
+
+        self.metrics.increment('http_cache_misses', endpoint=endpoint)
+        cache.store(key, response)
+        return response
+
+    def fetch(self, url, endpoint, throttle=None, **kwargs):
+        """GET with retries, returns the final response or raises the last connection error.
+
+        `throttle` is entered around each attempt on its own, so the backoff
+        between attempts does not hold a slot other requests could use. The
+        bytes of a streamed response are counted by whoever reads it, see
+        count_bytes().
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        throttle = throttle or nullcontext
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with throttle():
+                    start = time.perf_counter()
+                    response = self.session.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(endpoint, time.perf_counter() - start, error=True)
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning("Request to %s failed (%s), retrying in %.1fs", endpoint, e, delay)
+            else:
+                # Content-Length is missing for chunked responses and is the compressed size for gzip ones
+                self._record(endpoint, time.perf_counter() - start, error=response.status_code >= 400,
+                             size=0 if kwargs.get('stream') else len(response.content))
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = retry_after_seconds(response)
+                if delay is None:
+                    delay = self.backoff_delay(attempt)
+                logger.warning("%s returned %s, retrying in %.1fs", endpoint, response.status_code, delay)
+                response.close()
+
+            self._record_retry(endpoint)
+            time.sleep(delay)
+
+    def backoff_delay(self, attempt):
+        """Exponential backoff with jitter: half the window fixed, half random"""
+        window = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return window / 2 + random.uniform(0, window / 2)
+
+    def _record(self, endpoint, seconds, error=False, size=0):
+        self.metrics.observe('http', seconds, endpoint=endpoint)  # Its calls are the request count
+        if error:
+            self.metrics.increment('http_errors', endpoint=endpoint)
+        self.count_bytes(endpoint, size)
+
+    def count_bytes(self, endpoint, size):
+        """Add the bytes read from a streamed response to its endpoint's total"""
+        if size:
+            self.metrics.increment('http_response_bytes', size, endpoint=endpoint)
+
+    def _record_retry(self, endpoint):
+        self.metrics.increment('http_retries', endpoint=endpoint)
+
+    def log_stats(self):
+        """Log request counts, retries and latency per endpoint"""
+        metrics = self.metrics
+        logger.info("===== HTTP SUMMARY =====")
+        for (name, labels), span in sorted(metrics.spans.items()):
+            if name != 'http':
+                continue
+            endpoint = dict(labels)['endpoint']
+            logger.info("%s: %d requests, %d retries, %d errors, %.0f KB, avg %.0f ms, max %.0f ms", endpoint,
+                        span['calls'], metrics.count('http_retries', endpoint=endpoint),
+                        metrics.count('http_errors', endpoint=endpoint),
+                        metrics.count('http_response_bytes', endpoint=endpoint) / 1024,
+                        span['seconds'] / span['calls'] * 1000, span['max_seconds'] * 1000)
+        if self.cache:
+            logger.info("Response cache: %d hits, %d revalidated, %d misses", metrics.count('http_cache_hits'),
+                        metrics.count('http_cache_revalidated'), metrics.count('http_cache_misses'))
+        if self.recorder:
+            self.recorder.log_stats()
+
+
+def endpoint_name(url):
+    """Name used for the per-endpoint counters, e.g. getPostFull or image"""
+    parsed = urlparse(url)
+    if '/wapi/' in parsed.path:
+        return parsed.path.rsplit('/', 1)[-1]
+    return 'image'
+
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header given either in seconds or as an HTTP date"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client so every call site shares one connection pool"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            cache_only = os.environ.get('HOYOLAB_CACHE_ONLY') == '1'
+            record_dir = os.environ.get('HOYOLAB_RECORD_DIR')
+            _client = HoyolabClient(cache=ResponseCache(cache_only=cache_only),
+                                    recorder=FixtureStore(record_dir) if record_dir else None)
+    return _client
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_DIR = os.path.join('fixtures', 'hoyolab')
+INDEX_NAME = 'index.jsonl'
+
+# Responses worth keeping to replay a scrape
+RECORDED_ENDPOINTS = ('getNewsList', 'getPostFull', 'getPostReplies', 'image')
+
+# Articles and replies fetching.py asks for per page
+PAGE_SIZE = 20
+
+
+def fixture_key(url, params=None):
+    """Path plus sorted query string, without the host, so a recording replays under any base URL"""
+    if params:
+        url = requests.Request('GET', url, params=params).prepare().url
+    parsed = urlparse(url)
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return f"{parsed.path}?{query}" if query else parsed.path
+
+
+class FixtureStore:
+    """Recorded HoYoLab responses, served back by hoyolab_server.py.
+
+    Bodies are stored once under a hash of their contents, and an
+    append-only index.jsonl maps each request (path and query, see
+    fixture_key) to its body. A request recorded again simply gets a newer
+    index line, which wins when the index is loaded. Attach a store to the
+    HTTP client as its recorder and every successful response it hands out,
+    from the network or the response cache, is written here.
+    """
+
+    def __init__(self, directory=FIXTURE_DIR, endpoints=RECORDED_ENDPOINTS):
+        self.directory = directory
+        self.endpoints = endpoints
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.index = self._load_index()
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        index = {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        index[entry['key']] = entry
+        except FileNotFoundError:
+            pass
+        return index
+
+    def body_path(self, entry):
+        return os.path.join(self.directory, entry['file'])
+
+    def lookup(self, key):
+        """Return (entry, body) for a recorded request, or None"""
+        entry = self.index.get(key)
+        if not entry:
+            return None
+        try:
+            with open(self.body_path(entry), 'rb') as f:
+                return entry, f.read()
+        except OSError:
+            return None
+
+    def add(self, key, endpoint, body, content_type, url=None):
+        """Store one response body under a request key"""
+        name = hashlib.sha256(body).hexdigest()[:16] + '.body'
+        path = os.path.join(self.directory, name)
+        entry = {'key': key, 'endpoint': endpoint, 'contentType': content_type, 'file': name, 'url': url}
+
+        with self._lock:
+            if self.index.get(key) == entry:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            if not os.path.exists(path):
+                with open(f"{path}.part", 'wb') as f:
+                    f.write(body)
+                os.replace(f"{path}.part", path)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.index[key] = entry
+            self.recorded += 1
+
+    def record(self, url, params, endpoint, response):
+        """Client hook: keep a successful response for one of the recorded endpoints"""
+        if endpoint not in self.endpoints or response.status_code != 200:
+            return
+        self.add(fixture_key(url, params), endpoint, response.content,
+                 response.headers.get('Content-Type', 'application/octet-stream'), url=url)
+
+    def log_stats(self):
+        logger.info("Fixtures: %d responses recorded, %d in %s", self.recorded, len(self.index), self.directory)
+
+
+def import_archive(store, records, api_base='https://bbs-api-os.hoyolab.com'):
+    """Seed a store from archived raw articles (raw_articles.json) when nothing was recorded live.
+
+    The news list is split into pages of PAGE_SIZE, each post gets its
+    getPostFull response and an empty first page of replies. Requests are
+    keyed with the same parameters fetching.py sends.
+    """
+    wapi = f"{api_base}/community/post/wapi"
+
+    def add_json(url, params, endpoint, data):
+        body = json.dumps({'retcode': 0, 'message': 'OK', 'data': data}, ensure_ascii=False).encode('utf-8')
+        store.add(fixture_key(url, params), endpoint, body, 'application/json; charset=utf-8', url=url)
+
+    for start in range(0, len(records), PAGE_SIZE):
+        page = records[start:start + PAGE_SIZE]
+        is_last = start + PAGE_SIZE >= len(records)
+        items = []
+        for record in page:
+            post = record.get('raw_post_data') or {}
+            items.append({'post': {
+                'post_id': record['id'],
+                'subject': record['title'],
+                'desc': record.get('description', ''),
+                'content': record.get('content', ''),
+                'last_modify_time': post.get('last_modify_time'),
+                'created_at': post.get('created_at'),
+            }})
+        params = {'gids': '6', 'page_size': str(PAGE_SIZE), 'type': '1', 'last_id': str(start) if start else ''}
+        add_json(f"{wapi}/getNewsList", params, 'getNewsList',
+                 {'list': items, 'last_id': '' if is_last else str(start + PAGE_SIZE), 'is_last': is_last})
+
+    for record in records:
+        full_post = {'post': record.get('raw_post_data') or {}, 'image_list': record.get('image_list') or []}
+        add_json(f"{wapi}/getPostFull", {'post_id': record['id'], 'read': '1', 'scene': '1'}, 'getPostFull',
+                 {'post': full_post})
+        add_json(f"{wapi}/getPostReplies", {'post_id': record['id'], 'size': str(PAGE_SIZE), 'last_id': ''},
+                 'getPostReplies', {'list': [], 'last_id': '', 'is_last': True})
@@ -1,6 +1,8 @@
 import os
 import json
-import requests
+from fetching import API_BASE_URL
+from http_client import get_client
+from document import ArticleDocument
 from urllib.parse import urlparse
 
 def debug_image_process():
@@ -69,8 +71,8 @@ def debug_image_process():
         
         try:
             # Fetch article content
-            api_url = f"https://bbs-api-os.hoyolab.com/community/post/wapi/getPostFull?post_id={test_event_id}&read=1&scene=1"
-            response = requests.get(api_url, headers=headers)
+            api_url = f"{API_BASE_URL}/community/post/wapi/getPostFull?post_id={test_event_id}&read=1&scene=1"
+            response = get_client().get(api_url, endpoint='getPostFull', headers=headers)
             response.raise_for_status()
             
             data = response.json()
@@ -93,7 +95,7 @@ def debug_image_process():
                         test_filename = f"src/assets/images/events/test_image{ext}"
                         print(f"Downloading test image to: {os.path.abspath(test_filename)}")
                         
-                        img_response = requests.get(test_image_url, stream=True)
+                        img_response = get_client().get(test_image_url, endpoint='image', stream=True)
                         img_response.raise_for_status()
                         
                         with open(test_filename, 'wb') as f:
@@ -114,40 +116,33 @@ def debug_image_process():
             if structured_content:
                 print("\nChecking structured_content for images...")
                 try:
-                    content_data = json.loads(structured_content)
-                    if isinstance(content_data, list):
-                        image_count = 0
-                        for item in content_data:
-                            if isinstance(item, dict) and 'insert' in item:
-                                insert_value = item.get('insert')
-                                if isinstance(insert_value, dict) and insert_value.get('type') == 'image':
-                                    image_count += 1
-                                    image_url = insert_value.get('attributes', {}).get('src')
-                                    if image_url and image_count == 1:
-                                        print(f"Found image in structured_content: {image_url}")
-                                        
-                                        # Try downloading this image too
-                                        try:
-                                            parsed_url = urlparse(image_url)
-                                            path = parsed_url.path
-                                            ext = os.path.splitext(path)[1] or '.jpg'
-                                            
-                                            test_filename = f"src/assets/images/events/test_structured_image{ext}"
-                                            print(f"Downloading structured content image to: {os.path.abspath(test_filename)}")
-                                            
-                                            img_response = requests.get(image_url, stream=True)
-                                            img_response.raise_for_status()
-                                            
-                                            with open(test_filename, 'wb') as f:
-                                                for chunk in img_response.iter_content(chunk_size=8192):
-                                                    f.write(chunk)
-                                            
-                                            print(f"Successfully downloaded structured content image! File exists: {os.path.exists(test_filename)}")
-                                            print(f"File size: {os.path.getsize(test_filename)} bytes")
-                                        except Exception as e:
-                                            print(f"Error downloading structured content image: {e}")
+                    document = ArticleDocument.parse(structured_content)
+                    image_url = document.images[0] if document.images else None
+                    if image_url:
+                        print(f"Found image in structured_content: {image_url}")
                         
-                        print(f"Found {image_count} images in structured_content")
+                        # Try downloading this image too
+                        try:
+                            parsed_url = urlparse(image_url)
+                            path = parsed_url.path
+                            ext = os.path.splitext(path)[1] or '.jpg'
+                            
+                            test_filename = f"src/assets/images/events/test_structured_image{ext}"
+                            print(f"Downloading structured content image to: {os.path.abspath(test_filename)}")
+                            
+                            img_response = get_client().get(image_url, endpoint='image', stream=True)
+                            img_response.raise_for_status()
+                            
+                            with open(test_filename, 'wb') as f:
+                                for chunk in img_response.iter_content(chunk_size=8192):
+                                    f.write(chunk)
+                            
+                            print(f"Successfully downloaded structured content image! File exists: {os.path.exists(test_filename)}")
+                            print(f"File size: {os.path.getsize(test_filename)} bytes")
+                        except Exception as e:
+                            print(f"Error downloading structured content image: {e}")
+                    
+                    print(f"Found {len(document.images)} images in structured_content")
                 except (json.JSONDecodeError, TypeError) as e:
                     print(f"Error parsing structured_content: {e}")
                     print(f"First 100 chars of structured_content: {structured_content[:100]}")
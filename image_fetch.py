@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from http_client import get_client
+from run_metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# The workflow points this at the Angular app's assets folder
+IMAGE_DIR = os.environ.get('EVENT_IMAGE_DIR', 'src/assets/images/events')
+ASSET_PREFIX = '/assets/images/events'
+# Kept out of the assets folder so it is not deployed or committed with the images
+MANIFEST_PATH = 'image_manifest.json'
+LEGACY_MANIFEST_NAME = '.manifest.json'  # Where earlier runs kept it, inside the image folder
+
+
+def image_extension(url):
+    ext = os.path.splitext(urlparse(url).path)[1]
+    return ext or '.jpg'  # Default to .jpg if no extension
+
+
+class ImageStore:
+    """Content-addressed store for event images.
+
+    Each image is saved once under a name derived from the hash of its bytes,
+    so the same picture reached through different URLs or used by several
+    events is only kept once. A manifest next to the scrape state maps source
+    URLs to stored files, and a URL whose file is still on disk at the
+    recorded size is not downloaded again. Downloads run on a bounded thread pool and
+    are written through a temp file that is renamed into place. An offline
+    store only answers from what is already on disk.
+    """
+
+    def __init__(self, image_dir=IMAGE_DIR, asset_prefix=ASSET_PREFIX, max_workers=4, offline=False,
+                 manifest_path=MANIFEST_PATH):
+        self.image_dir = image_dir
+        self.asset_prefix = asset_prefix
+        self.max_workers = max_workers
+        self.offline = offline  # Only hand out images already stored, never download
+        self.manifest_path = manifest_path
+        self.legacy_manifest_path = os.path.join(image_dir, LEGACY_MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+        self.metrics = get_metrics()
+
+    def _load_manifest(self):
+        for path in (self.manifest_path, self.legacy_manifest_path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+        return {}
+
+    def save(self):
+        os.makedirs(self.image_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+        if os.path.exists(self.legacy_manifest_path):
+            os.remove(self.legacy_manifest_path)  # Carried over into the manifest above
+
+    def asset_path(self, filename):
+        return f"{self.asset_prefix}/{filename}"
+
+    def lookup(self, url):
+        """The stored file for a URL, if it is on disk at the size it was saved with"""
+        entry = self.manifest.get(url)
+        if not entry:
+            return None
+        try:
+            if os.path.getsize(os.path.join(self.image_dir, entry['file'])) == entry['size']:
+                return entry['file']
+        except OSError:
+            pass
+        return None
+
+    def variants(self, url):
+        """Resized copies made by image_variants.create_variants, as asset paths with their sizes"""
+        entry = self.manifest.get(url) or {}
+        return [
+            {'url': self.asset_path(variant['file']), 'format': variant['format'],
+             'width': variant['width'], 'height': variant['height'], 'bytes': variant['bytes']}
+            for variant in entry.get('variants', [])
+        ]
+
+    def fetch_all(self, urls):
+        """Make sure every URL is stored, returning url -> asset path (None if it failed or the store is offline)"""
+        results = {}
+        missing = []
+        for url in dict.fromkeys(urls):  # Each distinct URL once, in order
+            filename = self.lookup(url)
+            if filename:
+                results[url] = self.asset_path(filename)
+            else:
+                missing.append(url)
+        self.metrics.increment('images_reused', len(results))
+
+        if self.offline:
+            results.update((url, None) for url in missing)
+            return results
+        if not missing:
+            if os.path.exists(self.legacy_manifest_path):
+                self.save()  # Moves the manifest out of the image folder
+            return results
+
+        os.makedirs(self.image_dir, exist_ok=True)
+        with self.metrics.span('image downloads', items=len(missing)), \
+                ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+            downloads = list(executor.map(self._download, missing))
+
+        for url, entry in zip(missing, downloads):
+            if entry is None:
+                self.metrics.increment('images_failed')
+                results[url] = None
+                continue
+            self.metrics.increment('images_downloaded')
+            self.metrics.increment('image_bytes_downloaded', entry['size'])
+            self.manifest[url] = entry
+            results[url] = self.asset_path(entry['file'])
+        self.save()
+        return results
+
+    def _download(self, url):
+        """Stream one image to disk, returning its manifest entry or None on failure"""
+        temp_path = os.path.join(self.image_dir, f".{uuid.uuid4().hex}.part")
+        try:
+            logger.debug("Downloading image from %s", url)
+            client = get_client()
+            response = client.get(url, endpoint='image', stream=True)
+            response.raise_for_status()
+
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with open(temp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            finally:
+                client.count_bytes('image', size)
+
+            sha256 = digest.hexdigest()
+            filename = f"{sha256[:16]}{image_extension(url)}"
+            final_path = os.path.join(self.image_dir, filename)
+            if os.path.exists(final_path) and os.path.getsize(final_path) == size:
+                os.remove(temp_path)  # Same bytes already stored from another URL
+                logger.debug("%s is already stored as %s", url, filename)
+            else:
+                os.replace(temp_path, final_path)
+                logger.debug("Downloaded image to %s", final_path)
+
+            return {'file': filename, 'sha256': sha256, 'size': size}
+        except Exception as e:
+            logger.warning("Error downloading image %s: %s", url, e)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+
+    def log_stats(self):
+        metrics = self.metrics
+        logger.info("Images: %d downloaded (%.0f KB), %d already stored, %d failed",
+                    metrics.count('images_downloaded'), metrics.count('image_bytes_downloaded') / 1024,
+                    metrics.count('images_reused'), metrics.count('images_failed'))
@@ -0,0 +1,99 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from run_metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Widths generated for every image, never wider than the original; the
+# smallest doubles as the calendar thumbnail
+VARIANT_WIDTHS = (320, 640, 1280)
+
+# Pillow save options per output format
+FORMAT_OPTIONS = {
+    'webp': {'quality': 80, 'method': 4},
+    'avif': {'quality': 60, 'speed': 6},
+}
+
+
+def available_formats():
+    """Output formats this Pillow build can encode, none if Pillow is not installed"""
+    try:
+        from PIL import features
+    except ImportError:  # Pillow is optional, events just go without variants
+        return []
+    return [name for name in FORMAT_OPTIONS if features.check(name)]
+
+
+def make_variants(source_path, output_dir, widths=VARIANT_WIDTHS, formats=('webp',)):
+    """Write resized copies of one image, returning (filename, format, width, height, bytes) for each.
+
+    Runs in a worker process. Variants already on disk are reused, which is
+    safe because the source file name is a hash of its contents.
+    """
+    from PIL import Image
+
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    variants = []
+    with Image.open(source_path) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        original_width, original_height = image.size
+
+        targets = sorted({min(width, original_width) for width in widths})
+        for width in targets:
+            height = max(1, round(original_height * width / original_width))
+            resized = None
+            for image_format in formats:
+                filename = f"{stem}-{width}w.{image_format}"
+                path = os.path.join(output_dir, filename)
+                if not os.path.exists(path):
+                    if resized is None:
+                        resized = image if width == original_width else image.resize((width, height), Image.LANCZOS)
+                    temp_path = f"{path}.part"
+                    resized.save(temp_path, format=image_format.upper(), **FORMAT_OPTIONS[image_format])
+                    os.replace(temp_path, path)
+                variants.append((filename, image_format, width, height, os.path.getsize(path)))
+    return variants
+
+
+def create_variants(store, urls, max_workers=None, executor=None):
+    """Generate variants for stored images that do not have them yet, recording them in the store's manifest.
+
+    The work is spread over a process pool so every core is used, either
+    `executor` or one started for this call. Without Pillow nothing happens.
+    """
+    formats = available_formats()
+    if not formats:
+        logger.warning("Pillow is not installed, skipping image variants")
+        return
+
+    # URLs that resolve to the same content-addressed file share one job, so no two workers write its variants
+    pending = {}
+    for url in dict.fromkeys(urls):
+        if store.lookup(url) and 'variants' not in store.manifest[url]:
+            pending.setdefault(store.manifest[url]['file'], []).append(url)
+    if not pending:
+        return
+
+    logger.info("Creating %s variants for %d images", '/'.join(formats), len(pending))
+    with get_metrics().span('image variants', items=len(pending)), \
+            nullcontext(executor) if executor else ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {filename: executor.submit(make_variants, os.path.join(store.image_dir, filename), store.image_dir,
+                                             VARIANT_WIDTHS, formats)
+                   for filename in pending}
+        for filename, future in futures.items():
+            try:
+                variants = future.result()
+            except Exception as e:
+                logger.warning("Error creating variants for %s: %s", ', '.join(pending[filename]), e)
+                continue
+            for url in pending[filename]:
+                store.manifest[url]['variants'] = [
+                    {'file': name, 'format': image_format, 'width': width, 'height': height, 'bytes': size}
+                    for name, image_format, width, height, size in variants
+                ]
+    store.save()
@@ -1,870 +1,390 @@
-
-import requests
 import json
-import time
-import re
-import random
+import logging
 import os
-import traceback
-from datetime import datetime, timedelta
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
-from transformers import pipeline
-import numpy as np
-
-def get_headers():
-    return {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'application/json',
-        'Accept-Language': 'en-US,en;q=0.9'
-    }
-
-def is_version_update_article(article):
-    """Check if this is a version update announcement"""
-    title = article.get('title', '').lower()
-    description = article.get('description', '').lower()
-    
-    # Specific patterns that indicate a version update announcement
-    update_patterns = [
-        'version update',
-        'version maintenance',
-        'welcome to version'
-    ]
-    
-    return any(pattern in title or pattern in description for pattern in update_patterns)
-
-def add_delay(min_seconds=2, max_seconds=5):
-    """Add a random delay between requests to be respectful to the server"""
-    delay = random.uniform(min_seconds, max_seconds)
-    print(f"\nWaiting {delay:.1f} seconds before next request...")
-    time.sleep(delay)
-
-def parse_version_update_time(text):
-    """Extract version update time from announcement"""
-    # Look for version number
-    version_pattern = r"Version (\d+\.\d+)"
-    update_time_pattern = r"Begins at (\d{4}/\d{1,2}/\d{1,2} \d{2}:\d{2}:\d{2})"
-    
-    version_match = re.search(version_pattern, text)
-    time_match = re.search(update_time_pattern, text)
-    
-    if version_match and time_match:
-        version = version_match.group(1)
-        update_time = datetime.strptime(time_match.group(1), "%Y/%m/%d %H:%M:%S")
-        
-        # Add 5 hours for the maintenance period
-        start_time = update_time + timedelta(hours=5)
-        
-        return {
-            'version': version,
-            'updateStart': update_time.isoformat(),
-            'versionStart': start_time.isoformat(),
-            'timestamp': int(start_time.timestamp() * 1000)
-        }
-    
-    return None
-
-def parse_event_dates(text, version_updates=None):
-    """Extract start and end dates from text with proper version update handling and improved pattern matching"""
-    print("\nTrying to parse dates from:")
-    print(text[:200] + "..." if len(text) > 200 else text)
-    
-    # First look for version reference
-    version_pattern = r"after the Version (\d+\.\d+) update"
-    version_match = re.search(version_pattern, text, re.IGNORECASE)
-    
-    # Then look for end date - UPDATED to support both en-dash, regular hyphen, and more flexible spacing
-    end_date_pattern = r"[–\-]\s*(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})"
-    end_date_match = re.search(end_date_pattern, text)
-    
-    if not end_date_match:
-        # Try alternative patterns for end date
-        alternative_patterns = [
-            r"(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})\s*\(server time\)",  # Look for date with server time mention
-            r"Period.*?[–\-].*?(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})",   # Look after "Period" with dash
-            r"Event Period.*?[–\-].*?(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})",  # Look after "Event Period"
-            r"(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})\s*\(UTC\+8\)",  # Look for date with UTC+8 mention
-        ]
-        
-        for pattern in alternative_patterns:
-            match = re.search(pattern, text, re.DOTALL)
-            if match:
-                print(f"Found end date using alternative pattern: {match.group(1)}")
-                end_date_match = match
-                break
-    
-    if not end_date_match:
-        print("No end date found using any pattern")
-        return None
-
-    try:
-        end_date_str = end_date_match.group(1).strip()
-        print(f"Extracted end date: {end_date_str}")
-        end_date = datetime.strptime(end_date_str, "%Y/%m/%d %H:%M:%S")
-        
-        # If this mentions a version update and we have version data
-        if version_match and version_updates:
-            version = version_match.group(1)
-            print(f"Found version reference: {version}")
-            
-            if version in version_updates:
-                version_info = version_updates[version]
-                # Convert the stored ISO format string back to datetime
-                start_date = datetime.fromisoformat(version_info['versionStart'])
-                print(f"Using version {version} start time: {start_date}")
-                
-                # Only return if start date is before end date
-                if start_date < end_date:
-                    return {
-                        'startDate': start_date.isoformat(),
-                        'endDate': end_date.isoformat(),
-                        'startTimestamp': int(start_date.timestamp() * 1000),
-                        'endTimestamp': int(end_date.timestamp() * 1000),
-                        'version': version
-                    }
-                else:
-                    print(f"Warning: Version start date {start_date} would be after end date {end_date}")
-                    return None
-            else:
-                print(f"Warning: Version {version} not found in version_updates")
-                return None
-        
-        # Multiple approaches to find start date
-        
-        # Approach 1: Look for explicit start-end date pattern
-        start_date_patterns = [
-            r"(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})\s*[–\-]",  # Standard format with dash
-            r"Event Period\s+(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})",  # After Event Period
-            r"Period[: ]+(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})",  # After Period:
-            r"from after Version.*?until\s+(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})" # From after Version until date
-        ]
-        
-        for pattern in start_date_patterns:
-            start_date_match = re.search(pattern, text, re.DOTALL)
-            if start_date_match:
-                start_date_str = start_date_match.group(1).strip()
-                print(f"Found start date using pattern: {start_date_str}")
-                start_date = datetime.strptime(start_date_str, "%Y/%m/%d %H:%M:%S")
-                
-                if start_date < end_date:
-                    return {
-                        'startDate': start_date.isoformat(),
-                        'endDate': end_date.isoformat(),
-                        'startTimestamp': int(start_date.timestamp() * 1000),
-                        'endTimestamp': int(end_date.timestamp() * 1000)
-                    }
-                else:
-                    print(f"Warning: Start date {start_date} would be after end date {end_date}")
-                    continue  # Try next pattern
-        
-        # Approach 2: Extract all dates and find the one before the end date
-        all_dates_pattern = r"(\d{4}/\d{1,2}/\d{1,2}\s+\d{2}:\d{2}:\d{2})"
-        all_dates = re.findall(all_dates_pattern, text)
-        
-        if len(all_dates) >= 2:
-            print(f"Found {len(all_dates)} dates in text")
-            
-            for date_str in all_dates:
-                if date_str == end_date_str:
-                    continue  # Skip the end date
-                    
-                try:
-                    potential_start = datetime.strptime(date_str, "%Y/%m/%d %H:%M:%S")
-                    if potential_start < end_date:
-                        print(f"Using date as start: {date_str}")
-                        return {
-                            'startDate': potential_start.isoformat(),
-                            'endDate': end_date.isoformat(),
-                            'startTimestamp': int(potential_start.timestamp() * 1000),
-                            'endTimestamp': int(end_date.timestamp() * 1000)
-                        }
-                except ValueError:
-                    continue  # Skip invalid dates
-        
-        # If we still couldn't find a start date, we'll use a fallback approach
-        # For events like Planar Fissure, the start date is usually mentioned right before the end date
-        # Let's try to use the first date as start date if there are at least two dates
-        if len(all_dates) >= 2:
-            try:
-                first_date_str = all_dates[0]
-                first_date = datetime.strptime(first_date_str, "%Y/%m/%d %H:%M:%S")
-                
-                if first_date < end_date:
-                    print(f"Using first date as fallback start date: {first_date_str}")
-                    return {
-                        'startDate': first_date.isoformat(),
-                        'endDate': end_date.isoformat(),
-                        'startTimestamp': int(first_date.timestamp() * 1000),
-                        'endTimestamp': int(end_date.timestamp() * 1000)
-                    }
-            except ValueError:
-                pass  # Ignore parsing errors in fallback
-        
-        print("No valid start date pattern found")
-        return None
-                
-    except ValueError as e:
-        print(f"Error parsing dates: {e}")
-        return None
-    
-
-def is_event_article(article):
-    # Check if article is about any of these events
-    keywords = [
-        "Event Period",
-        "Period:",
-        "▌Event Period",
-        "Limited-Time Event",
-        "Event Details",
-        "Garden of Plenty",
-        "Planar Fissure",
-        "Warp"
-    ]
-    
-    content_to_check = [
-        article.get('title', '').lower(),
-        article.get('description', '').lower()
-    ]
-    
-    return any(
-        keyword.lower() in text 
-        for text in content_to_check 
-        for keyword in keywords
-    )
-
-def get_article_list(last_id=""):
-    # Fetch articles with rate limiting
-    add_delay()  # Add delay before each request
-    
-    base_url = "https://bbs-api-os.hoyolab.com/community/post/wapi/getNewsList"
-    params = {
-        'gids': '6',
-        'page_size': '20',
-        'type': '1',
-        'last_id': last_id
-    }
-    
-    try:
-        response = requests.get(base_url, params=params, headers=get_headers())
-        response.raise_for_status()
-        
-        data = response.json()
-        articles = []
-        list_data = data.get('data', {}).get('list', [])
-        
-        for item in list_data:
-            post = item.get('post', {})
-            if not post:
-                continue
-                
-            article = {
-                'id': post.get('post_id'),
-                'title': post.get('subject'),
-                'description': post.get('desc'),
-                'content': post.get('content')
-            }
-            
-            articles.append(article)
-            print(f"Found article: {article['title']}")
-            
-        return articles, data.get('data', {}).get('last_id', ''), data.get('data', {}).get('is_last', True)
-    
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching article list: {e}")
-        return [], "", True
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+# The scraper is split into fetching, parsing, enrichment and publishing; their
+# functions are re-exported here so existing imports from main keep working.
+# Heavy libraries (transformers, torch, firebase_admin, Pillow) load on first use.
+from fetching import (API_BASE_URL, get_headers, add_delay, throttle, get_article_list, iter_article_comments,
+                      sample_comments, get_article_comments, get_article_content, needs_content,
+                      fetch_article_content, iter_article_contents)
+from parsing import (is_version_update_article, is_event_article, article_categories, parse_version_update_time,
+                     parse_event_dates, add_version_update)
+from enrichment import (get_sentiment_engine, get_image_store, analyze_sentiment, format_event_for_firestore,
+                        find_main_image_url, event_image_urls, enrich_events)
+from publishing import get_firestore_client, upload_to_firestore
+from sentiment_backends import BACKENDS
+from rate_limiter import RateLimiter
+from http_client import get_client
+from http_fixtures import FixtureStore
+from scrape_pipeline import ScrapePipeline
+from scrape_state import ScrapeState, STATE_PATH, article_signature, mark_article
+from version_index import VersionIndex, VERSION_INDEX_PATH
+from article_store import ArticleStore, STORE_PATH, article_record
+from run_metrics import configure_logging, get_metrics
 
+logger = logging.getLogger(__name__)
 
-def upload_to_firestore(events):
-    """Upload events to Firestore with enhanced error handling and debugging"""
-    try:
-        print("\n--- FIREBASE UPLOAD PROCESS STARTING ---")
-        
-        # Check if Firebase is already initialized
-        firebase_initialized = bool(firebase_admin._apps)
-        print(f"Firebase already initialized: {firebase_initialized}")
-        
-        if not firebase_initialized:
-            # Get absolute path of the current script
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            service_account_path = os.path.join(current_dir, 'serviceAccountKey.json')
-            
-            # Check if file exists
-            if os.path.exists(service_account_path):
-                print(f"Found service account key at: {service_account_path}")
-            else:
-                print(f"WARNING: Service account key not found at: {service_account_path}")
-                # Try alternate locations
-                alternate_paths = [
-                    './serviceAccountKey.json',
-                    '../serviceAccountKey.json',
-                    os.path.abspath('serviceAccountKey.json')
-                ]
-                
-                for path in alternate_paths:
-                    if os.path.exists(path):
-                        print(f"Found service account key at alternate location: {path}")
-                        service_account_path = path
-                        break
-            
-            try:
-                print(f"Initializing Firebase with credentials from: {service_account_path}")
-                cred = credentials.Certificate(service_account_path)
-                firebase_admin.initialize_app(cred)
-                print("Firebase initialized successfully")
-            except Exception as init_error:
-                print(f"ERROR initializing Firebase: {init_error}")
-                traceback.print_exc()
-                return False
-        
-        # Get Firestore client
-        try:
-            print("Getting Firestore client...")
-            db = firestore.client()
-            print("Firestore client created successfully")
-        except Exception as db_error:
-            print(f"ERROR getting Firestore client: {db_error}")
-            traceback.print_exc()
-            return False
-        
-        # Upload events
-        events_collection = db.collection('events')
-        success_count = 0
-        
-        print(f"\nUploading {len(events)} events to Firestore...")
-        for index, event in enumerate(events):
-            if not event:
-                print(f"Skipping empty event at index {index}")
-                continue
-                
-            try:
-                event_id = str(event['eventId'])
-                print(f"Uploading event [{index+1}/{len(events)}]: ID={event_id}, Title={event['title']}")
-                
-                doc_ref = events_collection.document(event_id)
-                doc_ref.set(event, merge=True)
-                
-                success_count += 1
-                print(f"Successfully uploaded event: {event['title']}")
-            except Exception as event_error:
-                print(f"ERROR uploading event {event.get('eventId', 'unknown')}: {event_error}")
-        
-        print(f"\n--- FIREBASE UPLOAD COMPLETE: {success_count}/{len(events)} events uploaded successfully ---")
-        return success_count > 0
-                
-    except Exception as e:
-        print(f"CRITICAL ERROR in upload_to_firestore function: {e}")
-        traceback.print_exc()
-        return False
-
-def get_article_comments(post_id):
-    """Fetch comments for an article"""
-    base_url = "https://bbs-api-os.hoyolab.com/community/post/wapi/getPostReplies"
-    params = {
-        'post_id': post_id,
-        'size': 20,  # Adjust size as needed
-        'last_id': ''
-    }
-    
-    try:
-        response = requests.get(base_url, params=params, headers=get_headers())
-        response.raise_for_status()
-        
-        data = response.json()
-        comments = []
-        
-        for reply in data.get('data', {}).get('list', []):
-            comment = {
-                'content': reply.get('reply', {}).get('content', ''),
-                'likes': reply.get('reply', {}).get('like_num', 0)
-            }
-            comments.append(comment)
-            
-        return comments
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching comments: {e}")
-        return []
 
-def analyze_sentiment(comments):
-    # Analyze sentiment of comments using BERT with improved handling of long texts
-    # Initialize sentiment analysis pipeline
-    sentiment_analyzer = pipeline("sentiment-analysis", model="nlptown/bert-base-multilingual-uncased-sentiment")
-    
-    if not comments:
-        print("No comments to analyze, returning neutral sentiment")
-        return "neutral"
-    
-    # Weight comments by likes
-    total_weight = 0
-    weighted_scores = 0
-    
-    for comment in comments:
-        comment_text = comment['content']
-        
-        # Skip empty comments
-        if not comment_text or len(comment_text.strip()) == 0:
-            continue
-        
-        # Truncate long comments to avoid BERT token limit issues
-        # BERT typically has a 512 token limit, be careful
-        # A rough estimate is about 3-4 chars per token for many languages
-        if len(comment_text) > 1500:  # ~375-500 tokens
-            print(f"Truncating comment of length {len(comment_text)} to 1500 characters")
-            comment_text = comment_text[:1500]
-        
-        try:
-            # Get sentiment score (1-5)
-            result = sentiment_analyzer(comment_text)[0]
-            score = int(result['label'].split()[0])  # Convert '1 star' to 1
-            
-            # Weight by likes (add 1 to avoid zero weights)
-            weight = comment['likes'] + 1
-            weighted_scores += score * weight
-            total_weight += weight
-            
-        except Exception as e:
-            print(f"Error analyzing sentiment for comment: {e}")
-            # Continue with next comment instead of failing
-            continue
-    
-    # If no comments were successfully analyzed
-    if total_weight == 0:
-        print("Could not analyze any comments, returning neutral sentiment")
-        return "neutral"
-    
-    average_score = weighted_scores / total_weight
-    
-    # Convert to sentiment category
-    if average_score >= 4:
-        sentiment = "positive"
-    elif average_score >= 3:
-        sentiment = "neutral"
+def scrape_hoyolab(article_limit=10, sentiment_batch_size=32, concurrent=False,
+                   requests_per_second=1.0, max_in_flight=4, incremental=True, state_path=STATE_PATH,
+                   image_workers=4, image_processes=None, max_comments=20, comment_time_budget=None,
+                   top_comments=None, sentiment_cache=True, sentiment_backend='pipeline', sentiment_threads=None,
+                   pipelined=False, version_index_path=VERSION_INDEX_PATH, article_store_path=STORE_PATH):
+    # Main scraping function with two-pass processing and image extraction
+    # In concurrent mode the fixed per-request delays are replaced by a shared rate limiter
+    # and content/comment fetches overlap on a thread pool
+    # In pipelined mode the passes run as concurrent stages, see scrape_pipeline.ScrapePipeline
+    # In incremental mode articles unchanged since the last run are carried forward from the scrape state
+    # Version start times come from the version index, which every run reads and extends
+    # Fetched posts are appended to the article store unless article_store_path is None
+    formatted_events = []
+    version_updates = VersionIndex.load(version_index_path)
+    metrics = get_metrics()
+    
+    state = ScrapeState.load(state_path) if incremental else None
+    if state:
+        # Scrape states from before the version index kept the versions themselves
+        for version, version_info in state.version_updates.items():
+            if version not in version_updates:
+                version_updates[version] = version_info
+    
+    limiter = None
+    executor = None
+    if concurrent or pipelined:
+        logger.info("Concurrent mode: %s requests/s, at most %d in flight", requests_per_second, max_in_flight)
+        limiter = RateLimiter(requests_per_second, max_in_flight)
+        executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    
+    comment_sampling = {'max_comments': max_comments, 'time_budget': comment_time_budget, 'top_n': top_comments}
+    sentiment_engine = get_sentiment_engine(sentiment_batch_size, use_cache=sentiment_cache,
+                                            backend=sentiment_backend, num_threads=sentiment_threads)
+    image_store = get_image_store(image_workers)
+    
+    if pipelined:
+        logger.info("Pipelined mode: processing events while the list pages are walked")
+        pipeline = ScrapePipeline(state, limiter, executor, version_updates, sentiment_engine, image_store,
+                                  article_limit=article_limit, comment_sampling=comment_sampling,
+                                  image_processes=image_processes, window=max_in_flight * 2)
+        with metrics.span('pipeline'):
+            all_articles, event_slots, new_events, processed_ids = pipeline.run()
     else:
-        sentiment = "negative"
-        
-    print(f"Sentiment analysis result: {sentiment} (average score: {average_score:.2f})")
-    return sentiment
-
-def get_article_content(post_id):
-    # Fetch detailed article content with complete extraction of all sections including Event Details
-    add_delay()  # Add delay before each request
-    
-    api_url = f"https://bbs-api-os.hoyolab.com/community/post/wapi/getPostFull?post_id={post_id}&read=1&scene=1"
-    
-    try:
-        response = requests.get(api_url, headers=get_headers())
-        response.raise_for_status()
-        
-        data = response.json()
-        post_data = data.get('data', {}).get('post', {}).get('post', {})
-        
-        # Get image_list from the correct location
-        image_list = data.get('data', {}).get('post', {}).get('image_list', [])
-        
-        # Try to get content from different possible sources
-        structured_content = post_data.get('structured_content', '')
-        desc = post_data.get('desc', '')
-        multi_lang = post_data.get('multi_language_info', {})
-        lang_content = multi_lang.get('lang_content', {}).get('en-us', '')
-        
-        # Also get cover field which might contain an image
-        cover = post_data.get('cover', '')
-        
-        # Extract section images from structured content
-        section_images = {}
-        
-        # Create a complete text representation from structured content
-        full_text = ""
-        bullet_points = []
-        
-        if structured_content:
-            try:
-                print(f"Parsing structured content for post {post_id}")
-                content_data = json.loads(structured_content)
-                
-                # Process structured content to extract all text and images
-                for i in range(len(content_data)):
-                    item = content_data[i]
-                    
-                    # Skip empty items
-                    if 'insert' not in item:
-                        continue
-                        
-                    insert_value = item['insert']
-                    
-                    # Handle plain text inserts
-                    if isinstance(insert_value, str):
-                        # Add to full text
-                        full_text += insert_value
-                        
-                        # Check for bullet points (● symbol)
-                        if '●' in insert_value:
-                            bullet_points.append(insert_value)
-                            print(f"Found bullet point: {insert_value[:50]}...")
-                        
-                        # Check for Event Rewards section followed by an image
-                        if '▌Event Rewards' in insert_value and i + 1 < len(content_data):
-                            next_item = content_data[i + 1]
-                            if (isinstance(next_item.get('insert'), dict) and 
-                                'image' in next_item.get('insert', {})):
-                                section_images['Event Rewards'] = next_item['insert']['image']
-                                print(f"Found Event Rewards image: {next_item['insert']['image']}")
-                    
-                    # Handle object inserts (like images)
-                    elif isinstance(insert_value, dict):
-                        # Skip image inserts for text content
-                        if 'image' in insert_value:
-                            continue
-                            
-                        # Get text content from other objects
-                        if 'text' in insert_value:
-                            full_text += insert_value['text']
-                
-                print(f"Extracted text with length: {len(full_text)}")
-                print(f"Found {len(bullet_points)} bullet points")
-                
-                # If we found bullet points, make sure they're in the full text
-                if bullet_points and '●' not in full_text:
-                    print("Adding missing bullet points to full text")
-                    # Add missing bullet points to the full text
-                    full_text += "\n▌Event Details\n" + "\n".join(bullet_points)
-                
-            except (json.JSONDecodeError, TypeError) as e:
-                print(f"Error parsing structured content: {e}")
-                # Fall back to unstructured content
-                full_text = ' '.join(filter(None, [desc, structured_content]))
-        else:
-            # Fall back to unstructured content if no structured content
-            full_text = ' '.join(filter(None, [desc, lang_content]))
-        
-        # Clean up HTML tags
-        full_text = re.sub(r'<[^>]+>', ' ', full_text)
-        
-        # Clean up excess whitespace
-        full_text = re.sub(r'\s+', ' ', full_text).strip()
-        
-        # Ensure proper formatting of section markers and bullet points
-        full_text = full_text.replace("▌Event", "▌ Event")
-        full_text = full_text.replace("●During", "● During")
-        full_text = full_text.replace("●From", "● From")
-        full_text = full_text.replace("●If", "● If")
-        full_text = full_text.replace("●After", "● After")
-        
-        # Add explicit formatting for event details section if missing
-        if 'Event Details' not in full_text and len(bullet_points) > 0:
-            full_text += "\n▌ Event Details\n" + "\n".join(bullet_points)
-        
-        # Print the final full text for debugging
-        print(f"Final full text excerpt (first 200 chars): {full_text[:200]}...")
-        
-        return {
-            'description': desc,
-            'content': structured_content or lang_content,
-            'full_text': full_text,
-            'structured_content': structured_content,
-            'raw_post_data': post_data,
-            'image_list': image_list,
-            'cover': cover,
-            'section_images': section_images
-        }
-    
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching article content: {e}")
-        return None
-
-def format_event_for_firestore(article, dates):
-    # Format article data with sentiment analysis, validated dates, and enhanced image extraction
-    # Get raw post data for better description and image extraction
-    raw_post_data = article.get('raw_post_data', {})
-    clean_description = raw_post_data.get('desc', '') or article.get('description', '')
-    
-    # Get the full text including all sections and bullet points
-    full_text = article.get('full_text', '')
-    
-    # Parse structured content for better event details extraction
-    structured_content = raw_post_data.get('structured_content', '') or article.get('structured_content', '')
-    
-    # Extract bullet points and event details if not already in full text
-    if structured_content and ('▌ Event Details' not in full_text or '● ' not in full_text):
-        try:
-            content_data = json.loads(structured_content)
-            bullet_points = []
-            event_details_text = ""
-            
-            # Process structured content to extract event details
-            in_event_details = False
-            for item in content_data:
-                if 'insert' not in item:
-                    continue
-                    
-                insert_value = item['insert']
-                
-                # Check for Event Details section
-                if isinstance(insert_value, str):
-                    if '▌Event Details' in insert_value:
-                        in_event_details = True
-                        event_details_text += insert_value
-                    elif in_event_details and '●' in insert_value:
-                        bullet_points.append(insert_value)
-                        event_details_text += insert_value
-            
-            # If we have event details and they're not in the full text, add them
-            if event_details_text and '▌ Event Details' not in full_text:
-                print(f"Adding missing event details to description")
-                full_text += "\n" + event_details_text
-        except (json.JSONDecodeError, TypeError) as e:
-            print(f"Error extracting event details from structured content: {e}")
-    
-    # Create base event data
-    event_data = {
-        'eventId': article.get('id'),
-        'title': article.get('title'),
-        'description': full_text,  # Use the complete full text with all sections
-        'startDate': dates['startDate'],
-        'endDate': dates['endDate'],
-        'startTimestamp': dates['startTimestamp'],
-        'endTimestamp': dates['endTimestamp'],
-        'lastUpdated': datetime.now().isoformat()
-    }
-    
-    # Add sentiment analysis
-    comments = get_article_comments(article['id'])
-    sentiment = analyze_sentiment(comments)
-    event_data['sentiment'] = sentiment
-    
-    # Add version if available
-    if 'version' in dates:
-        event_data['version'] = dates['version']
-    
-    # Handle section-specific images
-    section_images = article.get('section_images', {})
-    section_image_paths = {}
+        all_articles, event_slots, new_events, processed_ids = scrape_two_passes(
+            state, limiter, executor, version_updates, article_limit, comment_sampling, sentiment_engine,
+            image_store, image_processes, max_in_flight)
+    if executor:
+        executor.shutdown()
     
-    # Download section-specific images
-    for section_name, image_url in section_images.items():
-        try:
-            # Create directory if it doesn't exist
-            os.makedirs('src/assets/images/events/sections', exist_ok=True)
-            
-            # Parse URL to get file extension
-            from urllib.parse import urlparse
-            parsed_url = urlparse(image_url)
-            path = parsed_url.path
-            ext = os.path.splitext(path)[1]
-            if not ext:
-                ext = '.jpg'  # Default to .jpg if no extension
-            
-            # Create a unique filename based on event ID and section name
-            safe_section_name = re.sub(r'[^a-zA-Z0-9]', '_', section_name.lower())
-            local_filename = f"src/assets/images/events/sections/event_{article.get('id')}_{safe_section_name}{ext}"
-            
-            # Download the image
-            print(f"⏳ Downloading section image for {section_name} from {image_url}")
-            img_response = requests.get(image_url, stream=True)
-            img_response.raise_for_status()
-            
-            with open(local_filename, 'wb') as f:
-                for chunk in img_response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            # Use path that will work in Angular
-            asset_path = f"/assets/images/events/sections/event_{article.get('id')}_{safe_section_name}{ext}"
-            section_image_paths[section_name] = asset_path
-            print(f"✓ Downloaded section image to: {local_filename}")
-        except Exception as e:
-            print(f"⚠ Error downloading section image: {e}")
-            # Store the original URL as fallback in case download failed
-            section_image_paths[section_name] = image_url
-    
-    # Add section images to event data
-    if section_image_paths:
-        event_data['sectionImages'] = section_image_paths
-        print(f"✓ Added {len(section_image_paths)} section images to event data")
-    
-    # Enhanced image extraction with better logging
-    print(f"\n▶ Extracting main image for event: {article.get('title')}")
-    image_url = None
-    
-    # METHOD 1: Check image_list first (most direct and reliable)
-    image_list = article.get('image_list', [])
-    if image_list and len(image_list) > 0:
-        image_url = image_list[0].get('url')
-        print(f"✓ Found image URL in image_list: {image_url}")
-    
-    # METHOD 2: Check cover field if no image in image_list
-    if not image_url and article.get('cover'):
-        image_url = article.get('cover')
-        print(f"✓ Found image URL in cover field: {image_url}")
-    
-    # METHOD 3: Try to extract from structured_content if still no image
-    if not image_url and 'structured_content' in raw_post_data:
-        structured_content = raw_post_data.get('structured_content', '')
-        try:
-            content_data = json.loads(structured_content)
-            if isinstance(content_data, list):
-                for item in content_data:
-                    # Make sure item is a dict and insert is also a dict before accessing its attributes
-                    if isinstance(item, dict) and 'insert' in item:
-                        insert_value = item.get('insert')
-                        # Check if insert_value is a dictionary before trying to access its attributes
-                        if isinstance(insert_value, dict) and insert_value.get('type') == 'image':
-                            image_url = insert_value.get('attributes', {}).get('src')
-                            if image_url:
-                                print(f"✓ Found image URL in structured_content: {image_url}")
-                                break
-        except (json.JSONDecodeError, TypeError) as e:
-            print(f"⚠ Error parsing structured_content: {e}")
-    
-    # If no image found after all attempts
-    if not image_url:
-        print(f"⚠ No image found for event: {article.get('title')}")
+    image_count = 0  # Track how many events have images
+    for slot in event_slots:
+        formatted_event = new_events.get(slot[0]['id']) if isinstance(slot, tuple) else slot
+        if formatted_event:
+            # Check if the event has an image
+            if 'imageUrl' in formatted_event:
+                image_count += 1
+            formatted_events.append(formatted_event)
+    
+    if state:
+        for article in all_articles:
+            if article.get('cached'):
+                continue
+            if is_version_update_article(article) and 'full_text' not in article:
+                continue  # Content fetch failed, try again next run
+            if is_event_article(article) and article['id'] not in new_events:
+                continue  # Not reached before the article limit, or no event yet; try again next run
+            state.record(article, new_events.get(article['id']))
+        with metrics.span('save state'):
+            state.save()
     
-    # If found an image URL, download it and store local path
-    local_image_path = None
-    if image_url:
-        try:
-            # Create directory if it doesn't exist
-            os.makedirs('src/assets/images/events', exist_ok=True)
-            
-            # Parse URL to get file extension
-            from urllib.parse import urlparse
-            parsed_url = urlparse(image_url)
-            path = parsed_url.path
-            ext = os.path.splitext(path)[1]
-            if not ext:
-                ext = '.jpg'  # Default to .jpg if no extension
-            
-            # Save to Angular assets directory for easy access
-            local_filename = f"src/assets/images/events/event_{article.get('id')}{ext}"
-            
-            # Download the image
-            print(f"⏳ Downloading image from {image_url}")
-            img_response = requests.get(image_url, stream=True)
-            img_response.raise_for_status()
-            
-            with open(local_filename, 'wb') as f:
-                for chunk in img_response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            # Use path that will work in Angular
-            local_image_path = f"/assets/images/events/event_{article.get('id')}{ext}"
-            print(f"✓ Downloaded image to: {local_filename}")
-        except Exception as e:
-            print(f"⚠ Error downloading image: {e}")
-            traceback.print_exc()  # Add stack trace for better debugging
+    # Print summary
+    logger.info("===== SCRAPING SUMMARY =====")
+    logger.info("Total events processed: %d", len(formatted_events))
+    logger.info("Events with images: %d", image_count)
+    logger.info("Events without images: %d", len(formatted_events) - image_count)
+    image_store.log_stats()
+    if sentiment_engine.cache:
+        sentiment_engine.cache.log_stats()
+    get_client().log_stats()
+    
+    if article_store_path:
+        # Archive the posts fetched this run; the store skips any it already has unchanged
+        fetched = [article_record(article) for article in all_articles if 'full_text' in article]
+        with metrics.span('archive articles', items=len(fetched)):
+            store = ArticleStore(article_store_path)
+            stored = store.add_many(fetched)
+            store.close()
+        logger.info("Archived %d new or changed articles in %s", stored, article_store_path)
     
-    # Add image URL to event data
-    if local_image_path:
-        event_data['imageUrl'] = local_image_path
-        print(f"✓ Added imageUrl to event: {local_image_path}")
-    elif image_url:
-        event_data['imageUrl'] = image_url
-        print(f"⚠ Using remote imageUrl (download failed): {image_url}")
+    # Save formatted events
+    if formatted_events:
+        with metrics.span('write output', items=len(formatted_events)):
+            temp_path = 'formatted_events.json.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(formatted_events, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, 'formatted_events.json')
+        logger.info("Saved events to %s", os.path.abspath('formatted_events.json'))
     
-    return event_data
-
+    return formatted_events
 
-# Replace the conflict section with this:
-def scrape_hoyolab(article_limit=10):
-    # Main scraping function with two-pass processing and image extraction
+def scrape_two_passes(state, limiter, executor, version_updates, article_limit, comment_sampling, sentiment_engine,
+                      image_store, image_processes=None, max_in_flight=4):
+    # The first pass walks the list pages and reads every version update, the second dates,
+    # scores and formats events in feed order until article_limit of them are kept.
+    # Returns (all_articles, event_slots, new_events, processed_ids)
     all_articles = []
-    formatted_events = []
-    version_updates = {}
     last_id = ""
     is_last = False
     page_count = 0
-    
-    # First pass: Get all articles and process version updates
-    print("\nFirst pass: Processing version updates...")
-    while not is_last and page_count < 10:
+    event_count = 0
+    reached_known_version = False
+    stopped_at_known_version = False
+    metrics = get_metrics()
+    version_fetches = []
+    
+    def list_page():
+        # List the next page, starting the content fetch of every new version update on it
+        nonlocal last_id, is_last, page_count, event_count, reached_known_version
         page_count += 1
-        print(f"\nFetching page {page_count} for version updates...")
-        articles, new_last_id, is_last = get_article_list(last_id)
+        logger.info("Fetching page %d for version updates...", page_count)
+        with metrics.span('list page'):
+            articles, new_last_id, is_last = get_article_list(last_id, limiter)
+        metrics.increment('articles_listed', len(articles))
         
-        if not articles:
-            break
-            
         for article in articles:
-            print(f"Checking article: {article['title']}")
-            if is_version_update_article(article):
-                print(f"Found version update article: {article['title']}")
-                content = get_article_content(article['id'])
-                if content:
-                    article.update(content)
-                    version_info = parse_version_update_time(article.get('full_text', ''))
-                    if version_info:
-                        version = version_info['version']
-                        version_updates[version] = version_info
-                        print(f"Found version {version} start time: {version_info['versionStart']}")
+            logger.debug("Checking article: %s", article['title'])
+            mark_article(article, state)
+            categories = article_categories(article)
+            event_count += 'event' in categories
+            is_version_update = 'version_update' in categories
+            if is_version_update and version_updates.knows_announcement(article):
+                reached_known_version = True
+            
+            if not article.get('cached') and is_version_update:
+                logger.info("Found version update article: %s", article['title'])
+                if executor:
+                    # Keep paging while the content downloads
+                    version_fetches.append((article, executor.submit(fetch_article_content, article, limiter)))
+                else:
+                    add_version_update(article, fetch_article_content(article), version_updates)
             
             all_articles.append(article)
             
         last_id = new_last_id
+        return articles
     
-    # Second pass: Process event articles with version information
-    print("\nSecond pass: Processing event articles...")
-    event_count = 0
-    image_count = 0  # Track how many events have images
+    def read_version_updates():
+        for article, future in version_fetches:
+            add_version_update(article, future.result(), version_updates)
+        version_fetches.clear()
     
-    for article in all_articles:
-        if event_count >= article_limit:
+    def add_unlisted_articles():
+        if state:
+            # Events from earlier runs that were not on the pages walked this time
+            listed_ids = {str(article['id']) for article in all_articles}
+            for article in state.unlisted_articles(listed_ids):
+                article['cached'] = True
+                all_articles.append(article)
+    
+    # First pass: Get all articles and process version updates
+    logger.info("First pass: Processing version updates...")
+    first_pass_start = time.perf_counter()  # Timed by hand, a with block would indent the whole pass
+    while not is_last and page_count < 10:
+        articles = list_page()
+        if not articles:
+            break
+        
+        # The feed is newest first, so once a whole page was seen before the rest was covered by earlier runs
+        if state and all(article.get('cached') for article in articles):
+            logger.info("Page %d has no new or changed articles, stopping early", page_count)
+            break
+        # Older pages are only walked for their version updates, which the index already has. Whether
+        # the events listed so far fill the article limit is only known once they are dated, so the
+        # second pass lists more pages if they do not
+        if state and reached_known_version and event_count >= article_limit:
+            logger.info("Page %d reached a version update already in the index, stopping early", page_count)
+            stopped_at_known_version = True
             break
-            
-        if is_event_article(article):
-            print(f"\nProcessing event article: {article['title']}")
-            content = get_article_content(article['id']) if 'full_text' not in article else None
-            
-            if content:
-                article.update(content)
-                
-            dates = parse_event_dates(article.get('full_text', ''), version_updates)
-            if dates:
-                formatted_event = format_event_for_firestore(article, dates)
-                if formatted_event:
-                    # Check if the event has an image
-                    if 'imageUrl' in formatted_event:
-                        image_count += 1
-                        
-                    formatted_events.append(formatted_event)
-                    print(f"Successfully processed event: {article['title']}")
-                    event_count += 1
-            else:
-                print(f"Could not parse dates for: {article['title']}")
     
-    # Print summary
-    print(f"\n===== SCRAPING SUMMARY =====")
-    print(f"Total events processed: {len(formatted_events)}")
-    print(f"Events with images: {image_count}")
-    print(f"Events without images: {len(formatted_events) - image_count}")
+    read_version_updates()
+    metrics.observe('first pass', time.perf_counter() - first_pass_start, items=len(all_articles))
+    if not stopped_at_known_version:
+        add_unlisted_articles()
     
-    # Save formatted events
-    if formatted_events:
-        with open('formatted_events.json', 'w', encoding='utf-8') as f:
-            json.dump(formatted_events, f, ensure_ascii=False, indent=2)
-        print(f"Saved all events to formatted_events.json")
+    def list_more():
+        # Lists the next page for the second pass, once the events before the known version
+        # update turned out not to fill the article limit. False when there is nothing left
+        nonlocal stopped_at_known_version
+        if not stopped_at_known_version:
+            return False
+        logger.info("Fewer than %d events before the known version update, listing on", article_limit)
+        articles = list_page()
+        read_version_updates()
+        if not articles or is_last or page_count >= 10 or all(article.get('cached') for article in articles):
+            stopped_at_known_version = False
+            add_unlisted_articles()
+        return True
     
-    return formatted_events
+    # Second pass: Process event articles with version information
+    logger.info("Second pass: Processing event articles...")
+    second_pass_start = time.perf_counter()
+    event_slots = []  # Carried forward events and (article, dates) still to format, in feed order
+    dated_articles = []
+    processed_ids = set()
+    
+    position = 0
+    while True:
+        event_articles = [article for article in all_articles[position:] if is_event_article(article)]
+        position = len(all_articles)
+        if executor:
+            contents = iter_article_contents(event_articles, limiter, executor, window=max_in_flight * 2)
+        else:
+            contents = (
+                (article, fetch_article_content(article) if needs_content(article) else None)
+                for article in event_articles
+            )
+        
+        with closing(contents):
+            for article, content in contents:
+                if article.get('cached'):
+                    cached_event = state.cached_event(article['id'])
+                    if not cached_event:
+                        continue
+                    logger.debug("Carrying forward unchanged event: %s", article['title'])
+                    metrics.increment('events_carried_forward')
+                    event_slots.append(cached_event)
+                else:
+                    logger.info("Processing event article: %s", article['title'])
+                    if content:
+                        article.update(content)
+                    processed_ids.add(article['id'])
+                        
+                    with metrics.span('parse dates'):
+                        dates = parse_event_dates(article.get('full_text', ''), version_updates)
+                    if not dates:
+                        logger.warning("Could not parse dates for: %s", article['title'])
+                        metrics.increment('events_without_dates')
+                        continue
+                    dated_articles.append((article, dates))
+                    event_slots.append((article, dates))
+                    
+                # Stop before the next article so no extra content is fetched
+                if len(event_slots) >= article_limit:
+                    break
+        if len(event_slots) >= article_limit or not list_more():
+            break
+    metrics.observe('second pass', time.perf_counter() - second_pass_start, items=len(event_slots))
+    
+    new_events = enrich_events(dated_articles, limiter, executor, comment_sampling, sentiment_engine, image_store,
+                               image_processes)
+    
+    return all_articles, event_slots, new_events, processed_ids
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape Honkai Star Rail events from HoYoLab")
+    parser.add_argument('--article-limit', type=int, default=20,
+                        help="maximum number of events to process")
+    parser.add_argument('--sentiment-batch-size', type=int, default=32,
+                        help="number of comments scored per model call")
+    parser.add_argument('--max-comments', type=int, default=20,
+                        help="maximum comments read per event for sentiment, following reply pages as needed")
+    parser.add_argument('--comment-time-budget', type=float, default=None,
+                        help="stop reading an event's comments after this many seconds")
+    parser.add_argument('--top-comments', type=int, default=None,
+                        help="score only the N most liked of the comments read")
+    parser.add_argument('--sentiment-backend', choices=sorted(BACKENDS), default='pipeline',
+                        help="how the sentiment model runs: full precision, int8 quantised or ONNX Runtime")
+    parser.add_argument('--sentiment-threads', type=int, default=None,
+                        help="CPU threads for sentiment inference (default: library default)")
+    parser.add_argument('--no-sentiment-cache', action='store_true',
+                        help="score every comment with the model instead of reusing earlier scores")
+    parser.add_argument('--concurrent', action='store_true',
+                        help="overlap requests on a thread pool behind a shared rate limiter")
+    parser.add_argument('--rps', type=float, default=1.0,
+                        help="requests per second allowed in concurrent mode")
+    parser.add_argument('--max-in-flight', type=int, default=4,
+                        help="maximum simultaneous requests in concurrent mode")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="run fetching, dating, comments, sentiment, images and formatting as concurrent stages")
+    parser.add_argument('--image-workers', type=int, default=4,
+                        help="maximum simultaneous image downloads")
+    parser.add_argument('--image-processes', type=int, default=None,
+                        help="worker processes for resizing images (default: one per core)")
+    parser.add_argument('--full', action='store_true',
+                        help="ignore the scrape state and reprocess every article")
+    parser.add_argument('--offline', action='store_true',
+                        help="serve every request from the response cache, never touching the network")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="bypass the on-disk response cache")
+    parser.add_argument('--record-fixtures', metavar='DIR',
+                        help="record API and image responses into a fixture store for hoyolab_server.py")
+    parser.add_argument('--full-upload', action='store_true',
+                        help="write every event to Firestore, not just new and changed ones")
+    parser.add_argument('--sync-source', choices=['manifest', 'firestore'], default='manifest',
+                        help="where the previous event hashes come from")
+    parser.add_argument('--delete-expired', action='store_true',
+                        help="delete events from Firestore once their end date has passed")
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                        help="least severe messages to show")
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text',
+                        help="plain lines or one JSON object per line")
+    parser.add_argument('--metrics-report', metavar='PATH',
+                        help="write the run's timings and counters here, as Prometheus text for .prom files")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
+    configure_logging(args.log_level, json_lines=args.log_format == 'json')
+    metrics = get_metrics()
+    if args.no_cache:
+        get_client().cache = None
+    elif args.offline:
+        get_client().cache.cache_only = True
+    if args.record_fixtures:
+        get_client().recorder = FixtureStore(args.record_fixtures)
+    
     # Scrape events with increased limit
-    events = scrape_hoyolab(article_limit=20)
-    print(f"\nSuccessfully processed {len(events)} events")
+    events = scrape_hoyolab(
+        article_limit=args.article_limit,
+        sentiment_batch_size=args.sentiment_batch_size,
+        concurrent=args.concurrent,
+        requests_per_second=args.rps,
+        max_in_flight=args.max_in_flight,
+        incremental=not args.full,
+        image_workers=args.image_workers,
+        image_processes=args.image_processes,
+        max_comments=args.max_comments,
+        comment_time_budget=args.comment_time_budget,
+        top_comments=args.top_comments,
+        sentiment_cache=not args.no_sentiment_cache,
+        sentiment_backend=args.sentiment_backend,
+        sentiment_threads=args.sentiment_threads,
+        pipelined=args.pipeline
+    )
+    logger.info("Successfully processed %d events", len(events))
     
     if events:
-        # Save to JSON file
-        with open('formatted_events.json', 'w', encoding='utf-8') as f:
-            json.dump(events, f, ensure_ascii=False, indent=2)
-        print(f"Saved events to {os.path.abspath('formatted_events.json')}")
-        
         # Count events with images
         events_with_images = sum(1 for event in events if 'imageUrl' in event)
-        print(f"Events with images: {events_with_images}/{len(events)}")
+        logger.info("Events with images: %d/%d", events_with_images, len(events))
         
         # Try uploading to Firestore with improved function
-        upload_success = upload_to_firestore(events)
+        with metrics.span('firestore upload', items=len(events)):
+            upload_success = upload_to_firestore(
+                events,
+                sync=not args.full_upload,
+                sync_source=args.sync_source,
+                delete_expired=args.delete_expired
+            )
         
         if not upload_success:
-            print("\n⚠️ WARNING: Failed to upload events to Firestore!")
-            print("The calendar view may not update until Firestore upload is successful.")
+            logger.warning("Failed to upload events to Firestore! "
+                           "The calendar view may not update until Firestore upload is successful.")
         else:
-            print("\n✅ Events uploaded to Firestore successfully!")
+            logger.info("Events uploaded to Firestore successfully!")
+    
+    metrics.log_summary()
+    if args.metrics_report:
+        metrics.write_report(args.metrics_report)
@@ -0,0 +1,121 @@
+import logging
+import re
+from datetime import datetime, timedelta
+
+from date_parser import extract_event_dates
+
+logger = logging.getLogger(__name__)
+
+# Specific patterns that indicate a version update announcement
+VERSION_UPDATE_KEYWORDS = ('version update', 'version maintenance', 'welcome to version')
+
+# An article mentioning any of these is about an event
+EVENT_KEYWORDS = (
+    "Event Period",
+    "Period:",
+    "▌Event Period",
+    "Limited-Time Event",
+    "Event Details",
+    "Garden of Plenty",
+    "Planar Fissure",
+    "Warp",
+)
+
+# Words several keywords share. Each is looked for once per article and only the keywords containing
+# a word that was found are checked, so a post matching nothing costs six substring scans instead of eleven
+KEYWORD_ANCHORS = ('version', 'period', 'event')
+
+
+def _group_keywords():
+    """Lowercased (keyword, category) pairs grouped under the first anchor each keyword contains"""
+    groups = {}
+    keywords = ([(keyword.lower(), 'version_update') for keyword in VERSION_UPDATE_KEYWORDS]
+                + [(keyword.lower(), 'event') for keyword in EVENT_KEYWORDS])
+    for keyword, category in keywords:
+        anchor = next((anchor for anchor in KEYWORD_ANCHORS if anchor in keyword), keyword)
+        groups.setdefault(anchor, []).append((keyword, category))
+    return tuple((anchor, tuple(members)) for anchor, members in groups.items())
+
+
+KEYWORD_GROUPS = _group_keywords()
+
+
+def match_keywords(article):
+    """All (keyword, category) pairs found in the article's title or description, keywords lowercased"""
+    # Lowercased once for both fields; the newline keeps a keyword from matching across them
+    text = ((article.get('title') or '') + '\n' + (article.get('description') or '')).lower()
+    return [match for anchor, members in KEYWORD_GROUPS if anchor in text
+            for match in members if match[0] in text]
+
+
+def classify_article(article):
+    """Return (category, matched keywords) for a listed or archived article.
+
+    The category is 'version_update', 'event' or None. An announcement that
+    also matches event keywords counts as a version update, but its event
+    keywords are still listed, so is_event_article stays true for it.
+    """
+    matches = match_keywords(article)
+    categories = {category for _, category in matches}
+    category = next((c for c in ('version_update', 'event') if c in categories), None)
+    return category, [keyword for keyword, _ in matches]
+
+
+def article_categories(article):
+    """The categories of the keywords in a listed article, matched once and kept on it as 'categories'"""
+    categories = article.get('categories')
+    if categories is None:
+        categories = article['categories'] = sorted({category for _, category in match_keywords(article)})
+    return categories
+
+
+def is_version_update_article(article):
+    """Check if this is a version update announcement"""
+    return 'version_update' in article_categories(article)
+
+
+def is_event_article(article):
+    return 'event' in article_categories(article)
+
+def parse_version_update_time(text):
+    """Extract version update time from announcement"""
+    # Look for version number
+    version_pattern = r"Version (\d+\.\d+)"
+    update_time_pattern = r"Begins at (\d{4}/\d{1,2}/\d{1,2} \d{2}:\d{2}:\d{2})"
+    
+    version_match = re.search(version_pattern, text)
+    time_match = re.search(update_time_pattern, text)
+    
+    if version_match and time_match:
+        version = version_match.group(1)
+        update_time = datetime.strptime(time_match.group(1), "%Y/%m/%d %H:%M:%S")
+        
+        # Add 5 hours for the maintenance period
+        start_time = update_time + timedelta(hours=5)
+        
+        return {
+            'version': version,
+            'updateStart': update_time.isoformat(),
+            'versionStart': start_time.isoformat(),
+            'timestamp': int(start_time.timestamp() * 1000)
+        }
+    
+    return None
+
+def parse_event_dates(text, version_updates=None, debug=True):
+    """Extract start and end dates from text with proper version update handling and improved pattern matching
+    
+    The text is tokenised once by the precompiled engine in date_parser; pass
+    debug=False to silence the step by step output when re-parsing in bulk.
+    """
+    return extract_event_dates(text, version_updates, debug=debug)
+
+def add_version_update(article, content, version_updates):
+    """Merge fetched content into a version update article and record its start time"""
+    if content:
+        article.update(content)
+        version_info = parse_version_update_time(article.get('full_text', ''))
+        if version_info:
+            version = version_info['version']
+            version_updates[version] = dict(version_info, postId=article.get('id'))
+            logger.info("Found version %s start time: %s", version, version_info['versionStart'])
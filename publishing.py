@@ -0,0 +1,117 @@
+import logging
+import os
+
+from firestore_batch import BatchWriter, FIRESTORE_BATCH_LIMIT
+from firestore_sync import SyncManifest, MANIFEST_PATH, plan_sync, apply_to_manifest
+from run_metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+def get_firestore_client():
+    """Initialize Firebase if needed and return a Firestore client, or None on failure"""
+    # Imported here so scraping and parsing never pay for the Firebase SDK
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    
+    # Check if Firebase is already initialized
+    firebase_initialized = bool(firebase_admin._apps)
+    logger.debug("Firebase already initialized: %s", firebase_initialized)
+    
+    if not firebase_initialized:
+        # Get absolute path of the current script
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        service_account_path = os.path.join(current_dir, 'serviceAccountKey.json')
+        
+        # Check if file exists
+        if os.path.exists(service_account_path):
+            logger.debug("Found service account key at: %s", service_account_path)
+        else:
+            logger.warning("Service account key not found at: %s", service_account_path)
+            # Try alternate locations
+            alternate_paths = [
+                './serviceAccountKey.json',
+                '../serviceAccountKey.json',
+                os.path.abspath('serviceAccountKey.json')
+            ]
+            
+            for path in alternate_paths:
+                if os.path.exists(path):
+                    logger.info("Found service account key at alternate location: %s", path)
+                    service_account_path = path
+                    break
+        
+        try:
+            logger.debug("Initializing Firebase with credentials from: %s", service_account_path)
+            cred = credentials.Certificate(service_account_path)
+            firebase_admin.initialize_app(cred)
+            logger.info("Firebase initialized successfully")
+        except Exception as init_error:
+            logger.exception("Error initializing Firebase: %s", init_error)
+            return None
+    
+    # Get Firestore client
+    try:
+        db = firestore.client()
+        logger.debug("Firestore client created successfully")
+        return db
+    except Exception as db_error:
+        logger.exception("Error getting Firestore client: %s", db_error)
+        return None
+
+def upload_to_firestore(events, db=None, batch_size=FIRESTORE_BATCH_LIMIT, max_concurrency=4,
+                        sync=True, sync_source='manifest', delete_expired=False, manifest_path=MANIFEST_PATH):
+    """Upload events to Firestore in batched writes with enhanced error handling and debugging
+    
+    Pass `db` to write somewhere other than the project in serviceAccountKey.json,
+    e.g. a FakeFirestore; setting FIRESTORE_EMULATOR_HOST targets the emulator.
+    
+    With `sync` only new and changed events are written, judged by content hash
+    against the local manifest or, with sync_source='firestore', one read of the
+    events collection. `delete_expired` also removes events whose end date has passed.
+    """
+    try:
+        logger.info("--- FIREBASE UPLOAD PROCESS STARTING ---")
+        
+        if db is None:
+            db = get_firestore_client()
+            if db is None:
+                return False
+        
+        # Upload events
+        events_to_sync = []
+        for index, event in enumerate(events):
+            if not event:
+                logger.warning("Skipping empty event at index %d", index)
+                continue
+            events_to_sync.append(event)
+        
+        if sync_source == 'firestore':
+            logger.info("Reading the events collection to find changed events...")
+            manifest = SyncManifest.from_collection(db.collection('events'), manifest_path)
+        else:
+            manifest = SyncManifest.load(manifest_path)
+        
+        plan = plan_sync(events_to_sync, manifest, delete_expired=delete_expired, force=not sync)
+        logger.info("Sync plan: %s", plan.summary())
+        writes = plan.writes()
+        
+        logger.info("Writing %d changes to Firestore...", len(writes))
+        writer = BatchWriter(db, 'events', batch_size=batch_size, max_concurrency=max_concurrency)
+        with get_metrics().span('firestore writes', items=len(writes)):
+            failed_ids = writer.commit(writes)
+        get_metrics().increment('firestore_writes', len(writes) - len(failed_ids))
+        for event_id in failed_ids:
+            get_metrics().increment('firestore_write_failures')
+            logger.error("Error uploading event %s: gave up after retries", event_id)
+        
+        apply_to_manifest(manifest, plan, failed_ids)
+        manifest.save()
+        
+        success_count = len(writes) - len(failed_ids)
+        logger.info("--- FIREBASE UPLOAD COMPLETE: %d/%d writes succeeded, %d events unchanged ---",
+                    success_count, len(writes), plan.unchanged)
+        return not writes or success_count > 0
+                
+    except Exception as e:
+        logger.exception("Critical error in upload_to_firestore: %s", e)
+        return False
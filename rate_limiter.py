@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a token is available and take it, returns the time spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def try_acquire(self):
+        """Take a token if one is available right now, without waiting"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class RateLimiter:
+    """Global request budget shared by every fetch worker.
+
+    Combines a token bucket (average requests per second, with `burst` requests
+    allowed back to back) with a cap on the number of requests in flight at once.
+    Use it as a context manager around each HTTP call.
+    """
+
+    def __init__(self, requests_per_second=1.0, max_in_flight=4, burst=1):
+        self.bucket = TokenBucket(requests_per_second, capacity=burst)
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+    def __enter__(self):
+        self._slots.acquire()
+        try:
+            self.bucket.acquire()
+        except BaseException:
+            self._slots.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._slots.release()
+        return False
@@ -0,0 +1,206 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+from article_store import ArticleStore
+from enrichment import format_event_for_firestore, get_sentiment_engine, event_image_urls
+from fetching import build_full_text, get_article_comments
+from http_client import get_client
+from image_fetch import ImageStore
+from parsing import is_event_article, is_version_update_article, parse_event_dates, parse_version_update_time
+from response_cache import ResponseCache
+from run_metrics import configure_logging, get_metrics
+from version_index import VersionIndex, VERSION_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+RAW_ARTICLES_PATH = 'raw_articles.json'
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """Yield the items of a JSON array from a text file one at a time, reading it `chunk_size` characters at a time"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    expecting = '['  # Then 'item' (or ']' for an empty array), then ',' or ']' after each item
+
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            if eof:
+                raise ValueError("The JSON array ends early")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = chunk
+            continue
+
+        if expecting == '[':
+            if buffer[0] != '[':
+                raise ValueError("Expected a JSON array")
+            buffer, expecting = buffer[1:], 'first'
+        elif expecting in ('first', ',') and buffer[0] == ']':
+            return
+        elif expecting == ',':
+            if buffer[0] != ',':
+                raise ValueError(f"Expected ',' or ']' in the JSON array, found {buffer[:20]!r}")
+            buffer, expecting = buffer[1:], 'item'
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                end = None
+                if eof:
+                    raise
+            # An item is only complete once the ',' or ']' after it is read: a number cut off by the chunk
+            # boundary decodes, just as a shorter number
+            rest = '' if end is None else buffer[end:].lstrip()
+            if end is None or (not eof and rest[:1] not in (',', ']')):
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield item
+            buffer, expecting = buffer[end:], ','
+
+
+def iter_raw_articles(path):
+    """Stream archived articles from a JSON array (raw_articles.json), a JSON-lines file or the article store.
+
+    Only one article is held at a time: the store is read row by row and a
+    JSON array is decoded item by item as the file is read.
+    """
+    if path.endswith('.sqlite3'):
+        store = ArticleStore(path)
+        try:
+            yield from store
+        finally:
+            store.close()
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(f)
+
+
+def prepare_article(record):
+    """Rebuild the fields get_article_content adds from an archived record's raw post data.
+
+    The full text is extracted again rather than taken from the archive, so
+    changes to the extraction apply to old articles too.
+    """
+    article = dict(record)
+    post_data = article.get('raw_post_data') or {}
+    desc = post_data.get('desc', '') or article.get('description', '')
+    structured_content = post_data.get('structured_content', article.get('structured_content', ''))
+    lang_content = post_data.get('multi_language_info', {}).get('lang_content', {}).get('en-us', '')
+
+    full_text, document, section_images = build_full_text(article['id'], desc, structured_content, lang_content)
+    article.update({
+        'description': desc,
+        'full_text': full_text,
+        'structured_content': structured_content,
+        # Stored records keep the post's image list; older archives only have the raw post's images
+        'image_list': article.get('image_list') or [{'url': url} for url in post_data.get('images') or []],
+        'cover': article.get('cover') or post_data.get('cover', ''),
+        'section_images': section_images,
+        'document': document,
+    })
+    return article
+
+
+def replay(path=RAW_ARTICLES_PATH, sentiment=False, limit=None, metrics=None, version_index_path=VERSION_INDEX_PATH):
+    """Rebuild formatted events from an archive of raw articles without touching the network.
+
+    Version updates are read from the version index and then from a first
+    pass over the archive, then event articles are dated and formatted in a
+    second. The index is only read, never extended. With `sentiment` comments
+    come from the response cache only, otherwise sentiment is left out.
+    Images already in the image store are used and anything else keeps its
+    remote URL.
+    """
+    metrics = metrics or get_metrics()
+    client = get_client()
+    if client.cache is None:
+        client.cache = ResponseCache()
+    client.cache.cache_only = True  # Anything not cached fails instead of going online
+
+    version_updates = dict(VersionIndex.load(version_index_path))
+    start = time.perf_counter()
+    for record in iter_raw_articles(path):
+        if is_version_update_article(record):
+            version_info = parse_version_update_time(prepare_article(record)['full_text'])
+            if version_info:
+                version_updates[version_info['version']] = version_info
+    metrics.observe('load version updates', time.perf_counter() - start, items=len(version_updates))
+    logger.info("Found %d version updates in %s", len(version_updates), path)
+
+    dated_articles = []
+    for record in iter_raw_articles(path):
+        with metrics.span('classify'):
+            is_event = is_event_article(record)
+        if not is_event:
+            continue
+
+        with metrics.span('prepare'):
+            article = prepare_article(record)
+        with metrics.span('parse dates'):
+            dates = parse_event_dates(article.get('full_text', ''), version_updates, debug=False)
+        if not dates:
+            logger.warning("Could not parse dates for: %s", article['title'])
+            continue
+        dated_articles.append((article, dates))
+        if limit and len(dated_articles) >= limit:
+            break
+
+    sentiments = [False] * len(dated_articles)
+    if sentiment:
+        with metrics.span('comments', items=len(dated_articles)):
+            comment_lists = [get_article_comments(article['id']) for article, _ in dated_articles]
+        with metrics.span('sentiment', items=len(dated_articles)):
+            sentiments = get_sentiment_engine().analyze_many(comment_lists)
+
+    with metrics.span('images', items=len(dated_articles)):
+        image_store = ImageStore(offline=True)
+        image_store.fetch_all([url for article, _ in dated_articles for url in event_image_urls(article)])
+
+    events = []
+    for (article, dates), event_sentiment in zip(dated_articles, sentiments):
+        with metrics.span('format'):
+            events.append(format_event_for_firestore(article, dates, sentiment=event_sentiment,
+                                                     image_store=image_store))
+    return events
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rebuild formatted events from archived raw articles, offline")
+    parser.add_argument('archive', nargs='?', default=RAW_ARTICLES_PATH,
+                        help="raw_articles.json, a JSON-lines archive of the same records or the article store")
+    parser.add_argument('--output', default='formatted_events.json')
+    parser.add_argument('--sentiment', action='store_true',
+                        help="score comments found in the response cache")
+    parser.add_argument('--limit', type=int, default=None, help="stop after this many events")
+    parser.add_argument('--metrics-report', metavar='PATH',
+                        help="write the per-stage timings here, as Prometheus text for .prom files")
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    configure_logging(args.log_level)
+    metrics = get_metrics()
+    events = replay(args.archive, sentiment=args.sentiment, limit=args.limit, metrics=metrics)
+
+    with metrics.span('write output', items=len(events)):
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(events, f, ensure_ascii=False, indent=2)
+    logger.info("Saved %d events to %s", len(events), os.path.abspath(args.output))
+
+    metrics.log_summary("REPLAY TIMINGS")
+    if args.metrics_report:
+        metrics.write_report(args.metrics_report)
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CACHE_DIR = '.http_cache'
+
+# Seconds a stored response is served without asking the server again.
+# Endpoints missing here (like image downloads) are never cached.
+ENDPOINT_TTLS = {
+    'getNewsList': 5 * 60,
+    'getPostFull': 3 * 24 * 60 * 60,
+    'getPostReplies': 24 * 60 * 60,
+}
+
+MAX_CACHE_BYTES = 100 * 1024 * 1024
+
+# Response headers worth keeping with the body
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class CacheMissError(requests.exceptions.ConnectionError):
+    """Raised in cache-only mode when a response was never stored"""
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of GET responses.
+
+    Entries are keyed by a hash of the full request URL including its query
+    parameters and stored as a small JSON metadata file plus the raw body.
+    Fresh entries are served directly; stale ones are revalidated with
+    If-None-Match / If-Modified-Since when the server sent an ETag or
+    Last-Modified. The least recently used entries are evicted once the cache
+    grows past `max_bytes`. In cache-only mode nothing goes to the network.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttls=None, max_bytes=MAX_CACHE_BYTES, cache_only=False):
+        self.directory = directory
+        self.ttls = ENDPOINT_TTLS if ttls is None else ttls
+        self.max_bytes = max_bytes
+        self.cache_only = cache_only
+        self._total_bytes = None  # Scanned on the first write, then kept up to date
+        self._lock = threading.Lock()  # Guards the byte count and eviction across fetch threads
+
+    def is_cacheable(self, endpoint):
+        return self.ttls.get(endpoint) is not None
+
+    def key(self, url, params=None):
+        """Hash of the URL with its query string, so argument order does not matter"""
+        prepared = requests.Request('GET', url, params=params).prepare()
+        return hashlib.sha256(prepared.url.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key[:2], key)
+        return f"{base}.json", f"{base}.body"
+
+    def load(self, key):
+        """Return (metadata, body) for a stored entry, or None"""
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        # Touch the entry so eviction is least-recently-used
+        os.utime(meta_path)
+        return meta, body
+
+    def is_fresh(self, meta, endpoint, max_age=None):
+        ttl = self.ttls.get(endpoint, 0) if max_age is None else max_age
+        return time.time() - meta['storedAt'] < ttl
+
+    def validation_headers(self, meta):
+        """Conditional request headers for revalidating a stale entry"""
+        headers = {}
+        if meta['headers'].get('ETag'):
+            headers['If-None-Match'] = meta['headers']['ETag']
+        if meta['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+        return headers
+
+    def store(self, key, response):
+        """Save a successful response; API errors reported in the body are not kept"""
+        if response.status_code != 200 or not is_successful_body(response):
+            return
+
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        meta = {
+            'url': response.url,
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in STORED_HEADERS if name in response.headers},
+            'storedAt': time.time(),
+        }
+
+        with self._lock:
+            replaced = entry_size(meta_path, body_path)
+            write_atomic(body_path, response.content)
+            write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _, _ in self._entries())
+            else:
+                self._total_bytes += entry_size(meta_path, body_path) - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def refresh(self, key):
+        """Mark a revalidated (304) entry as fresh again"""
+        meta_path, _ = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            meta['storedAt'] = time.time()
+            write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+        except (OSError, json.JSONDecodeError):
+            pass
+
+    def _entries(self):
+        """(last used, size, metadata path, body path) for every stored entry"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(root, name)
+                body_path = meta_path[:-len('.json')] + '.body'
+                try:
+                    size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+                    entries.append((os.path.getmtime(meta_path), size, meta_path, body_path))
+                except OSError:
+                    continue
+        return entries
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _, _ in entries)
+
+        for _, size, meta_path, body_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+        self._total_bytes = total
+
+
+def write_atomic(path, payload):
+    """Write bytes through a temp file of this call's own, so a crash or a concurrent
+    writer of the same path never leaves half a file behind"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def entry_size(meta_path, body_path):
+    """Bytes an entry takes on disk, 0 if either file is missing"""
+    try:
+        return os.path.getsize(meta_path) + os.path.getsize(body_path)
+    except OSError:
+        return 0
+
+
+def is_successful_body(response):
+    """HoYoLab reports failures as HTTP 200 with a non-zero retcode"""
+    if 'json' not in response.headers.get('Content-Type', ''):
+        return True
+    try:
+        return response.json().get('retcode', 0) == 0
+    except ValueError:
+        return False
+
+
+def cached_response(meta, body):
+    """Rebuild a requests.Response from a stored entry"""
+    response = requests.Response()
+    response.status_code = meta['status']
+    response.url = meta['url']
+    response.headers = CaseInsensitiveDict(meta['headers'])
+    response._content = body
+    response._content_consumed = True
+    response.encoding = 'utf-8'
+    return response
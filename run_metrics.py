@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TEXT_FORMAT = '%(asctime)s %(levelname)-7s %(message)s'
+
+# Prefix of every metric name in the Prometheus report
+METRIC_PREFIX = 'hoyolab'
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra` fields of the call alongside the message"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((name, value) for name, value in vars(record).items() if name not in _RECORD_FIELDS)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level='INFO', json_lines=False, stream=None):
+    """Send every module's log to stdout at `level`, as plain lines or JSON lines"""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter(TEXT_FORMAT, '%H:%M:%S'))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+class RunMetrics:
+    """Counters and timed spans for one run, reported as JSON or Prometheus text.
+
+    Both are keyed by a name plus optional labels, e.g. the `http` span with
+    endpoint='getPostFull', so a figure can be broken down without inventing
+    a new name for each part. Spans record calls, items, total and slowest
+    seconds. Everything is thread-safe, as fetches and downloads report from
+    worker threads.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def count(self, name, **labels):
+        """Value of one counter, or its sum over every label set when no labels are given"""
+        with self._lock:
+            if labels:
+                return self.counters.get(self._key(name, labels), 0)
+            return sum(value for (counter, _), value in self.counters.items() if counter == name)
+
+    def observe(self, name, seconds, items=1, **labels):
+        """Record a span timed elsewhere"""
+        key = self._key(name, labels)
+        with self._lock:
+            span = self.spans.get(key)
+            if span is None:
+                span = self.spans[key] = {'calls': 0, 'items': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+            span['calls'] += 1
+            span['items'] += items
+            span['seconds'] += seconds
+            span['max_seconds'] = max(span['max_seconds'], seconds)
+
+    @contextmanager
+    def span(self, name, items=1, **labels):
+        """Time the body of a with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(name, seconds, items, **labels)
+            logger.debug("%s took %.1f ms", name, seconds * 1000, extra={'span': name, 'seconds': seconds, **labels})
+
+    def span_totals(self, name=None):
+        """Spans summed over their labels: name -> calls, items, seconds and max_seconds"""
+        totals = {}
+        with self._lock:
+            for (span_name, _), span in self.spans.items():
+                if name is not None and span_name != name:
+                    continue
+                total = totals.setdefault(span_name, {'calls': 0, 'items': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+                for field in ('calls', 'items', 'seconds'):
+                    total[field] += span[field]
+                total['max_seconds'] = max(total['max_seconds'], span['max_seconds'])
+        return totals
+
+    def report(self):
+        with self._lock:
+            return {
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started)),
+                'seconds': time.time() - self.started,
+                'spans': [{'name': name, 'labels': dict(labels), **span}
+                          for (name, labels), span in sorted(self.spans.items())],
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+            }
+
+    def prometheus(self):
+        """The report in the Prometheus text exposition format"""
+        def sample(metric, labels, value):
+            if labels:
+                pairs = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+                return f"{metric}{{{pairs}}} {value}"
+            return f"{metric} {value}"
+
+        lines = [f"# TYPE {METRIC_PREFIX}_run_seconds gauge",
+                 f"{METRIC_PREFIX}_run_seconds {time.time() - self.started:.6f}"]
+        with self._lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+
+        for field, kind in (('seconds', 'counter'), ('calls', 'counter'), ('items', 'counter'),
+                            ('max_seconds', 'gauge')):
+            metric = f"{METRIC_PREFIX}_span_{field}" + ('_total' if kind == 'counter' else '')
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(sample(metric, (('span', name),) + labels, span[field]) for (name, labels), span in spans)
+
+        for name in dict.fromkeys(name for (name, _), _ in counters):
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(sample(metric, labels, value) for (counter, labels), value in counters if counter == name)
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, path):
+        """Prometheus text for a .prom or .txt path, JSON otherwise, written through a temp file"""
+        if path.endswith(('.prom', '.txt')):
+            payload = self.prometheus()
+        else:
+            payload = json.dumps(self.report(), indent=2)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(f"{path}.tmp", path)
+        logger.info("Saved run report to %s", path)
+
+    def log_summary(self, title="RUN TIMINGS"):
+        """Log every span, slowest first"""
+        logger.info("===== %s =====", title)
+        totals = self.span_totals()
+        for name, span in sorted(totals.items(), key=lambda item: item[1]['seconds'], reverse=True):
+            logger.info("%s: %.1f ms in %d calls, %d items (slowest %.1f ms)", name, span['seconds'] * 1000,
+                        span['calls'], span['items'], span['max_seconds'] * 1000)
+        logger.info("Total: %.2f s", time.time() - self.started)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_metrics = RunMetrics()
+
+
+def get_metrics():
+    """Return the process-wide metrics every module reports into"""
+    return _metrics
@@ -0,0 +1,505 @@
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import closing
+
+from date_parser import referenced_version
+from enrichment import event_image_urls, find_main_image_url, format_event_for_firestore
+from fetching import fetch_article_content, get_article_comments, get_article_list, needs_content
+from image_variants import available_formats, create_variants
+from parsing import (add_version_update, article_categories, is_event_article, is_version_update_article,
+                     parse_event_dates)
+from run_metrics import get_metrics
+from scrape_state import mark_article
+
+logger = logging.getLogger(__name__)
+
+# Items a channel holds before the stage writing to it has to wait
+QUEUE_SIZE = 8
+
+_DONE = object()      # Sent down a channel after its last item
+PENDING = object()    # Slot of an event still waiting for the version update it starts after
+UNFETCHED = object()  # Content left for later, the event may not be needed
+SETTLE = object()     # Asks the date stage to date every event listed so far and say if the limit is reached
+
+
+class PipelineCancelled(Exception):
+    """Raised in a stage waiting on a channel once another stage has failed"""
+
+
+class Channel:
+    """Bounded queue between two pipeline stages.
+
+    A full channel blocks the stage writing to it, so a slow stage holds the
+    ones before it back instead of letting work pile up in memory. Every wait
+    gives up once the pipeline is cancelled.
+    """
+
+    def __init__(self, cancelled, maxsize=QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize)
+        self._cancelled = cancelled
+
+    def put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise PipelineCancelled()
+
+    def close(self):
+        self.put(_DONE)
+
+    def get(self):
+        while not self._cancelled.is_set():
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise PipelineCancelled()
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is _DONE:
+                return
+            yield item
+
+    def batches(self, max_items):
+        """Whatever has queued up, at most max_items at a time, only waiting while the channel is empty"""
+        while True:
+            item = self.get()
+            if item is _DONE:
+                return
+            batch = [item]
+            while len(batch) < max_items:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    yield batch
+                    return
+                batch.append(item)
+            yield batch
+
+
+class Pipeline:
+    """Stages running on their own threads, connected by channels.
+
+    The first stage to fail cancels the others, and its exception is raised
+    again from join().
+    """
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._threads = []
+        self._errors = []
+
+    def channel(self, maxsize=QUEUE_SIZE):
+        return Channel(self.cancelled, maxsize)
+
+    def start(self, name, target, *args):
+        def run():
+            try:
+                target(*args)
+            except PipelineCancelled:
+                pass
+            except BaseException as e:
+                self._errors.append(e)
+                self.cancelled.set()
+
+        thread = threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+
+class EventSlots:
+    """Event articles in feed order and where the article limit cuts the feed off.
+
+    Each slot holds the article and what it turned into: a carried forward
+    event, its dates, None when no dates were found, or PENDING while it
+    waits for a version update. The limit counts carried forward and dated
+    events in feed order, so the cut-off is only known once every slot before
+    it is settled. Until then `could_be_full` says whether the slots so far
+    would reach the limit if every pending one were dated, so later events
+    need not be started yet.
+    """
+
+    def __init__(self, limit):
+        self.limit = max(1, limit)  # The sequential pass keeps the first event even with a limit of 0
+        self.articles = []
+        self.values = []
+        self.cutoff = None  # Index of the last slot within the limit
+        self._settled = 0
+        self._kept = 0
+        self._possible = 0  # Slots kept or pending
+        self._lock = threading.Lock()
+
+    @property
+    def full(self):
+        return self.cutoff is not None
+
+    @property
+    def could_be_full(self):
+        return self._possible >= self.limit
+
+    @property
+    def room(self):
+        """Events that can still be added before could_be_full"""
+        return max(0, self.limit - self._possible)
+
+    def add(self, article, value=PENDING):
+        with self._lock:
+            self.articles.append(article)
+            self.values.append(value)
+            if value is not None:
+                self._possible += 1
+            self._advance()
+            return len(self.values) - 1
+
+    def settle(self, index, value):
+        with self._lock:
+            self.values[index] = value
+            if value is None:
+                self._possible -= 1
+            self._advance()
+
+    def within_limit(self, index):
+        cutoff = self.cutoff
+        return cutoff is None or index <= cutoff
+
+    def _advance(self):
+        while self.cutoff is None and self._settled < len(self.values) and self.values[self._settled] is not PENDING:
+            if self.values[self._settled] is not None:
+                self._kept += 1
+                if self._kept >= self.limit:
+                    self.cutoff = self._settled
+            self._settled += 1
+
+    def kept(self):
+        """(article, value) for every slot within the limit"""
+        end = len(self.values) if self.cutoff is None else self.cutoff + 1
+        return list(zip(self.articles[:end], self.values[:end]))
+
+
+def ordered_map(executor, fn, items, window, flush=None):
+    """(item, fn(item)) for every item, run on the executor at most `window` ahead and yielded in input order.
+
+    An item for which flush(item) is true is yielded, with everything before
+    it, without waiting for the items after it.
+    """
+    pending = deque()
+    try:
+        for item in items:
+            pending.append((item, executor.submit(fn, item)))
+            while pending and flush is not None and flush(item):
+                queued, future = pending.popleft()
+                yield queued, future.result()
+            if len(pending) >= window:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+class ScrapePipeline:
+    """scrape_hoyolab's two passes as stages connected by bounded channels.
+
+    List pages -> content fetch -> date parsing -> comments -> sentiment ->
+    images -> formatting, each on its own thread, with formatting on the
+    caller's. An event is dated as soon as the version update it starts after
+    is known, or straight away when it does not depend on one, so events flow
+    downstream while later list pages are still being walked. Events naming a
+    version not seen yet wait until every version update has been read. When
+    several announcements give the same version, events already dated keep the
+    start time of the one read first. Events past the article limit, counting
+    waiting ones as kept, are held back unfetched and only started if a
+    waiting event turns out to have no dates.
+
+    Fetches share the rate limiter and thread pool of concurrent mode, and
+    sentiment scoring and image downloads take whatever events have queued up
+    as one batch. The results match the sequential passes: the articles
+    walked, the event slots in feed order, the newly formatted events and the
+    ids of the articles processed before the article limit.
+    """
+
+    def __init__(self, state, limiter, executor, version_updates, sentiment_engine, image_store,
+                 article_limit=10, comment_sampling=None, image_processes=None, max_pages=10,
+                 window=8, queue_size=QUEUE_SIZE):
+        self.state = state
+        self.limiter = limiter
+        self.executor = executor
+        self.version_updates = version_updates
+        self.sentiment_engine = sentiment_engine
+        self.image_store = image_store
+        self.comment_sampling = comment_sampling or {}
+        self.image_processes = image_processes
+        self.max_pages = max_pages
+        self.queue_size = queue_size
+        self.window = window  # Fetches run at most this far ahead of the stage reading them
+        self.metrics = get_metrics()
+
+        self.all_articles = []
+        self.slots = EventSlots(article_limit)
+        self.formatted = {}
+
+    def run(self):
+        """Run every stage to the end, returning (all_articles, event_slots, new_events, processed_ids)"""
+        pipeline = Pipeline()
+        listed, fetched, dated, commented, scored, imaged = (pipeline.channel(self.queue_size) for _ in range(6))
+        limit_reached = pipeline.channel(1)
+        pipeline.start('list', self.list_pages, listed, limit_reached)
+        pipeline.start('content', self.fetch_contents, listed, fetched)
+        pipeline.start('dates', self.date_events, fetched, dated, limit_reached)
+        pipeline.start('comments', self.fetch_comments, dated, commented)
+        pipeline.start('sentiment', self.score_sentiment, commented, scored)
+        pipeline.start('images', self.fetch_images, scored, imaged)
+        try:
+            self.format_events(imaged)
+        except PipelineCancelled:
+            pass
+        except BaseException:
+            pipeline.cancel()
+            raise
+        pipeline.join()
+        return self.results()
+
+    def list_pages(self, out, limit_reached):
+        last_id = ""
+        is_last = False
+        page_count = 0
+        event_count = 0
+        reached_known_version = False
+        stopped_at_known_version = False
+        while not is_last and page_count < self.max_pages:
+            page_count += 1
+            logger.info("Fetching page %d...", page_count)
+            with self.metrics.span('list page'):
+                articles, last_id, is_last = get_article_list(last_id, self.limiter)
+            self.metrics.increment('articles_listed', len(articles))
+            if not articles:
+                break
+
+            for article in articles:
+                logger.debug("Checking article: %s", article['title'])
+                mark_article(article, self.state)
+                self.all_articles.append(article)
+                categories = article_categories(article)
+                event_count += 'event' in categories
+                is_version_update = 'version_update' in categories
+                if is_version_update and self.version_updates.knows_announcement(article):
+                    reached_known_version = True
+                if 'event' in categories or (is_version_update and not article.get('cached')):
+                    out.put(article)
+
+            # The feed is newest first, so once a whole page was seen before the rest was covered by earlier runs
+            if self.state and all(article.get('cached') for article in articles):
+                logger.info("Page %d has no new or changed articles, stopping early", page_count)
+                break
+            # Older pages are only walked for their version updates, which the index already has,
+            # once the events listed so far are dated and fill the article limit
+            if self.state and reached_known_version and event_count >= self.slots.limit:
+                out.put(SETTLE)
+                if limit_reached.get():
+                    logger.info("Page %d reached a version update already in the index, stopping early", page_count)
+                    stopped_at_known_version = True
+                    break
+                logger.info("Fewer than %d events before the known version update, listing on", self.slots.limit)
+
+        if self.state and not stopped_at_known_version:
+            # Events from earlier runs that were not on the pages walked this time
+            listed_ids = {str(article['id']) for article in self.all_articles}
+            for article in self.state.unlisted_articles(listed_ids):
+                article['cached'] = True
+                self.all_articles.append(article)
+                if is_event_article(article):
+                    out.put(article)
+        out.close()
+
+    def fetch_contents(self, inbox, out):
+        def fetch(article):
+            if article is SETTLE or not needs_content(article):
+                return None
+            if self.slots.could_be_full and not self._is_new_version_update(article):
+                return UNFETCHED  # Fetched by the date stage if it turns out to be needed
+            return fetch_article_content(article, self.limiter)
+
+        # Once the limit is reached only version updates still need their content
+        articles = (article for article in inbox
+                    if article is SETTLE or not self.slots.full or self._is_new_version_update(article))
+        # The list stage waits for the answer to SETTLE, so it is passed on straight away
+        with closing(ordered_map(self.executor, fetch, articles, self.window,
+                                 flush=lambda article: article is SETTLE)) as contents:
+            for article, content in contents:
+                out.put((article, content))
+        out.close()
+
+    def date_events(self, inbox, out, limit_reached):
+        waiting = {}  # Slot index -> event article whose version update has not been read yet
+        held = deque()  # (article, content) of events past the limit unless a waiting one is dropped
+
+        def add_event(article, content, versions_read=False):
+            if article.get('cached'):
+                cached_event = self.state.cached_event(article['id'])
+                if cached_event:
+                    logger.debug("Carrying forward unchanged event: %s", article['title'])
+                    self.metrics.increment('events_carried_forward')
+                    self.slots.add(article, cached_event)
+                return
+
+            logger.info("Processing event article: %s", article['title'])
+            if content is UNFETCHED:
+                content = fetch_article_content(article, self.limiter)
+            elif isinstance(content, Future):
+                content = content.result()
+            if content:
+                article.update(content)
+            index = self.slots.add(article)
+            version = referenced_version(article.get('full_text', ''))
+            if versions_read or version is None or version in self.version_updates:
+                self.date_event(index, article, out)
+            else:
+                waiting[index] = article
+
+        def release_held(versions_read=False):
+            while held and not self.slots.could_be_full:
+                # Start the content fetches of every held event that may be needed together
+                for position in range(min(self.slots.room, len(held))):
+                    article, content = held[position]
+                    if content is UNFETCHED:
+                        held[position] = (article, self.executor.submit(fetch_article_content, article, self.limiter))
+                add_event(*held.popleft(), versions_read)
+
+        def date_waiting():
+            # Every version update listed so far has been read, so whatever is still waiting can be dated now
+            for index, article in waiting.items():
+                if self.slots.within_limit(index):
+                    self.date_event(index, article, out)
+                release_held(versions_read=True)
+            waiting.clear()
+            release_held(versions_read=True)
+
+        for article, content in inbox:
+            if article is SETTLE:
+                date_waiting()
+                limit_reached.put(self.slots.full)
+                continue
+            if self._is_new_version_update(article):
+                logger.info("Found version update article: %s", article['title'])
+                add_version_update(article, content, self.version_updates)
+                content = None  # Merged into the article
+                for index, event in list(waiting.items()):
+                    if referenced_version(event.get('full_text', '')) in self.version_updates:
+                        del waiting[index]
+                        self.date_event(index, event, out)
+                release_held()
+
+            if not is_event_article(article) or self.slots.full:
+                continue
+            if held or self.slots.could_be_full:
+                held.append((article, content))
+            else:
+                add_event(article, content)
+
+        date_waiting()
+        out.close()
+
+    def date_event(self, index, article, out):
+        with self.metrics.span('parse dates'):
+            dates = parse_event_dates(article.get('full_text', ''), self.version_updates)
+        if not dates:
+            logger.warning("Could not parse dates for: %s", article['title'])
+            self.metrics.increment('events_without_dates')
+        self.slots.settle(index, dates)
+        if dates and self.slots.within_limit(index):
+            out.put((index, article, dates))
+
+    def fetch_comments(self, inbox, out):
+        def fetch(item):
+            _, article, _ = item
+            with self.metrics.span('comments'):
+                return get_article_comments(article['id'], self.limiter, **self.comment_sampling)
+
+        items = (item for item in inbox if self.slots.within_limit(item[0]))
+        with closing(ordered_map(self.executor, fetch, items, self.window)) as results:
+            for item, comments in results:
+                out.put((*item, comments))
+        out.close()
+
+    def score_sentiment(self, inbox, out):
+        for batch in inbox.batches(self.queue_size):
+            batch = [item for item in batch if self.slots.within_limit(item[0])]
+            if not batch:
+                continue
+            with self.metrics.span('sentiment', items=len(batch)):
+                sentiments = self.sentiment_engine.analyze_many([comments for *_, comments in batch])
+            for (index, article, dates, _), sentiment in zip(batch, sentiments):
+                out.put((index, article, dates, sentiment))
+        out.close()
+
+    def fetch_images(self, inbox, out):
+        # One process pool for every batch, rather than one per create_variants call
+        variant_pool = ProcessPoolExecutor(max_workers=self.image_processes) if available_formats() else None
+        try:
+            for batch in inbox.batches(self.queue_size):
+                batch = [item for item in batch if self.slots.within_limit(item[0])]
+                if not batch:
+                    continue
+                articles = [article for _, article, _, _ in batch]
+                with self.metrics.span('images', items=len(batch)):
+                    self.image_store.fetch_all([url for article in articles for url in event_image_urls(article)])
+                main_image_urls = [find_main_image_url(article, verbose=False) for article in articles]
+                create_variants(self.image_store, [url for url in main_image_urls if url], executor=variant_pool)
+                for item in batch:
+                    out.put(item)
+        finally:
+            if variant_pool:
+                variant_pool.shutdown()
+        out.close()
+
+    def format_events(self, inbox):
+        for index, article, dates, sentiment in inbox:
+            if not self.slots.within_limit(index):
+                continue
+            with self.metrics.span('format'):
+                formatted_event = format_event_for_firestore(article, dates, sentiment=sentiment,
+                                                             image_store=self.image_store)
+            if formatted_event:
+                self.formatted[article['id']] = formatted_event
+                logger.debug("Successfully processed event: %s", article['title'])
+
+    def results(self):
+        event_slots = []
+        processed_ids = set()
+        for article, value in self.slots.kept():
+            if article.get('cached'):
+                event_slots.append(value)
+                continue
+            processed_ids.add(article['id'])
+            if value is not None:
+                event_slots.append((article, value))
+
+        new_events = {article_id: event for article_id, event in self.formatted.items() if article_id in processed_ids}
+        self.metrics.increment('events_processed', len(new_events))
+        return self.all_articles, event_slots, new_events, processed_ids
+
+    @staticmethod
+    def _is_new_version_update(article):
+        return not article.get('cached') and is_version_update_article(article)
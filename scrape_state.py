@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Kept next to formatted_events.json so both describe the same run
+STATE_PATH = 'scrape_state.json'
+
+
+def article_signature(article):
+    """Hash of the list fields that change when a post is edited"""
+    fields = [
+        article.get('title'),
+        article.get('description'),
+        article.get('content'),
+        article.get('updated'),
+    ]
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+
+def mark_article(article, state=None):
+    """Sign a listed article and flag it as unchanged or edited since the state was saved"""
+    # Signed before the content fetch overwrites the list fields
+    article['signature'] = article_signature(article)
+    if state and state.is_unchanged(article):
+        article['cached'] = True
+    elif state and state.is_known(article['id']):
+        article['changed'] = True  # Edited since the last run, bypass the response cache
+
+
+class ScrapeState:
+    """Persistent index of the articles processed by earlier runs.
+
+    Every listed article is recorded under its post id with the signature of
+    its list entry and, for event articles, the formatted event that was
+    produced. An article whose signature has not changed can be carried
+    forward from here without fetching its content, comments or images again.
+    Version update start times live in the version index; ones found in older
+    state files are read so they can be moved there.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.articles = {}
+        self.version_updates = {}
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        state = cls(path)
+        if not os.path.exists(path):
+            logger.info("No scrape state at %s, running a full scrape", path)
+            return state
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            state.articles = data.get('articles', {})
+            state.version_updates = data.get('version_updates', {})
+            logger.info("Loaded scrape state: %d known articles", len(state.articles))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Could not read scrape state (%s), running a full scrape", e)
+        return state
+
+    def is_unchanged(self, article):
+        """True if this article was processed before and its list entry is the same"""
+        entry = self.articles.get(str(article.get('id')))
+        return entry is not None and entry['signature'] == article.get('signature', article_signature(article))
+
+    def is_known(self, article_id):
+        return str(article_id) in self.articles
+
+    def cached_event(self, article_id):
+        entry = self.articles.get(str(article_id))
+        return entry.get('event') if entry else None
+
+    def record(self, article, event=None):
+        """Remember that an article was processed, with its formatted event if it produced one"""
+        self.articles[str(article.get('id'))] = {
+            'signature': article.get('signature', article_signature(article)),
+            'title': article.get('title'),
+            'description': article.get('description'),
+            'event': event,
+            'processedAt': datetime.now().isoformat(),
+        }
+
+    def unlisted_articles(self, listed_ids):
+        """Known articles that were not on the pages walked this run, newest post first"""
+        ids = [article_id for article_id in self.articles if article_id not in listed_ids]
+        ids.sort(key=lambda article_id: int(article_id) if article_id.isdigit() else 0, reverse=True)
+        return [
+            {'id': article_id, 'title': self.articles[article_id]['title'],
+             'description': self.articles[article_id]['description']}
+            for article_id in ids
+        ]
+
+    def save(self):
+        """Write the state atomically so an interrupted run cannot corrupt it"""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'articles': self.articles}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+        logger.info("Saved scrape state for %d articles to %s", len(self.articles), self.path)
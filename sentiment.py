@@ -0,0 +1,204 @@
+import logging
+
+from run_metrics import get_metrics
+from sentiment_backends import BACKENDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "nlptown/bert-base-multilingual-uncased-sentiment"
+
+# BERT typically has a 512 token limit, be careful
+# A rough estimate is about 3-4 chars per token for many languages
+MAX_COMMENT_CHARS = 1500  # ~375-500 tokens
+
+
+class SentimentEngine:
+    """Long-lived sentiment model shared across every event in a run.
+
+    The transformers pipeline is built on first use and reused afterwards, and
+    comments are scored in padded batches of `batch_size` instead of one call
+    per comment. An optional SentimentCache remembers scores across runs, and
+    `backend` picks how the model runs on CPU (see sentiment_backends).
+    """
+
+    def __init__(self, model=DEFAULT_MODEL, batch_size=32, cache=None, backend='pipeline', num_threads=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown sentiment backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+        self.model = model
+        self.batch_size = batch_size
+        self.cache = cache
+        self.backend = backend
+        self.num_threads = num_threads
+        self._analyzer = None
+
+    @property
+    def cache_name(self):
+        """Name scores are cached under; other backends may round a comment to a different star"""
+        return self.model if self.backend == 'pipeline' else f"{self.model}:{self.backend}"
+
+    def get_analyzer(self):
+        """Load the sentiment model with the chosen backend once and return it"""
+        if self._analyzer is None:
+            logger.info("Loading sentiment model %s (%s backend)...", self.model, self.backend)
+            with get_metrics().span('sentiment model load', backend=self.backend):
+                self._analyzer = BACKENDS[self.backend](self.model, self.num_threads)
+        return self._analyzer
+
+    def score_texts(self, texts):
+        """Return a 1-5 star score per text, or None where the model failed.
+
+        With a cache attached only texts it has never seen go to the model, and
+        the model is not even loaded when every text is cached.
+        """
+        if not texts:
+            return []
+
+        scores = self.cache.get_many(self.cache_name, texts) if self.cache else [None] * len(texts)
+
+        # Each distinct text still missing a score goes to the model once
+        missing = list(dict.fromkeys(text for text, score in zip(texts, scores) if score is None))
+        if missing:
+            self.get_analyzer()  # Loaded first so the model load is not counted as inference
+            with get_metrics().span('sentiment inference', items=len(missing)):
+                new_scores = dict(zip(missing, self.run_model(missing)))
+            if self.cache:
+                self.cache.put_many(self.cache_name, missing, [new_scores[text] for text in missing])
+            scores = [new_scores[text] if score is None else score for text, score in zip(texts, scores)]
+
+        return scores
+
+    def run_model(self, texts):
+        """Score texts with the model in padded batches.
+
+        Texts are not truncated, as when each comment was scored on its own:
+        one longer than the model's 512 tokens fails its batch, and the retry
+        item by item leaves it unscored while the rest of the batch is kept.
+        """
+        analyzer = self.get_analyzer()
+        scores = []
+
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            try:
+                results = analyzer(batch, batch_size=self.batch_size, padding=True)
+                scores.extend(int(result['label'].split()[0]) for result in results)  # Convert '1 star' to 1
+            except Exception as e:
+                # One bad comment should not sink the whole batch, so retry it item by item
+                logger.warning("Batch sentiment analysis failed (%s), retrying comments individually", e)
+                for text in batch:
+                    try:
+                        result = analyzer(text)[0]
+                        scores.append(int(result['label'].split()[0]))
+                    except Exception as item_error:
+                        logger.warning("Error analyzing sentiment for comment: %s", item_error)
+                        scores.append(None)
+
+        return scores
+
+    def analyze(self, comments):
+        """Analyze the comments of a single event"""
+        return self.analyze_many([comments])[0]
+
+    def analyze_stream(self, comments):
+        """Analyze a single event's comments as they arrive from any iterable.
+
+        A batch is scored as soon as it fills, so the model works through
+        early pages while later ones are still being fetched.
+        """
+        had_comments = False
+        batch = []
+        scores = []
+
+        for comment in comments:
+            had_comments = True
+            batch.extend(prepare_comments([comment]))
+            if len(batch) >= self.batch_size:
+                scores.extend(self._score_batch(batch))
+                batch = []
+        scores.extend(self._score_batch(batch))
+
+        return aggregate_sentiment(scores, had_comments=had_comments)
+
+    def _score_batch(self, batch):
+        """(score, likes) for each (text, likes) that the model could score"""
+        scores = self.score_texts([comment_text for comment_text, _ in batch])
+        return [(score, likes) for (_, likes), score in zip(batch, scores) if score is not None]
+
+    def analyze_many(self, comment_lists):
+        """Analyze the comments of several events in one batched inference pass.
+
+        Returns one sentiment category per entry of `comment_lists`.
+        """
+        texts = []
+        owners = []
+
+        for event_index, comments in enumerate(comment_lists):
+            for comment_text, likes in prepare_comments(comments):
+                texts.append(comment_text)
+                owners.append((event_index, likes))
+
+        if texts:
+            logger.info("Running sentiment analysis on %d comments from %d events", len(texts), len(comment_lists))
+        scores = self.score_texts(texts)
+
+        scored = [[] for _ in comment_lists]
+        for (event_index, likes), score in zip(owners, scores):
+            if score is not None:
+                scored[event_index].append((score, likes))
+
+        return [
+            aggregate_sentiment(event_scores, had_comments=bool(comments))
+            for event_scores, comments in zip(scored, comment_lists)
+        ]
+
+
+def prepare_comments(comments):
+    """Yield (text, likes) for every comment that should be sent to the model"""
+    for comment in comments:
+        comment_text = comment['content']
+
+        # Skip empty comments
+        if not comment_text or len(comment_text.strip()) == 0:
+            continue
+
+        # Truncate long comments to avoid BERT token limit issues
+        if len(comment_text) > MAX_COMMENT_CHARS:
+            logger.debug("Truncating comment of length %d to %d characters", len(comment_text), MAX_COMMENT_CHARS)
+            comment_text = comment_text[:MAX_COMMENT_CHARS]
+
+        yield comment_text, comment['likes']
+
+
+def aggregate_sentiment(scores, had_comments=True):
+    """Turn (score, likes) pairs into a like-weighted sentiment category"""
+    if not had_comments:
+        logger.debug("No comments to analyze, returning neutral sentiment")
+        return "neutral"
+
+    # Weight comments by likes
+    total_weight = 0
+    weighted_scores = 0
+
+    for score, likes in scores:
+        # Weight by likes (add 1 to avoid zero weights)
+        weight = likes + 1
+        weighted_scores += score * weight
+        total_weight += weight
+
+    # If no comments were successfully analyzed
+    if total_weight == 0:
+        logger.warning("Could not analyze any comments, returning neutral sentiment")
+        return "neutral"
+
+    average_score = weighted_scores / total_weight
+
+    # Convert to sentiment category
+    if average_score >= 4:
+        sentiment = "positive"
+    elif average_score >= 3:
+        sentiment = "neutral"
+    else:
+        sentiment = "negative"
+
+    logger.debug("Sentiment analysis result: %s (average score: %.2f)", sentiment, average_score)
+    return sentiment
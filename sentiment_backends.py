@@ -0,0 +1,47 @@
+def set_torch_threads(num_threads):
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+
+
+def build_pipeline(model, num_threads=None):
+    from transformers import pipeline
+    set_torch_threads(num_threads)
+    return pipeline("sentiment-analysis", model=model)
+
+
+def build_quantized_pipeline(model, num_threads=None):
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+    set_torch_threads(num_threads)
+
+    classifier = AutoModelForSequenceClassification.from_pretrained(model)
+    classifier = torch.quantization.quantize_dynamic(classifier, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("sentiment-analysis", model=classifier, tokenizer=AutoTokenizer.from_pretrained(model))
+
+
+def build_onnx_pipeline(model, num_threads=None):
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError as e:
+        raise RuntimeError("The onnx backend needs optimum[onnxruntime]: pip install optimum[onnxruntime]") from e
+    from transformers import AutoTokenizer, pipeline
+
+    session_options = onnxruntime.SessionOptions()
+    if num_threads:
+        session_options.intra_op_num_threads = num_threads
+    classifier = ORTModelForSequenceClassification.from_pretrained(model, export=True,
+                                                                   session_options=session_options)
+    return pipeline("sentiment-analysis", model=classifier, tokenizer=AutoTokenizer.from_pretrained(model))
+
+
+# Each builder returns a callable with the transformers pipeline interface:
+# pipeline is the stock full-precision model, quantized the same model with its
+# Linear layers dynamically quantised to int8, and onnx the model exported to
+# ONNX and run by ONNX Runtime (needs optimum[onnxruntime])
+BACKENDS = {
+    'pipeline': build_pipeline,
+    'quantized': build_quantized_pipeline,
+    'onnx': build_onnx_pipeline,
+}
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+from run_metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = 'sentiment_cache.sqlite3'
+
+# Roughly 100 bytes a row, so the file stays around 20 MB at most
+MAX_ENTRIES = 200_000
+
+
+def comment_key(model, text):
+    """Hash of the model name and the comment with its whitespace normalised"""
+    normalised = ' '.join(text.split())
+    return hashlib.sha256(f"{model}\n{normalised}".encode('utf-8')).hexdigest()
+
+
+class SentimentCache:
+    """Persistent map from comment hash to the 1-5 star score the model gave it.
+
+    Backed by a single SQLite table. Lookups refresh an entry's last-used time
+    and the least recently used entries are dropped once the table grows past
+    `max_entries`. The model name is part of the key, so switching models
+    never reuses stale scores.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.metrics = get_metrics()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS scores (hash TEXT PRIMARY KEY, score INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used)")
+        self._connection.commit()
+
+    def get_many(self, model, texts):
+        """Cached score for each text, None where it has not been scored before"""
+        keys = [comment_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                found.update(self._connection.execute(
+                    f"SELECT hash, score FROM scores WHERE hash IN ({placeholders})", chunk
+                ).fetchall())
+            if found:
+                now = time.time()
+                self._connection.executemany("UPDATE scores SET last_used = ? WHERE hash = ?",
+                                             [(now, key) for key in found])
+                self._connection.commit()
+
+        scores = [found.get(key) for key in keys]
+        hits = sum(score is not None for score in scores)
+        self.metrics.increment('sentiment_cache_hits', hits)
+        self.metrics.increment('sentiment_cache_misses', len(scores) - hits)
+        return scores
+
+    def put_many(self, model, texts, scores):
+        """Remember new scores, skipping texts the model could not score"""
+        now = time.time()
+        rows = [(comment_key(model, text), score, now) for text, score in zip(texts, scores) if score is not None]
+        if not rows:
+            return
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?)", rows)
+            self._connection.commit()
+            self._evict()
+
+    def _evict(self):
+        (count,) = self._connection.execute("SELECT COUNT(*) FROM scores").fetchone()
+        if count <= self.max_entries:
+            return
+        self._connection.execute(
+            "DELETE FROM scores WHERE hash IN (SELECT hash FROM scores ORDER BY last_used LIMIT ?)",
+            (count - self.max_entries,)
+        )
+        self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def log_stats(self):
+        hits = self.metrics.count('sentiment_cache_hits')
+        misses = self.metrics.count('sentiment_cache_misses')
+        hit_rate = hits / (hits + misses) * 100 if hits + misses else 0
+        logger.info("Sentiment cache: %d hits, %d misses (%.0f%% hit rate)", hits, misses, hit_rate)
@@ -1,4 +1,6 @@
-import requests
+from fetching import API_BASE_URL
+from http_client import get_client
+from document import ArticleDocument
 import json
 import os
 import time
@@ -23,11 +25,11 @@ def test_image_extraction(post_id):
     # Test image extraction for a single post ID
     print(f"\n===== TESTING IMAGE EXTRACTION FOR POST ID: {post_id} =====")
     
-    api_url = f"https://bbs-api-os.hoyolab.com/community/post/wapi/getPostFull?post_id={post_id}&read=1&scene=1"
+    api_url = f"{API_BASE_URL}/community/post/wapi/getPostFull?post_id={post_id}&read=1&scene=1"
     
     try:
         print("Sending API request...")
-        response = requests.get(api_url, headers=get_headers())
+        response = get_client().get(api_url, endpoint='getPostFull', headers=get_headers())
         response.raise_for_status()
         
         data = response.json()
@@ -65,25 +67,19 @@ def test_image_extraction(post_id):
         print("\n3. Checking structured_content:")
         structured_content = post_data.get('structured_content', '')
         
+        document = None
         if structured_content:
             try:
-                content_data = json.loads(structured_content)
-                image_count = 0
+                # Parsed once for both the listing here and the best image pick below
+                document = ArticleDocument.parse(structured_content)
+                image_urls = document.image_urls()
+                for i, image_url in enumerate(image_urls):
+                    print(f"  Image {i+1}: {image_url}")
                 
-                if isinstance(content_data, list):
-                    for item in content_data:
-                        if isinstance(item, dict) and 'insert' in item:
-                            insert_value = item.get('insert')
-                            if isinstance(insert_value, dict) and insert_value.get('type') == 'image':
-                                image_url = insert_value.get('attributes', {}).get('src')
-                                if image_url:
-                                    image_count += 1
-                                    print(f"  Image {image_count}: {image_url}")
-                
-                if image_count == 0:
+                if not image_urls:
                     print("  No images found in structured_content")
                 else:
-                    print(f"  Found {image_count} images in structured_content")
+                    print(f"  Found {len(image_urls)} images in structured_content")
                     
             except (json.JSONDecodeError, TypeError) as e:
                 print(f"  Error parsing structured_content: {e}")
@@ -106,20 +102,9 @@ def test_image_extraction(post_id):
             source = "cover"
         
         # Try structured_content last
-        if not image_url and structured_content:
-            try:
-                content_data = json.loads(structured_content)
-                if isinstance(content_data, list):
-                    for item in content_data:
-                        if isinstance(item, dict) and 'insert' in item:
-                            insert_value = item.get('insert')
-                            if isinstance(insert_value, dict) and insert_value.get('type') == 'image':
-                                image_url = insert_value.get('attributes', {}).get('src')
-                                if image_url:
-                                    source = "structured_content"
-                                    break
-            except:
-                pass
+        if not image_url and document and document.image_urls():
+            image_url = document.image_urls()[0]
+            source = "structured_content"
         
         if image_url:
             print(f"Best image found in {source}: {image_url}")
@@ -140,7 +125,7 @@ def test_image_extraction(post_id):
                 # Save to test directory
                 local_filename = f"test_images/test_image_{post_id}{ext}"
                 
-                img_response = requests.get(image_url, stream=True)
+                img_response = get_client().get(image_url, endpoint='image', stream=True)
                 img_response.raise_for_status()
                 
                 with open(local_filename, 'wb') as f:
@@ -0,0 +1,128 @@
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+from collections.abc import MutableMapping
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Kept next to scrape_state.json, but read by full runs too since version times never go stale
+VERSION_INDEX_PATH = 'version_index.jsonl'
+
+# Fields of a version as parse_version_update_time returns it, plus the announcement it came from
+VERSION_FIELDS = ('version', 'updateStart', 'versionStart', 'timestamp', 'postId')
+
+# "Version 3.2 Update Maintenance Preview" and the like
+TITLE_VERSION_PATTERN = re.compile(r"Version (\d+\.\d+)")
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class VersionIndex(MutableMapping):
+    """Every version's update and start time, kept across runs in an append-only file.
+
+    Each line of the file is one version as parse_version_update_time found
+    it, with the id of the announcement it came from. A later line for the
+    same version replaces an earlier one, so a rescheduled maintenance is
+    just appended. The index works as the version -> info dict that
+    parse_event_dates and add_version_update take, and setting a version
+    that changed writes it out straight away. Versions can also be looked up
+    by start time with between() and live_at().
+    """
+
+    def __init__(self, path=VERSION_INDEX_PATH):
+        self.path = path
+        self._versions = {}
+        self._by_start = []  # (versionStart, version), sorted
+        self._post_ids = set()
+        self._torn_line = False  # The file ends part way through a line
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path=VERSION_INDEX_PATH):
+        index = cls(path)
+        if not os.path.exists(path):
+            return index
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                index._torn_line = not line.endswith('\n')
+                if not line.strip():
+                    continue
+                try:
+                    index._put(json.loads(line))
+                except (json.JSONDecodeError, KeyError, TypeError) as e:
+                    # Most likely the last line of a run that was killed mid-write
+                    logger.warning("Skipping unreadable line %d of %s: %s", line_number, path, e)
+        logger.info("Loaded %d versions from %s", len(index._versions), path)
+        return index
+
+    def _put(self, entry):
+        info = {field: entry[field] for field in VERSION_FIELDS if entry.get(field) is not None}
+        version = info['version']
+        previous = self._versions.get(version)
+        if previous:
+            self._by_start.remove((previous['versionStart'], version))
+        self._versions[version] = info
+        bisect.insort(self._by_start, (info['versionStart'], version))
+        if info.get('postId'):
+            self._post_ids.add(str(info['postId']))
+
+    def add(self, info):
+        """Record a version, appending it to the file unless it is already known with the same times"""
+        with self._lock:
+            previous = self._versions.get(info['version'])
+            if previous and all(previous.get(field) == info.get(field) for field in VERSION_FIELDS
+                                if info.get(field) is not None):
+                return False
+            self._put(info)
+            entry = dict(self._versions[info['version']], recordedAt=datetime.now().isoformat())
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(('\n' if self._torn_line else '') + json.dumps(entry, ensure_ascii=False) + '\n')
+            self._torn_line = False
+            return True
+
+    def __getitem__(self, version):
+        with self._lock:
+            return self._versions[version]
+
+    def __setitem__(self, version, info):
+        self.add(dict(info, version=version))
+
+    def __delitem__(self, version):
+        raise TypeError("the version index is append-only")
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._versions))
+
+    def __len__(self):
+        return len(self._versions)
+
+    def __contains__(self, version):
+        return version in self._versions
+
+    def between(self, start=None, end=None):
+        """Versions starting at or after `start` and before `end`, oldest first"""
+        with self._lock:
+            low = 0 if start is None else bisect.bisect_left(self._by_start, (_iso(start), ''))
+            high = len(self._by_start) if end is None else bisect.bisect_left(self._by_start, (_iso(end), ''))
+            return [self._versions[version] for _, version in self._by_start[low:high]]
+
+    def live_at(self, when):
+        """The version that had started by `when`, or None before the first one"""
+        with self._lock:
+            position = bisect.bisect_right(self._by_start, (_iso(when), '\uffff'))
+            return self._versions[self._by_start[position - 1][1]] if position else None
+
+    def knows_announcement(self, article):
+        """True if a listed version update article was read before, by its post id or the version in its title"""
+        if str(article.get('id')) in self._post_ids:
+            return True
+        match = TITLE_VERSION_PATTERN.search(article.get('title', ''))
+        return bool(match) and match.group(1) in self._versions